@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import re
+import subprocess
 from pathlib import Path
 
-from .ollama_client import generate
-from .tools import ToolRegistry
+from .config import settings
+from .memory import AgentBudget, WorkingMemory, clip, tool_call_key
+from .ollama_client import generate, generate_with_stats
+from .timings import span
+from .tools import ToolRegistry, ToolResult
 
 
 PICK_BASIC_GUIDANCE = """
@@ -15,6 +21,10 @@ Pick/BASIC support rules:
 """
 
 
+READ_ONLY_TOOLS = {"read_file", "search", "list_dir"}
+SUMMARY_INPUT_CHARS = 24000
+
+
 def chunk_file(path: Path, max_chars: int = 4000) -> list[str]:
     text = path.read_text(errors="ignore")
     return [text[i : i + max_chars] for i in range(0, len(text), max_chars)]
@@ -29,53 +39,186 @@ async def build_plan(prompt: str, model: str) -> str:
     return await generate(model, plan_prompt)
 
 
+def parse_reply(raw: str) -> dict:
+    text = (raw or "").strip()
+    fenced = re.search(r"```(?:json)?\s*(\{.*\})\s*```", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            return parsed
+    except json.JSONDecodeError:
+        pass
+    return {"actions": [], "validation_commands": [], "notes": raw, "done": True}
+
+
+def command_list(value) -> list[str]:
+    """Normalize a reply's validation_commands: a bare string is one command, non-strings are dropped."""
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    return [cmd.strip() for cmd in value if isinstance(cmd, str) and cmd.strip()]
+
+
+def build_turn_prompt(
+    prompt: str, context: str, memory: WorkingMemory, step: int, budget: AgentBudget
+) -> str:
+    return (
+        f"Task: {prompt}\n"
+        f"Repository context:\n{context}\n"
+        f"{PICK_BASIC_GUIDANCE}\n"
+        "Working memory (your earlier tool results; large outputs are summarized):\n"
+        f"{memory.render()}\n\n"
+        f"Step {step} of {budget.max_steps}; roughly {budget.remaining()} tokens of budget left.\n"
+        "Tools: read_file {path}, search {pattern}, list_dir {path}, write_file {path, content}.\n"
+        "Return JSON with keys: thought (string), actions (list of {tool, ...args}), done (bool), "
+        "validation_commands (list), notes (string). Set done=true with no actions once you can answer."
+    )
+
+
 async def run_agent_loop(
     prompt: str,
     project_path: str,
     fast_model: str,
     deep_model: str,
     logger,
+    run_id: int | None = None,
 ):
+    with span(run_id, "total"):
+        return await _run_agent_loop(prompt, project_path, fast_model, deep_model, logger, run_id)
+
+
+async def _run_agent_loop(prompt, project_path, fast_model, deep_model, logger, run_id):
     tools = ToolRegistry(project_path, logger)
-    tree = tools.list_dir(".").output
+    model = deep_model or fast_model
+    summary_model = fast_model or deep_model
+    memory = WorkingMemory(settings.agent_memory_chars)
+    budget = AgentBudget(settings.agent_max_steps, settings.agent_max_tokens)
+    cache: dict[str, str] = {}
+    results: list[str] = []
+    validation_commands: list[str] = []
 
-    context_lines = []
-    for entry in tree.splitlines()[:30]:
-        f = Path(project_path) / entry
-        if f.is_file() and f.suffix in {".py", ".js", ".ts", ".tsx", ".go", ".rs", ".java", ".c", ".cpp", ".bp", ".basic"}:
-            snippets = chunk_file(f, 1000)
-            context_lines.append(f"FILE {entry} chunk0:\n{snippets[0]}")
+    with span(run_id, "scan") as timing:
+        tree = tools.list_dir(".").output
 
+        context_lines = []
+        for entry in tree.splitlines()[:30]:
+            f = Path(project_path) / entry
+            if f.is_file() and f.suffix in {".py", ".js", ".ts", ".tsx", ".go", ".rs", ".java", ".c", ".cpp", ".bp", ".basic"}:
+                snippets = chunk_file(f, 1000)
+                context_lines.append(f"FILE {entry} chunk0:\n{snippets[0]}")
+        timing["files"] = len(context_lines)
     context = "\n\n".join(context_lines)
-    analysis_prompt = (
-        f"Task: {prompt}\n"
-        f"Repository context:\n{context}\n"
-        f"{PICK_BASIC_GUIDANCE}\n"
-        "Return JSON with keys: actions (list), validation_commands (list), notes (string)."
-    )
-    raw = await generate(deep_model or fast_model, analysis_prompt)
-    logger("agent", "Generated plan and analysis")
-    try:
-        parsed = json.loads(raw)
-    except json.JSONDecodeError:
-        parsed = {"actions": [], "validation_commands": [], "notes": raw}
 
-    results = []
-    for action in parsed.get("actions", []):
+    async def summarize(label: str, output: str) -> str:
+        summary_prompt = (
+            f"Task being worked on: {prompt}\n"
+            f"Summarize this {label} output for that task in under {settings.agent_summarize_chars // 2} characters. "
+            "Keep file paths, line numbers, identifiers and anything the task needs verbatim.\n\n"
+            f"{clip(output, SUMMARY_INPUT_CHARS)}"
+        )
+        try:
+            with span(run_id, "summarize", tool=label.split(" ", 1)[0]) as timing:
+                text, stats = await generate_with_stats(summary_model, summary_prompt)
+                timing.update(stats)
+            budget.charge(stats, summary_prompt, text)
+        except Exception as exc:
+            logger("agent", f"summarize failed ({exc}); clipping output")
+            return clip(output, settings.agent_summarize_chars)
+        return f"(summary of {len(output)} chars) " + clip(text.strip(), settings.agent_summarize_chars)
+
+    async def execute(step: int, action) -> None:
+        if not isinstance(action, dict):
+            shown = clip(json.dumps(action, default=str), 200)
+            output = f"Malformed action, expected an object with a tool key: {shown}"
+            results.append(output)
+            memory.add(step, "invalid action", output)
+            return
+
         kind = action.get("tool")
-        if kind == "read_file":
-            results.append(tools.read_file(action["path"]).output)
-        elif kind == "write_file":
-            results.append(tools.write_file(action["path"], action["content"]).output)
-        elif kind == "search":
-            results.append(tools.search(action["pattern"]).output)
+        label = f"{kind} {action.get('path') or action.get('pattern') or ''}".strip()
+        key = tool_call_key(action)
+        if kind in READ_ONLY_TOOLS and key in cache:
+            logger("agent", f"memoized {label}")
+            memory.add(step, f"{label} (cached)", cache[key])
+            return
+
+        try:
+            if kind == "read_file":
+                result = await asyncio.to_thread(tools.read_file, action["path"])
+            elif kind == "search":
+                result = await asyncio.to_thread(tools.search, action["pattern"])
+            elif kind == "list_dir":
+                result = await asyncio.to_thread(tools.list_dir, action.get("path", "."))
+            elif kind == "write_file":
+                result = await asyncio.to_thread(tools.write_file, action["path"], action["content"])
+            else:
+                result = ToolResult(False, f"Unknown tool: {kind}")
+        except (KeyError, ValueError, TypeError, AttributeError, OSError, subprocess.SubprocessError) as exc:
+            # Bad arguments or a tool timeout fail this action only; the model sees the error next turn.
+            result = ToolResult(False, f"{type(exc).__name__}: {exc}")
+
+        if kind == "write_file":
+            for cached in [k for k in cache if k.startswith(("read_file:", "search:", "list_dir:"))]:
+                del cache[cached]
+
+        results.append(result.output)
+        content = result.output
+        if len(content) > settings.agent_summarize_chars:
+            content = await summarize(label, content)
+        if kind in READ_ONLY_TOOLS and result.ok:
+            cache[key] = content
+        memory.add(step, label, content)
+
+    parsed: dict = {"actions": [], "validation_commands": [], "notes": ""}
+    stopped = "max_steps"
+    step = 0
+    while step < budget.max_steps:
+        if budget.exhausted():
+            stopped = "token_budget"
+            break
+        step += 1
+        turn_prompt = build_turn_prompt(prompt, context, memory, step, budget)
+        with span(run_id, "generate", step=step) as timing:
+            raw, stats = await generate_with_stats(model, turn_prompt)
+            timing.update(stats)
+        budget.charge(stats, turn_prompt, raw)
+
+        parsed = parse_reply(raw)
+        actions = parsed.get("actions") or []
+        if not isinstance(actions, list):
+            actions = [actions]
+        validation_commands += [
+            c for c in command_list(parsed.get("validation_commands")) if c not in validation_commands
+        ]
+        logger("agent", f"step {step}: {len(actions)} action(s), {budget.used} tokens used")
+        if parsed.get("thought"):
+            memory.add(step, "thought", str(parsed["thought"]))
+        if parsed.get("done") or not actions:
+            stopped = "done"
+            break
+
+        with span(run_id, "apply_edits", step=step) as timing:
+            timing["actions"] = len(actions)
+            for action in actions:
+                await execute(step, action)
+
+    logger("agent", f"Agent loop finished after {step} step(s): {stopped}")
 
     validations = []
-    for cmd in parsed.get("validation_commands", []):
-        validations.append({"cmd": cmd, "result": tools.shell(cmd).output})
+    with span(run_id, "validate") as timing:
+        timing["commands"] = len(validation_commands)
+        for cmd in validation_commands:
+            validations.append({"cmd": cmd, "result": tools.shell(cmd).output})
 
     return {
         "analysis": parsed,
         "tool_results": results,
         "validations": validations,
+        "steps": step,
+        "tokens_used": budget.used,
+        "stopped": stopped,
+        "memory": memory.render(),
     }
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import fnmatch
+from pathlib import Path
+
+MAX_BATCH_TASKS = 1000
+SKIP_DIRS = {".git", "node_modules", "__pycache__", ".venv", "venv"}
+
+
+def _is_text(path: Path) -> bool:
+    try:
+        with path.open("rb") as handle:
+            head = handle.read(1024)
+    except OSError:
+        return False
+    return bool(head) and b"\x00" not in head
+
+
+def select_files(project_path: str, include: str | None = None, files: list[str] | None = None) -> list[str]:
+    """Relative paths of the files a batch should touch, in stable order."""
+    root = Path(project_path).resolve()
+    if files:
+        selected = []
+        for name in files:
+            full = (root / name).resolve()
+            if not str(full).startswith(str(root)):
+                raise ValueError(f"Path escapes project: {name}")
+            if full.is_file():
+                selected.append(str(full.relative_to(root)))
+        return sorted(dict.fromkeys(selected))
+
+    selected = []
+    for path in sorted(root.rglob("*")):
+        relative = path.relative_to(root)
+        if any(part in SKIP_DIRS or part.startswith(".") for part in relative.parts):
+            continue
+        if not path.is_file():
+            continue
+        if include and not fnmatch.fnmatch(relative.as_posix(), include):
+            continue
+        if _is_text(path):
+            selected.append(relative.as_posix())
+    return selected
+
+
+def plan_batch_tasks(files: list[str], files_per_task: int) -> list[list[str]]:
+    return [files[i : i + files_per_task] for i in range(0, len(files), files_per_task)]
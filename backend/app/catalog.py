@@ -0,0 +1,412 @@
+"""Cached project catalog: per-project file index kept in SQLite.
+
+The backend's watcher marks a project dirty when anything under it changes and
+re-indexes it in the background; `/projects`, run cost estimates and the
+worker's context builder then read `project_catalog` / `project_files` instead
+of walking the tree. Re-indexing reuses the text/binary verdict of files whose
+size and mtime are unchanged, so only new or modified files are read.
+
+An index is only trusted while a watcher that owns the project is alive: the
+watcher writes a heartbeat to `catalog_watchers` every WATCHER_HEARTBEAT_S, and
+readers fall back to the disk when it is missing or older than
+WATCHER_STALE_S (CATALOG_WATCH=off, backend down, or a watcher that stopped).
+
+This module is shared by the backend and the worker; the worker image copies
+it from backend/app.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+
+SUPPORTED_CODE_EXTENSIONS = {
+    ".b",
+    ".bas",
+    ".basic",
+    ".bp",
+    ".c",
+    ".cc",
+    ".cpp",
+    ".cs",
+    ".go",
+    ".h",
+    ".hpp",
+    ".java",
+    ".js",
+    ".json",
+    ".kt",
+    ".lua",
+    ".md",
+    ".php",
+    ".py",
+    ".rb",
+    ".rs",
+    ".scala",
+    ".sh",
+    ".sql",
+    ".swift",
+    ".ts",
+    ".tsx",
+    ".txt",
+    ".xml",
+    ".yaml",
+    ".yml",
+}
+
+LANGUAGES = {
+    ".b": "pick-basic",
+    ".bas": "pick-basic",
+    ".basic": "pick-basic",
+    ".bp": "pick-basic",
+    ".c": "c",
+    ".h": "c",
+    ".cc": "cpp",
+    ".cpp": "cpp",
+    ".hpp": "cpp",
+    ".cs": "csharp",
+    ".go": "go",
+    ".java": "java",
+    ".js": "javascript",
+    ".ts": "typescript",
+    ".tsx": "typescript",
+    ".json": "json",
+    ".kt": "kotlin",
+    ".lua": "lua",
+    ".md": "markdown",
+    ".php": "php",
+    ".py": "python",
+    ".rb": "ruby",
+    ".rs": "rust",
+    ".scala": "scala",
+    ".sh": "shell",
+    ".sql": "sql",
+    ".swift": "swift",
+    ".txt": "text",
+    ".xml": "xml",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+}
+
+PROBE_CHUNK_BYTES = 1 << 20
+WATCHER_HEARTBEAT_S = 10.0
+WATCHER_STALE_S = 3 * WATCHER_HEARTBEAT_S
+
+
+@dataclass
+class FileEntry:
+    rel_path: str
+    size: int
+    mtime: float
+    language: str | None
+    is_text: bool
+
+
+def is_probably_text(content: bytes) -> bool:
+    if not content:
+        return False
+    if b"\x00" in content:
+        return False
+
+    sample = content[:1024]
+    non_printable = sum(1 for b in sample if b < 9 or (13 < b < 32) or b == 127)
+    return (non_printable / len(sample)) < 0.30
+
+
+def probe_text(path: Path) -> bool:
+    """is_probably_text() over a whole file without loading it at once."""
+    try:
+        with path.open("rb") as fh:
+            chunk = fh.read(PROBE_CHUNK_BYTES)
+            if not is_probably_text(chunk):
+                return False
+            while chunk := fh.read(PROBE_CHUNK_BYTES):
+                if b"\x00" in chunk:
+                    return False
+    except OSError:
+        return False
+    return True
+
+
+def path_key(rel_path: str) -> tuple[str, ...]:
+    """Sort key matching sorted(Path.glob('**/*')) so context order is unchanged."""
+    return PurePosixPath(rel_path).parts
+
+
+def list_projects(workspace_root: str | Path) -> list[str]:
+    """Top-level workspace folders plus each folder under uploads/."""
+    root = Path(workspace_root)
+    project_paths: set[str] = set()
+    if not root.is_dir():
+        return []
+
+    for path in sorted(root.iterdir()):
+        if not path.is_dir() or path.name.startswith("."):
+            continue
+
+        if path.name == "uploads":
+            for upload_project in sorted(path.iterdir()):
+                if upload_project.is_dir() and not upload_project.name.startswith("."):
+                    project_paths.add(str(upload_project))
+            continue
+
+        project_paths.add(str(path))
+
+    return sorted(project_paths)
+
+
+def project_for_path(workspace_root: str | Path, changed: str | Path) -> str | None:
+    """Map a changed path to the project it belongs to (None for the root itself)."""
+    root = Path(workspace_root)
+    try:
+        parts = Path(changed).relative_to(root).parts
+    except ValueError:
+        return None
+    if not parts or parts[0].startswith("."):
+        return None
+    if parts[0] == "uploads":
+        return str(root / "uploads" / parts[1]) if len(parts) > 1 and not parts[1].startswith(".") else None
+    return str(root / parts[0])
+
+
+def scan_project(project_path: str | Path, previous: dict[str, FileEntry] | None = None) -> list[FileEntry]:
+    root = Path(project_path)
+    previous = previous or {}
+    entries: list[FileEntry] = []
+    for dirpath, _dirs, names in os.walk(root):
+        for name in names:
+            full = Path(dirpath) / name
+            try:
+                st = full.stat()
+            except OSError:
+                continue
+            rel = full.relative_to(root).as_posix()
+            suffix = full.suffix.lower()
+            known = previous.get(rel)
+            if known and known.size == st.st_size and known.mtime == st.st_mtime:
+                is_text = known.is_text
+            else:
+                is_text = suffix in SUPPORTED_CODE_EXTENSIONS or probe_text(full)
+            entries.append(FileEntry(rel, st.st_size, st.st_mtime, LANGUAGES.get(suffix), is_text))
+    entries.sort(key=lambda e: path_key(e.rel_path))
+    return entries
+
+
+def fingerprint(project_path: str | Path) -> tuple[int, int, float]:
+    """(files, bytes, newest mtime) from a stat-only walk; used by the polling watcher."""
+    count = total = 0
+    newest = 0.0
+    for dirpath, _dirs, names in os.walk(project_path):
+        try:
+            newest = max(newest, os.stat(dirpath).st_mtime)
+        except OSError:
+            pass
+        for name in names:
+            try:
+                st = os.stat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            count += 1
+            total += st.st_size
+            newest = max(newest, st.st_mtime)
+    return count, total, newest
+
+
+def mark_dirty(conn: sqlite3.Connection, project_paths) -> None:
+    conn.executemany(
+        "INSERT INTO project_catalog(project_path, dirty) VALUES(?, 1) "
+        "ON CONFLICT(project_path) DO UPDATE SET dirty=1",
+        [(os.path.normpath(p),) for p in project_paths],
+    )
+
+
+def sync_projects(conn: sqlite3.Connection, workspace_root: str | Path) -> list[str]:
+    """Add newly created projects as dirty and drop ones that no longer exist."""
+    current = set(list_projects(workspace_root))
+    prefix = os.path.join(os.path.normpath(str(workspace_root)), "")
+    known = {
+        row[0]
+        for row in conn.execute(
+            "SELECT project_path FROM project_catalog WHERE substr(project_path, 1, ?) = ?", (len(prefix), prefix)
+        )
+    }
+    if current - known:
+        mark_dirty(conn, current - known)
+    for gone in known - current:
+        conn.execute("DELETE FROM project_files WHERE project_path=?", (gone,))
+        conn.execute("DELETE FROM project_catalog WHERE project_path=?", (gone,))
+    return sorted(current - known)
+
+
+def index_project(conn: sqlite3.Connection, project_path: str | Path) -> dict:
+    key = os.path.normpath(str(project_path))
+    if not Path(key).is_dir():
+        conn.execute("DELETE FROM project_files WHERE project_path=?", (key,))
+        conn.execute("DELETE FROM project_catalog WHERE project_path=?", (key,))
+        return {}
+
+    # Clear the flag first: a change that lands mid-scan marks it dirty again.
+    conn.execute("UPDATE project_catalog SET dirty=0 WHERE project_path=?", (key,))
+    conn.commit()
+    previous = {
+        row[0]: FileEntry(row[0], row[1], row[2], row[3], bool(row[4]))
+        for row in conn.execute(
+            "SELECT rel_path, size, mtime, language, is_text FROM project_files WHERE project_path=?", (key,)
+        )
+    }
+    entries = scan_project(key, previous)
+    languages = Counter(e.language for e in entries if e.language)
+    summary = {
+        "project_path": key,
+        "file_count": len(entries),
+        "total_bytes": sum(e.size for e in entries),
+        "text_bytes": sum(e.size for e in entries if e.is_text),
+        "languages": dict(languages.most_common()),
+        "last_modified": max((e.mtime for e in entries), default=None),
+        "indexed_at": time.time(),
+    }
+    conn.execute("DELETE FROM project_files WHERE project_path=?", (key,))
+    conn.executemany(
+        "INSERT INTO project_files(project_path, rel_path, size, mtime, language, is_text) VALUES(?,?,?,?,?,?)",
+        [(key, e.rel_path, e.size, e.mtime, e.language, int(e.is_text)) for e in entries],
+    )
+    conn.execute(
+        "INSERT INTO project_catalog(project_path, file_count, total_bytes, text_bytes, languages, last_modified, "
+        "dirty, indexed_at) VALUES(?,?,?,?,?,?,0,?) ON CONFLICT(project_path) DO UPDATE SET "
+        "file_count=excluded.file_count, total_bytes=excluded.total_bytes, text_bytes=excluded.text_bytes, "
+        "languages=excluded.languages, last_modified=excluded.last_modified, indexed_at=excluded.indexed_at",
+        (
+            key,
+            summary["file_count"],
+            summary["total_bytes"],
+            summary["text_bytes"],
+            json.dumps(summary["languages"]),
+            summary["last_modified"],
+            summary["indexed_at"],
+        ),
+    )
+    conn.commit()
+    return summary
+
+
+def index_version(conn: sqlite3.Connection, project_path: str | Path) -> float | None:
+    """indexed_at of a clean index; changes whenever the project is re-indexed."""
+    row = conn.execute(
+        "SELECT indexed_at FROM project_catalog WHERE project_path=? AND dirty=0", (os.path.normpath(str(project_path)),)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def record_watcher_heartbeat(conn: sqlite3.Connection, workspace_root: str | Path, backend: str) -> None:
+    conn.execute(
+        "INSERT INTO catalog_watchers(workspace_root, backend, heartbeat_at) VALUES(?,?,?) "
+        "ON CONFLICT(workspace_root) DO UPDATE SET backend=excluded.backend, heartbeat_at=excluded.heartbeat_at",
+        (os.path.normpath(str(workspace_root)), backend, time.time()),
+    )
+
+
+def clear_watcher_heartbeat(conn: sqlite3.Connection, workspace_root: str | Path) -> None:
+    conn.execute("DELETE FROM catalog_watchers WHERE workspace_root=?", (os.path.normpath(str(workspace_root)),))
+
+
+def watcher_owns(conn: sqlite3.Connection, project_path: str | Path) -> bool:
+    """True while a live watcher covers the workspace containing `project_path`."""
+    key = os.path.normpath(str(project_path))
+    try:
+        roots = conn.execute(
+            "SELECT workspace_root FROM catalog_watchers WHERE heartbeat_at >= ?", (time.time() - WATCHER_STALE_S,)
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return False
+    return any(key.startswith(os.path.join(row[0], "")) for row in roots)
+
+
+def live_index_version(conn: sqlite3.Connection, project_path: str | Path) -> float | None:
+    """index_version(), but only while a live watcher would notice changes to the project."""
+    return index_version(conn, project_path) if watcher_owns(conn, project_path) else None
+
+
+def index_matches_disk(conn: sqlite3.Connection, project_path: str | Path) -> bool:
+    """Stat-only check that a persisted index still describes the project."""
+    key = os.path.normpath(str(project_path))
+    stored = {
+        row[0]: (row[1], row[2])
+        for row in conn.execute("SELECT rel_path, size, mtime FROM project_files WHERE project_path=?", (key,))
+    }
+    seen = 0
+    for dirpath, _dirs, names in os.walk(key):
+        for name in names:
+            full = os.path.join(dirpath, name)
+            try:
+                st = os.stat(full)
+            except OSError:
+                return False
+            rel = Path(full).relative_to(key).as_posix()
+            if stored.get(rel) != (st.st_size, st.st_mtime):
+                return False
+            seen += 1
+    return seen == len(stored)
+
+
+def dirty_projects(conn: sqlite3.Connection) -> list[str]:
+    return [row[0] for row in conn.execute("SELECT project_path FROM project_catalog WHERE dirty=1 ORDER BY project_path")]
+
+
+def refresh_catalog(conn: sqlite3.Connection, workspace_root: str | Path) -> list[str]:
+    """Bring the catalog up to date synchronously; used when no watcher runs.
+
+    Indexes new and dirty projects and re-indexes those whose files changed
+    (stat-only check). Returns the projects that were indexed.
+    """
+    sync_projects(conn, workspace_root)
+    dirty = set(dirty_projects(conn))
+    indexed = []
+    for project in list_projects(workspace_root):
+        if project in dirty or not index_matches_disk(conn, project):
+            index_project(conn, project)
+            indexed.append(project)
+    return indexed
+
+
+def load_catalog(conn: sqlite3.Connection, workspace_root: str | Path) -> list[dict]:
+    prefix = os.path.join(os.path.normpath(str(workspace_root)), "")
+    rows = conn.execute(
+        "SELECT project_path, file_count, total_bytes, text_bytes, languages, last_modified, dirty, indexed_at "
+        "FROM project_catalog WHERE substr(project_path, 1, ?) = ? ORDER BY project_path",
+        (len(prefix), prefix),
+    ).fetchall()
+    return [
+        {
+            "project_path": row[0],
+            "file_count": row[1],
+            "total_bytes": row[2],
+            "text_bytes": row[3],
+            "languages": json.loads(row[4] or "{}"),
+            "last_modified": row[5],
+            "dirty": bool(row[6]),
+            "indexed_at": row[7],
+        }
+        for row in rows
+    ]
+
+
+def cached_text_bytes(conn: sqlite3.Connection, project_path: str) -> int | None:
+    row = conn.execute(
+        "SELECT text_bytes FROM project_catalog WHERE project_path=? AND indexed_at IS NOT NULL",
+        (os.path.normpath(project_path),),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def indexed_text_files(conn: sqlite3.Connection, project_path: str | Path) -> list[str] | None:
+    """Text files of a clean, watched index in context order, or None if the caller must walk the disk."""
+    key = os.path.normpath(str(project_path))
+    if live_index_version(conn, key) is None:
+        return None
+    files = [r[0] for r in conn.execute("SELECT rel_path FROM project_files WHERE project_path=? AND is_text=1", (key,))]
+    return sorted(files, key=path_key)
@@ -27,6 +27,26 @@ class Settings:
     )
     command_timeout_s: int = int(os.getenv("COMMAND_TIMEOUT_S", "120"))
     network_enabled: bool = _env_bool("NETWORK_ENABLED", default=False)
+    worker_concurrency: int = int(os.getenv("WORKER_CONCURRENCY", "1"))
+    batch_max_parallel: int = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+    catalog_watch: str = os.getenv("CATALOG_WATCH", "auto")
+    catalog_poll_interval_s: float = float(os.getenv("CATALOG_POLL_INTERVAL_S", "5"))
+    catalog_debounce_s: float = float(os.getenv("CATALOG_DEBOUNCE_S", "1"))
+    catalog_verify_interval_s: float = float(os.getenv("CATALOG_VERIFY_INTERVAL_S", "300"))
+    archive_dir: str = os.getenv("ARCHIVE_DIR", "/data/archive")
+    retention_archive_after_days: str = os.getenv(
+        "RETENTION_ARCHIVE_AFTER_DAYS", "completed=90,failed=30,awaiting_review=180"
+    )
+    retention_compact_after_days: float = float(os.getenv("RETENTION_COMPACT_AFTER_DAYS", "7"))
+    retention_interval_s: float = float(os.getenv("RETENTION_INTERVAL_S", "3600"))
+    retention_vacuum_pages: int = int(os.getenv("RETENTION_VACUUM_PAGES", "2000"))
+    prewarm_models: list[str] = field(default_factory=lambda: _env_csv("PREWARM_MODELS", "qwen2.5-coder:7b"))
+    ollama_keep_alive: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    worker_heartbeat_s: float = float(os.getenv("WORKER_HEARTBEAT_S", "10"))
+    agent_max_steps: int = int(os.getenv("AGENT_MAX_STEPS", "6"))
+    agent_max_tokens: int = int(os.getenv("AGENT_MAX_TOKENS", "60000"))
+    agent_memory_chars: int = int(os.getenv("AGENT_MEMORY_CHARS", "12000"))
+    agent_summarize_chars: int = int(os.getenv("AGENT_SUMMARIZE_CHARS", "2000"))
 
 
 settings = Settings()
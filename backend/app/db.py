@@ -1,12 +1,16 @@
 import sqlite3
+import time
 from contextlib import contextmanager
 from pathlib import Path
 from .config import settings
+from .metrics import DB_SESSION_SECONDS
 
 
 def init_db() -> None:
     Path(settings.db_path).parent.mkdir(parents=True, exist_ok=True)
     with sqlite3.connect(settings.db_path) as conn:
+        # Only takes effect on a new DB; retention converts existing ones once, when idle.
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
         conn.executescript(
             """
             CREATE TABLE IF NOT EXISTS runs (
@@ -16,7 +20,11 @@ def init_db() -> None:
                 plan TEXT,
                 status TEXT NOT NULL DEFAULT 'queued',
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                priority TEXT NOT NULL DEFAULT 'normal',
+                submitter TEXT NOT NULL DEFAULT 'anonymous',
+                estimated_cost_s REAL,
+                started_at TEXT
             );
             CREATE TABLE IF NOT EXISTS run_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -30,7 +38,105 @@ def init_db() -> None:
                 run_id INTEGER NOT NULL,
                 file_path TEXT NOT NULL,
                 diff TEXT NOT NULL,
-                accepted INTEGER DEFAULT 0
+                accepted INTEGER DEFAULT 0,
+                diff_encoding TEXT NOT NULL DEFAULT 'plain',
+                lines_added INTEGER NOT NULL DEFAULT 0,
+                lines_removed INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS run_timings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER NOT NULL,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'ok',
+                started_at REAL NOT NULL,
+                duration_ms REAL NOT NULL,
+                model TEXT,
+                prompt_eval_count INTEGER,
+                prompt_eval_ms REAL,
+                eval_count INTEGER,
+                eval_ms REAL,
+                tokens_per_s REAL,
+                detail TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_run_timings_run_id ON run_timings(run_id);
+            CREATE TABLE IF NOT EXISTS run_timing_rollup (
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                model TEXT NOT NULL DEFAULT '',
+                count INTEGER NOT NULL,
+                duration_ms REAL NOT NULL,
+                eval_count INTEGER NOT NULL,
+                eval_ms REAL NOT NULL,
+                prompt_eval_count INTEGER NOT NULL,
+                prompt_eval_ms REAL NOT NULL,
+                buckets TEXT NOT NULL,
+                PRIMARY KEY (stage, status, model)
+            );
+            CREATE TABLE IF NOT EXISTS run_profiles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                format TEXT NOT NULL,
+                content BLOB NOT NULL,
+                summary TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_run_profiles_run_id ON run_profiles(run_id);
+            CREATE TABLE IF NOT EXISTS batch_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER NOT NULL,
+                project_path TEXT NOT NULL,
+                files TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                answer TEXT,
+                error TEXT,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_batch_tasks_run_id ON batch_tasks(run_id);
+            CREATE TABLE IF NOT EXISTS worker_status (
+                worker_id TEXT PRIMARY KEY,
+                phase TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL,
+                warm_models TEXT,
+                warm_projects INTEGER,
+                detail TEXT
+            );
+            CREATE TABLE IF NOT EXISTS project_catalog (
+                project_path TEXT PRIMARY KEY,
+                file_count INTEGER NOT NULL DEFAULT 0,
+                total_bytes INTEGER NOT NULL DEFAULT 0,
+                text_bytes INTEGER NOT NULL DEFAULT 0,
+                languages TEXT,
+                last_modified REAL,
+                dirty INTEGER NOT NULL DEFAULT 1,
+                indexed_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS project_files (
+                project_path TEXT NOT NULL,
+                rel_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                language TEXT,
+                is_text INTEGER NOT NULL,
+                PRIMARY KEY (project_path, rel_path)
+            );
+            CREATE TABLE IF NOT EXISTS catalog_watchers (
+                workspace_root TEXT PRIMARY KEY,
+                backend TEXT NOT NULL,
+                heartbeat_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS archived_runs (
+                run_id INTEGER PRIMARY KEY,
+                project_path TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at TEXT,
+                archived_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                archive_file TEXT NOT NULL,
+                archive_offset INTEGER NOT NULL,
+                archive_length INTEGER NOT NULL
             );
             CREATE TABLE IF NOT EXISTS settings (
                 key TEXT PRIMARY KEY,
@@ -38,10 +144,39 @@ def init_db() -> None:
             );
             """
         )
+        ensure_columns(
+            conn,
+            "runs",
+            {
+                "priority": "TEXT NOT NULL DEFAULT 'normal'",
+                "submitter": "TEXT NOT NULL DEFAULT 'anonymous'",
+                "estimated_cost_s": "REAL",
+                "started_at": "TEXT",
+            },
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_status ON runs(status)")
+        ensure_columns(
+            conn,
+            "file_changes",
+            {
+                "diff_encoding": "TEXT NOT NULL DEFAULT 'plain'",
+                "lines_added": "INTEGER NOT NULL DEFAULT 0",
+                "lines_removed": "INTEGER NOT NULL DEFAULT 0",
+            },
+        )
+        ensure_columns(conn, "run_logs", {"message_encoding": "TEXT NOT NULL DEFAULT 'plain'"})
+
+
+def ensure_columns(conn: sqlite3.Connection, table: str, columns: dict[str, str]) -> None:
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
 
 
 @contextmanager
 def get_conn():
+    started = time.perf_counter()
     conn = sqlite3.connect(settings.db_path)
     conn.row_factory = sqlite3.Row
     try:
@@ -49,3 +184,4 @@ def get_conn():
         conn.commit()
     finally:
         conn.close()
+        DB_SESSION_SECONDS.observe(time.perf_counter() - started)
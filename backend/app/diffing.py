@@ -0,0 +1,320 @@
+"""Line diff service used when recording file changes.
+
+The engine interns every line to an integer id so comparisons are cheap, drops
+lines that only exist on one side, trims the common prefix/suffix, and runs a
+linear-space Myers bisection on what is left. Large ranges are first split on
+lines that occur exactly once on each side (patience anchors), which keeps
+Myers' O(ND) cost on small pieces. Work is bounded by a deadline: once it
+passes, remaining ranges not yet split that way get one anchoring pass and
+whatever is still unresolved is emitted as a plain replacement. The output is always a valid (if
+less minimal) diff, and approximate results count added/removed lines as a
+multiset difference rather than from those replacements.
+
+This module is shared by the backend and the worker; the worker image copies
+it from backend/app.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import zlib
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+
+DIFF_TIMEOUT_S = float(os.getenv("DIFF_TIMEOUT_S", "1.0"))
+DIFF_MAX_BYTES = int(os.getenv("DIFF_MAX_BYTES", str(8 * 1024 * 1024)))
+DIFF_CONTEXT_LINES = 3
+PATIENCE_MIN_LINES = 2000
+
+
+@dataclass
+class DiffResult:
+    text: str
+    added: int
+    removed: int
+    binary: bool = False
+    approximate: bool = False
+
+
+def _intern(a: list[str], b: list[str]) -> tuple[list[int], list[int]]:
+    table: dict[str, int] = {}
+    ids_a = [table.setdefault(line, len(table)) for line in a]
+    ids_b = [table.setdefault(line, len(table)) for line in b]
+    return ids_a, ids_b
+
+
+def _bisect(a: list[int], b: list[int], deadline: float) -> tuple[int, int] | None:
+    """Find the middle snake of a and b; returns a split point or None on timeout."""
+    n, m = len(a), len(b)
+    max_d = (n + m + 1) // 2
+    offset = max_d
+    size = 2 * max_d + 2
+    v1 = [-1] * size
+    v2 = [-1] * size
+    v1[offset + 1] = 0
+    v2[offset + 1] = 0
+    delta = n - m
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+
+    for d in range(max_d):
+        if time.monotonic() > deadline:
+            return None
+
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[x1] == b[y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < size and v2[k2_offset] != -1:
+                    if x1 >= n - v2[k2_offset]:
+                        return x1, y1
+
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[n - x2 - 1] == b[m - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < size and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    y1 = x1 - (k1_offset - offset)
+                    if x1 >= n - x2:
+                        return x1, y1
+
+    return None
+
+
+def _unique_anchors(a: list[int], alo: int, ahi: int, b: list[int], blo: int, bhi: int) -> list[tuple[int, int]]:
+    """Patience anchors: lines unique on both sides, longest run kept in order on both."""
+    counts_a = Counter(a[alo:ahi])
+    counts_b = Counter(b[blo:bhi])
+    where_b = {b[j]: j for j in range(blo, bhi) if counts_b[b[j]] == 1}
+    pairs = [(i, where_b[a[i]]) for i in range(alo, ahi) if counts_a[a[i]] == 1 and a[i] in where_b]
+    if not pairs:
+        return []
+
+    # Longest increasing subsequence of the b positions (patience sorting).
+    tails: list[int] = []
+    tail_at: list[int] = []
+    back = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        back[k] = tail_at[pos - 1] if pos else -1
+        if pos == len(tails):
+            tails.append(j)
+            tail_at.append(k)
+        else:
+            tails[pos] = j
+            tail_at[pos] = k
+    anchors = []
+    k = tail_at[-1]
+    while k != -1:
+        anchors.append(pairs[k])
+        k = back[k]
+    anchors.reverse()
+    return anchors
+
+
+def matching_blocks(
+    a: list[str], b: list[str], timeout_s: float = DIFF_TIMEOUT_S
+) -> tuple[list[tuple[int, int, int]], bool]:
+    """Return (i, j, size) runs of equal lines plus whether the deadline was hit."""
+    ids_a, ids_b = _intern(a, b)
+    # Lines that only occur on one side can never match; dropping them first
+    # collapses most of the edit distance for regenerated files.
+    common = set(ids_a) & set(ids_b)
+    index_a = [i for i, line in enumerate(ids_a) if line in common]
+    index_b = [j for j, line in enumerate(ids_b) if line in common]
+    ids_a = [ids_a[i] for i in index_a]
+    ids_b = [ids_b[j] for j in index_b]
+
+    deadline = time.monotonic() + timeout_s
+    timed_out = False
+    blocks: list[tuple[int, int, int]] = []
+    # (alo, ahi, blo, bhi, anchored): anchored ranges came from a patience split
+    # and are not split that way again.
+    stack = [(0, len(ids_a), 0, len(ids_b), False)]
+
+    while stack:
+        alo, ahi, blo, bhi, anchored = stack.pop()
+
+        prefix = 0
+        while alo + prefix < ahi and blo + prefix < bhi and ids_a[alo + prefix] == ids_b[blo + prefix]:
+            prefix += 1
+        if prefix:
+            blocks.append((alo, blo, prefix))
+            alo += prefix
+            blo += prefix
+
+        suffix = 0
+        while alo < ahi - suffix and blo < bhi - suffix and ids_a[ahi - suffix - 1] == ids_b[bhi - suffix - 1]:
+            suffix += 1
+        if suffix:
+            blocks.append((ahi - suffix, bhi - suffix, suffix))
+            ahi -= suffix
+            bhi -= suffix
+
+        if alo == ahi or blo == bhi:
+            continue
+
+        if not anchored and (timed_out or (ahi - alo) + (bhi - blo) > PATIENCE_MIN_LINES):
+            anchors = _unique_anchors(ids_a, alo, ahi, ids_b, blo, bhi)
+            if anchors:
+                for i, j in anchors:
+                    blocks.append((i, j, 1))
+                    stack.append((alo, i, blo, j, True))
+                    alo, blo = i + 1, j + 1
+                stack.append((alo, ahi, blo, bhi, True))
+                continue
+
+        split = None
+        if not timed_out:
+            split = _bisect(ids_a[alo:ahi], ids_b[blo:bhi], deadline)
+            if split is None and time.monotonic() > deadline:
+                timed_out = True
+                if not anchored:
+                    stack.append((alo, ahi, blo, bhi, False))
+                    continue
+        if split is None:
+            continue
+
+        x, y = split
+        stack.append((alo + x, ahi, blo + y, bhi, False))
+        stack.append((alo, alo + x, blo, blo + y, False))
+
+    blocks.sort()
+    merged: list[tuple[int, int, int]] = []
+    for fi, fj, size in blocks:
+        for k in range(size):
+            i, j = index_a[fi + k], index_b[fj + k]
+            if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+                pi, pj, psize = merged[-1]
+                merged[-1] = (pi, pj, psize + 1)
+            else:
+                merged.append((i, j, 1))
+    return merged, timed_out
+
+
+def _opcodes(blocks: list[tuple[int, int, int]], n: int, m: int) -> list[tuple[str, int, int, int, int]]:
+    codes = []
+    i = j = 0
+    for bi, bj, size in [*blocks, (n, m, 0)]:
+        if i < bi or j < bj:
+            codes.append(("change", i, bi, j, bj))
+        if size:
+            codes.append(("equal", bi, bi + size, bj, bj + size))
+        i, j = bi + size, bj + size
+    return codes
+
+
+def _grouped(codes: list[tuple[str, int, int, int, int]], context: int):
+    if not codes:
+        return
+    codes = list(codes)
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _format_range(start: int, stop: int) -> str:
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def _count_changes(a: list[str], b: list[str]) -> tuple[int, int]:
+    before, after = Counter(a), Counter(b)
+    return sum((after - before).values()), sum((before - after).values())
+
+
+def compute_diff(file_path: str, before: str, after: str, timeout_s: float = DIFF_TIMEOUT_S) -> DiffResult:
+    """Produce a unified diff (difflib-compatible format) with added/removed line counts."""
+    if before == after:
+        return DiffResult("", 0, 0)
+
+    header = [f"--- a/{file_path}", f"+++ b/{file_path}"]
+    if "\x00" in before or "\x00" in after:
+        return DiffResult(f"Binary files a/{file_path} and b/{file_path} differ", 0, 0, binary=True)
+
+    a, b = before.splitlines(), after.splitlines()
+    if len(before) + len(after) > DIFF_MAX_BYTES:
+        added, removed = _count_changes(a, b)
+        note = f"@@ diff skipped: {len(before) + len(after)} bytes exceeds DIFF_MAX_BYTES @@"
+        return DiffResult("\n".join([*header, note]), added, removed, approximate=True)
+
+    blocks, timed_out = matching_blocks(a, b, timeout_s)
+    lines: list[str] = []
+    added = removed = 0
+    for group in _grouped(_opcodes(blocks, len(a), len(b)), DIFF_CONTEXT_LINES):
+        first, last = group[0], group[-1]
+        lines.append(f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(f" {line}" for line in a[i1:i2])
+                continue
+            lines.extend(f"-{line}" for line in a[i1:i2])
+            lines.extend(f"+{line}" for line in b[j1:j2])
+            removed += i2 - i1
+            added += j2 - j1
+
+    if not lines:
+        return DiffResult("", 0, 0)
+    if timed_out:
+        # Replacement hunks overstate both sides; the multiset difference is a
+        # lower bound that stays close to a minimal diff's counts.
+        added, removed = _count_changes(a, b)
+    return DiffResult("\n".join([*header, *lines]), added, removed, approximate=timed_out)
+
+
+def encode_diff(text: str) -> tuple[bytes, str]:
+    return zlib.compress(text.encode("utf-8"), 6), "zlib"
+
+
+def decode_diff(value, encoding: str | None) -> str:
+    if encoding == "zlib":
+        return zlib.decompress(value).decode("utf-8", errors="replace")
+    return value if isinstance(value, str) else bytes(value or b"").decode("utf-8", errors="replace")
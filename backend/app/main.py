@@ -2,18 +2,35 @@ from __future__ import annotations
 
 import json
 import re
-from datetime import datetime
+import time
+import zlib
+from datetime import datetime, timezone
 from pathlib import Path
 
 from typing import Annotated
 
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 
+from .catalog import cached_text_bytes, load_catalog, mark_dirty, refresh_catalog
 from .config import settings
 from .db import get_conn, init_db
-from .models import AcceptChangeRequest, RunCreate
-from .ollama_client import list_models
+from .diffing import decode_diff
+from .batching import MAX_BATCH_TASKS, plan_batch_tasks, select_files
+from .metrics import render_metrics
+from .models import AcceptChangeRequest, BatchRunCreate, RunCreate
+from .ollama_client import list_models, loaded_models
+from .retention import RetentionService, list_archives, load_archived_run, parse_policies
+from .scheduling import (
+    estimate_context_bytes,
+    estimate_cost_s,
+    estimate_start_times,
+    load_queue,
+    model_throughput,
+    schedule,
+)
+from .watcher import CatalogWatcher
 
 app = FastAPI(title="Agentic Coding Backend")
 
@@ -26,10 +43,39 @@ app.add_middleware(
 )
 
 
+catalog_watcher: CatalogWatcher | None = None
+retention_service = RetentionService(
+    settings.archive_dir,
+    parse_policies(settings.retention_archive_after_days),
+    settings.retention_compact_after_days,
+    settings.retention_interval_s,
+    settings.retention_vacuum_pages,
+)
+
+
 @app.on_event("startup")
-def startup():
+async def startup():
+    global catalog_watcher
     init_db()
     Path(settings.workspace_root).mkdir(parents=True, exist_ok=True)
+    if settings.catalog_watch != "off":
+        catalog_watcher = CatalogWatcher(
+            settings.workspace_root,
+            settings.catalog_watch,
+            settings.catalog_poll_interval_s,
+            settings.catalog_debounce_s,
+            settings.catalog_verify_interval_s,
+        )
+        await catalog_watcher.start()
+    if settings.retention_interval_s > 0:
+        retention_service.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if catalog_watcher is not None:
+        await catalog_watcher.stop()
+    await retention_service.stop()
 
 
 @app.get("/health")
@@ -37,6 +83,58 @@ def health():
     return {"ok": True}
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness: DB, Ollama, a warmed-up worker and a verified project catalog."""
+    checks: dict = {}
+    try:
+        with get_conn() as conn:
+            conn.execute("SELECT 1").fetchone()
+            rows = conn.execute(
+                "SELECT worker_id,phase,started_at,heartbeat_at,warm_models,warm_projects,detail "
+                "FROM worker_status WHERE heartbeat_at >= ? ORDER BY started_at DESC",
+                (time.time() - 3 * settings.worker_heartbeat_s,),
+            ).fetchall()
+            dirty = conn.execute("SELECT COUNT(*) FROM project_catalog WHERE dirty=1").fetchone()[0]
+        checks["database"] = {"ok": True}
+    except Exception as exc:
+        rows, dirty = [], None
+        checks["database"] = {"ok": False, "error": str(exc)}
+
+    try:
+        loaded = await loaded_models()
+        checks["ollama"] = {"ok": True, "loaded_models": loaded}
+    except Exception as exc:
+        loaded = []
+        checks["ollama"] = {"ok": False, "error": str(exc)}
+    checks["models"] = {model: model in loaded for model in settings.prewarm_models}
+
+    workers = [
+        {
+            **dict(row),
+            "warm_models": json.loads(row["warm_models"] or "[]"),
+            "detail": json.loads(row["detail"] or "null"),
+        }
+        for row in rows
+    ]
+    checks["worker"] = {"ok": any(w["phase"] == "ready" for w in workers), "workers": workers}
+    checks["catalog"] = {
+        "ok": catalog_watcher is None or catalog_watcher.warm,
+        "mode": catalog_watcher.backend if catalog_watcher else "off",
+        "dirty_projects": dirty,
+    }
+
+    is_ready = all(checks[name]["ok"] for name in ("database", "ollama", "worker", "catalog"))
+    return JSONResponse({"ready": is_ready, "checks": checks}, status_code=200 if is_ready else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    with get_conn() as conn:
+        body = render_metrics(conn)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
 @app.get("/models")
 async def models():
     try:
@@ -50,22 +148,12 @@ async def models():
 
 @app.get("/projects")
 def projects():
-    root = Path(settings.workspace_root)
-    project_paths: set[str] = set()
-
-    for path in sorted(root.iterdir()):
-        if not path.is_dir() or path.name.startswith("."):
-            continue
-
-        if path.name == "uploads":
-            for upload_project in sorted(path.iterdir()):
-                if upload_project.is_dir() and not upload_project.name.startswith("."):
-                    project_paths.add(str(upload_project))
-            continue
-
-        project_paths.add(str(path))
-
-    return {"projects": sorted(project_paths)}
+    with get_conn() as conn:
+        if catalog_watcher is None:
+            # Nothing indexes in the background with CATALOG_WATCH=off.
+            refresh_catalog(conn, settings.workspace_root)
+        catalog = load_catalog(conn, settings.workspace_root)
+    return {"projects": [entry["project_path"] for entry in catalog], "catalog": catalog}
 
 
 @app.post("/uploads/code")
@@ -103,6 +191,11 @@ async def upload_code(
         total_size += size
         saved_files.append({"filename": filename, "size": size})
 
+    with get_conn() as conn:
+        mark_dirty(conn, [str(Path(settings.workspace_root) / "uploads" / safe_project_name)])
+    if catalog_watcher is not None:
+        catalog_watcher.wake()
+
     return {
         "project_path": str(project_dir),
         "files": saved_files,
@@ -111,40 +204,183 @@ async def upload_code(
     }
 
 
-@app.post("/runs")
-def create_run(payload: RunCreate):
-    if not str(Path(payload.project_path).resolve()).startswith(
+def ensure_in_workspace(project_path: str) -> None:
+    if not str(Path(project_path).resolve()).startswith(
         str(Path(settings.workspace_root).resolve())
     ):
         raise HTTPException(
             status_code=400, detail="Project path must be in mounted workspace"
         )
 
+
+@app.post("/runs")
+def create_run(payload: RunCreate):
+    ensure_in_workspace(payload.project_path)
+
+    model = payload.deep_model or payload.fast_model or "qwen2.5-coder:7b"
+
     with get_conn() as conn:
+        context_bytes = cached_text_bytes(conn, payload.project_path)
+        if context_bytes is None:
+            context_bytes = estimate_context_bytes(payload.project_path)
+        cost = estimate_cost_s(
+            context_bytes, len(payload.prompt), model, model_throughput(conn, model)
+        )
         cur = conn.execute(
-            "INSERT INTO runs(project_path,prompt,status,plan) VALUES(?,?,?,?)",
+            "INSERT INTO runs(project_path,prompt,status,plan,priority,submitter,estimated_cost_s) "
+            "VALUES(?,?,?,?,?,?,?)",
             (
                 payload.project_path,
                 payload.prompt,
                 "queued",
                 json.dumps(
-                    {"fast_model": payload.fast_model, "deep_model": payload.deep_model}
+                    {
+                        "fast_model": payload.fast_model,
+                        "deep_model": payload.deep_model,
+                        "profile": payload.profile,
+                    }
                 ),
+                payload.priority,
+                payload.submitter or "anonymous",
+                cost,
             ),
         )
         run_id = cur.lastrowid
         conn.execute(
             "INSERT INTO run_logs(run_id,kind,message) VALUES(?,?,?)",
-            (run_id, "system", "Run queued"),
+            (run_id, "system", f"Run queued ({payload.priority}, est. {cost:.0f}s)"),
+        )
+        position = queue_snapshot(conn).get(run_id, {})
+    return {"id": run_id, "status": "queued", "estimated_cost_s": cost, **position}
+
+
+@app.post("/runs/batch")
+def create_batch_run(payload: BatchRunCreate):
+    if payload.files and len(payload.project_paths) > 1:
+        raise HTTPException(
+            status_code=400, detail="Explicit files require a single project"
         )
-    return {"id": run_id, "status": "queued"}
+
+    tasks: list[tuple[str, list[str]]] = []
+    context_bytes = 0
+    for project_path in payload.project_paths:
+        ensure_in_workspace(project_path)
+        try:
+            files = select_files(project_path, payload.include, payload.files)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        tasks += [
+            (project_path, chunk)
+            for chunk in plan_batch_tasks(files, payload.files_per_task)
+        ]
+        with get_conn() as conn:
+            cached = cached_text_bytes(conn, project_path)
+        context_bytes = max(
+            context_bytes,
+            estimate_context_bytes(project_path) if cached is None else cached,
+        )
+
+    if not tasks:
+        raise HTTPException(status_code=400, detail="No matching files for batch")
+    if len(tasks) > MAX_BATCH_TASKS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch has {len(tasks)} tasks; limit is {MAX_BATCH_TASKS}",
+        )
+
+    model = payload.deep_model or payload.fast_model or "qwen2.5-coder:7b"
+    with get_conn() as conn:
+        per_task = estimate_cost_s(
+            context_bytes, len(payload.prompt), model, model_throughput(conn, model)
+        )
+        # The worker never runs more than BATCH_MAX_PARALLEL subtasks at once.
+        parallel = max(1, min(payload.max_parallel, settings.batch_max_parallel))
+        waves = -(-len(tasks) // parallel)
+        cost = round(per_task * waves, 2)
+        cur = conn.execute(
+            "INSERT INTO runs(project_path,prompt,status,plan,priority,submitter,estimated_cost_s) "
+            "VALUES(?,?,?,?,?,?,?)",
+            (
+                payload.project_paths[0],
+                payload.prompt,
+                "queued",
+                json.dumps(
+                    {
+                        "fast_model": payload.fast_model,
+                        "deep_model": payload.deep_model,
+                        "batch": {"max_parallel": payload.max_parallel},
+                    }
+                ),
+                payload.priority,
+                payload.submitter or "anonymous",
+                cost,
+            ),
+        )
+        run_id = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO batch_tasks(run_id,project_path,files) VALUES(?,?,?)",
+            [(run_id, project_path, json.dumps(files)) for project_path, files in tasks],
+        )
+        conn.execute(
+            "INSERT INTO run_logs(run_id,kind,message) VALUES(?,?,?)",
+            (
+                run_id,
+                "system",
+                f"Batch queued: {len(tasks)} tasks across {len(payload.project_paths)} project(s)",
+            ),
+        )
+        position = queue_snapshot(conn).get(run_id, {})
+    return {
+        "id": run_id,
+        "status": "queued",
+        "tasks": len(tasks),
+        "estimated_cost_s": cost,
+        **position,
+    }
+
+
+def queue_snapshot(conn) -> dict[int, dict]:
+    now = time.time()
+    queued, active = load_queue(conn, now)
+    order = schedule(queued, active, now)
+    starts = estimate_start_times(order, active, now, settings.worker_concurrency)
+    return {
+        run.id: {
+            "queue_position": index + 1,
+            "estimated_start_at": datetime.fromtimestamp(starts[run.id], timezone.utc).isoformat(
+                timespec="seconds"
+            ),
+        }
+        for index, run in enumerate(order)
+    }
+
+
+@app.get("/queue")
+def queue():
+    with get_conn() as conn:
+        snapshot = queue_snapshot(conn)
+        rows = {
+            r["id"]: r
+            for r in conn.execute(
+                "SELECT id,project_path,prompt,priority,submitter,estimated_cost_s,created_at "
+                "FROM runs WHERE status='queued'"
+            ).fetchall()
+        }
+    return {
+        "queue": [
+            {**dict(rows[run_id]), **position}
+            for run_id, position in snapshot.items()
+            if run_id in rows
+        ]
+    }
 
 
 @app.get("/runs")
 def list_runs():
     with get_conn() as conn:
         rows = conn.execute(
-            "SELECT id,project_path,prompt,status,created_at,updated_at FROM runs ORDER BY id DESC LIMIT 100"
+            "SELECT id,project_path,prompt,status,priority,submitter,estimated_cost_s,created_at,updated_at "
+            "FROM runs ORDER BY id DESC LIMIT 100"
         ).fetchall()
     return {"runs": [dict(r) for r in rows]}
 
@@ -154,22 +390,132 @@ def get_run(run_id: int):
     with get_conn() as conn:
         run = conn.execute("SELECT * FROM runs WHERE id=?", (run_id,)).fetchone()
         if not run:
-            raise HTTPException(status_code=404, detail="Run not found")
+            archived = load_archived_run(conn, settings.archive_dir, run_id)
+            if archived is None:
+                raise HTTPException(status_code=404, detail="Run not found")
+            return serialize_archived_run(archived)
         logs = conn.execute(
-            "SELECT kind,message,created_at FROM run_logs WHERE run_id=? ORDER BY id ASC",
+            "SELECT kind,message,message_encoding,created_at FROM run_logs WHERE run_id=? ORDER BY id ASC",
             (run_id,),
         ).fetchall()
         changes = conn.execute(
-            "SELECT id,file_path,diff,accepted FROM file_changes WHERE run_id=? ORDER BY id ASC",
+            "SELECT id,file_path,diff,diff_encoding,accepted,lines_added,lines_removed "
+            "FROM file_changes WHERE run_id=? ORDER BY id ASC",
+            (run_id,),
+        ).fetchall()
+        timings = conn.execute(
+            "SELECT stage,status,started_at,duration_ms,model,prompt_eval_count,prompt_eval_ms,"
+            "eval_count,eval_ms,tokens_per_s FROM run_timings WHERE run_id=? ORDER BY id ASC",
+            (run_id,),
+        ).fetchall()
+        queue_position = queue_snapshot(conn).get(run_id) if run["status"] == "queued" else None
+        tasks = conn.execute(
+            "SELECT id,project_path,files,status,answer,error,started_at,finished_at "
+            "FROM batch_tasks WHERE run_id=? ORDER BY id ASC",
             (run_id,),
         ).fetchall()
     return {
         "run": dict(run),
-        "logs": [dict(x) for x in logs],
-        "changes": [dict(x) for x in changes],
+        "archived": False,
+        "queue": queue_position,
+        "batch": serialize_batch(tasks) if tasks else None,
+        "logs": [serialize_log(x) for x in logs],
+        "changes": [serialize_change(x) for x in changes],
+        "timings": [dict(x) for x in timings],
+    }
+
+
+def serialize_archived_run(record: dict) -> dict:
+    return {
+        "run": record["run"],
+        "archived": True,
+        "queue": None,
+        "batch": serialize_batch(record["batch_tasks"]) if record["batch_tasks"] else None,
+        "logs": record["logs"],
+        "changes": record["changes"],
+        "timings": record["timings"],
     }
 
 
+def serialize_log(row) -> dict:
+    log = dict(row)
+    log["message"] = decode_diff(log["message"], log.pop("message_encoding"))
+    return log
+
+
+def serialize_batch(rows) -> dict:
+    tasks = [{**dict(row), "files": json.loads(row["files"])} for row in rows]
+    counts: dict[str, int] = {}
+    for task in tasks:
+        counts[task["status"]] = counts.get(task["status"], 0) + 1
+    return {"total": len(tasks), "by_status": counts, "tasks": tasks}
+
+
+def serialize_change(row) -> dict:
+    change = dict(row)
+    change["diff"] = decode_diff(change["diff"], change.pop("diff_encoding"))
+    return change
+
+
+@app.get("/archives")
+def archives():
+    with get_conn() as conn:
+        return {"archives": list_archives(conn, settings.archive_dir)}
+
+
+@app.get("/archives/{month}")
+def archived_runs(month: str):
+    with get_conn() as conn:
+        rows = conn.execute(
+            "SELECT run_id,project_path,prompt,status,created_at,archived_at FROM archived_runs "
+            "WHERE archive_file=? ORDER BY run_id DESC",
+            (f"runs-{month}.jsonl.gz",),
+        ).fetchall()
+    return {"month": month, "runs": [dict(r) for r in rows]}
+
+
+@app.post("/retention/run")
+def run_retention_now():
+    return retention_service.run_once()
+
+
+PROFILE_DOWNLOADS = {
+    "pstats": ("application/octet-stream", "pstats"),
+    "collapsed": ("text/plain; charset=utf-8", "folded"),
+    "text": ("text/plain; charset=utf-8", "txt"),
+}
+
+
+@app.get("/runs/{run_id}/profiles")
+def list_profiles(run_id: int):
+    with get_conn() as conn:
+        rows = conn.execute(
+            "SELECT id,kind,format,summary,length(content) AS compressed_size,created_at "
+            "FROM run_profiles WHERE run_id=? ORDER BY id ASC",
+            (run_id,),
+        ).fetchall()
+    return {"profiles": [dict(r) for r in rows]}
+
+
+@app.get("/runs/{run_id}/profiles/{profile_id}")
+def download_profile(run_id: int, profile_id: int):
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT kind,format,content FROM run_profiles WHERE id=? AND run_id=?",
+            (profile_id, run_id),
+        ).fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    media_type, extension = PROFILE_DOWNLOADS.get(row["format"], ("application/octet-stream", "bin"))
+    filename = f"run-{run_id}-{row['kind']}.{extension}"
+    return Response(
+        zlib.decompress(row["content"]),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @app.post("/changes/{change_id}/accept")
 def accept_change(change_id: int, payload: AcceptChangeRequest):
     with get_conn() as conn:
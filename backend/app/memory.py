@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+
+
+@dataclass
+class MemoryEntry:
+    step: int
+    label: str
+    content: str
+
+
+@dataclass
+class WorkingMemory:
+    """Bounded scratchpad rendered into every agent turn.
+
+    Newest entries are kept verbatim up to max_chars; older ones are folded
+    into one-line stubs so the model still knows what it already looked at,
+    keeping prompt size flat as the run gets longer.
+    """
+
+    max_chars: int
+    entries: list[MemoryEntry] = field(default_factory=list)
+    folded: list[str] = field(default_factory=list)
+    max_folded: int = 40
+
+    def add(self, step: int, label: str, content: str) -> None:
+        self.entries.append(MemoryEntry(step, label, content))
+        self._evict()
+
+    def _evict(self) -> None:
+        while len(self.entries) > 1 and self.size() > self.max_chars:
+            old = self.entries.pop(0)
+            self.folded.append(f"step {old.step} {old.label} ({len(old.content)} chars, dropped from memory)")
+        if len(self.folded) > self.max_folded:
+            dropped = len(self.folded) - self.max_folded + 1
+            self.folded = [f"... {dropped} older notes omitted", *self.folded[dropped:]]
+        if self.entries and self.size() > self.max_chars:
+            last = self.entries[-1]
+            last.content = last.content[: max(self.max_chars - 200, 200)] + "\n...[truncated]"
+
+    def size(self) -> int:
+        return sum(len(e.label) + len(e.content) for e in self.entries)
+
+    def render(self) -> str:
+        parts = []
+        if self.folded:
+            parts.append("Earlier steps:\n" + "\n".join(f"- {line}" for line in self.folded))
+        parts += [f"[step {e.step}] {e.label}\n{e.content}" for e in self.entries]
+        return "\n\n".join(parts) if parts else "(empty)"
+
+
+@dataclass
+class AgentBudget:
+    max_steps: int
+    max_tokens: int
+    used: int = 0
+
+    def charge(self, stats: dict, prompt: str, reply: str) -> None:
+        """Count Ollama's reported tokens, falling back to ~4 chars per token."""
+        prompt_tokens = stats.get("prompt_eval_count") or len(prompt) // 4
+        reply_tokens = stats.get("eval_count") or len(reply) // 4
+        self.used += prompt_tokens + reply_tokens
+
+    def remaining(self) -> int:
+        return max(self.max_tokens - self.used, 0)
+
+    def exhausted(self) -> bool:
+        return self.used >= self.max_tokens
+
+
+def tool_call_key(action: dict) -> str:
+    args = {k: v for k, v in action.items() if k != "tool"}
+    return f"{action.get('tool')}:{json.dumps(args, sort_keys=True)}"
+
+
+def clip(text: str, max_chars: int) -> str:
+    """Keep the head and tail of text; used when summarization is unavailable."""
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return f"{text[:half]}\n...[{len(text) - max_chars} chars omitted]...\n{text[-half:]}"
@@ -0,0 +1,208 @@
+"""Prometheus text-format metrics.
+
+In-process histograms cover what only the backend sees (DB session latency);
+queue depth, stage latencies and model throughput are derived from SQLite at
+scrape time so they include work recorded by the worker process.
+
+Retention deletes run_timings rows of archived runs; roll_up_timings() folds
+them into run_timing_rollup first, and the counters and histograms add that
+rollup to the live rows so they never go backwards.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+
+STAGE_BUCKETS_S = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+DB_BUCKETS_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+THROUGHPUT_WINDOW_S = 3600
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+def _histogram_lines(name: str, buckets: tuple[float, ...], cumulative: list[int], total: float, count: int, **labels):
+    for bound, value in zip(buckets, cumulative):
+        yield f"{name}_bucket{_labels(**labels, le=_number(bound))} {value}"
+    yield f"{name}_bucket{_labels(**labels, le='+Inf')} {count}"
+    yield f"{name}_sum{_labels(**labels)} {_number(total)}"
+    yield f"{name}_count{_labels(**labels)} {count}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+            *_histogram_lines(self.name, self.buckets, counts, total, count),
+        ]
+
+
+DB_SESSION_SECONDS = Histogram(
+    "agentic_db_session_seconds", "Time a backend request held a SQLite connection.", DB_BUCKETS_S
+)
+
+
+def _queue_lines(conn: sqlite3.Connection) -> list[str]:
+    lines = [
+        "# HELP agentic_runs Runs by status.",
+        "# TYPE agentic_runs gauge",
+    ]
+    counts = dict(conn.execute("SELECT status, COUNT(*) FROM runs GROUP BY status").fetchall())
+    for status in sorted({"queued", "running", *counts}):
+        lines.append(f"agentic_runs{_labels(status=status)} {counts.get(status, 0)}")
+
+    oldest = conn.execute(
+        "SELECT strftime('%s','now') - strftime('%s', MIN(created_at)) FROM runs WHERE status='queued'"
+    ).fetchone()[0]
+    lines += [
+        "# HELP agentic_queue_depth Runs waiting for a worker.",
+        "# TYPE agentic_queue_depth gauge",
+        f"agentic_queue_depth {counts.get('queued', 0)}",
+        "# HELP agentic_queue_oldest_age_seconds Age of the oldest queued run.",
+        "# TYPE agentic_queue_oldest_age_seconds gauge",
+        f"agentic_queue_oldest_age_seconds {_number(oldest or 0)}",
+    ]
+    return lines
+
+
+# Per (stage, status, model): count, duration_ms, eval_count, eval_ms,
+# prompt_eval_count, prompt_eval_ms, then one cumulative count per STAGE_BUCKETS_S.
+_TIMING_TOTALS_SQL = (
+    "SELECT stage, status, COALESCE(model, ''), COUNT(*), SUM(duration_ms), SUM(COALESCE(eval_count,0)), "
+    "SUM(COALESCE(eval_ms,0)), SUM(COALESCE(prompt_eval_count,0)), SUM(COALESCE(prompt_eval_ms,0)), "
+    + ",".join(f"SUM(CASE WHEN duration_ms <= {bound * 1000} THEN 1 ELSE 0 END)" for bound in STAGE_BUCKETS_S)
+    + " FROM run_timings {where} GROUP BY 1, 2, 3"
+)
+
+
+def _add(totals: dict, key, values) -> None:
+    current = totals.get(key)
+    totals[key] = [v or 0 for v in values] if current is None else [a + (b or 0) for a, b in zip(current, values)]
+
+
+def _timing_totals(conn: sqlite3.Connection) -> dict[tuple[str, str, str], list[float]]:
+    """Totals over live run_timings plus what retention has rolled up."""
+    totals: dict[tuple[str, str, str], list[float]] = {}
+    for stage, status, model, *values in conn.execute(_TIMING_TOTALS_SQL.format(where="")):
+        _add(totals, (stage, status, model), values)
+    for stage, status, model, *values, buckets in conn.execute(
+        "SELECT stage, status, model, count, duration_ms, eval_count, eval_ms, prompt_eval_count, prompt_eval_ms, "
+        "buckets FROM run_timing_rollup"
+    ):
+        _add(totals, (stage, status, model), [*values, *json.loads(buckets)])
+    return totals
+
+
+def roll_up_timings(conn: sqlite3.Connection, run_ids: list[int]) -> None:
+    """Fold the run_timings rows of `run_ids` into run_timing_rollup; call before deleting them."""
+    if not run_ids:
+        return
+    marks = ",".join("?" * len(run_ids))
+    archived: dict[tuple[str, str, str], list[float]] = {}
+    for stage, status, model, *values in conn.execute(
+        _TIMING_TOTALS_SQL.format(where=f"WHERE run_id IN ({marks})"), run_ids
+    ):
+        key = (stage, status, model)
+        _add(archived, key, values)
+        row = conn.execute(
+            "SELECT count, duration_ms, eval_count, eval_ms, prompt_eval_count, prompt_eval_ms, buckets "
+            "FROM run_timing_rollup WHERE stage=? AND status=? AND model=?",
+            key,
+        ).fetchone()
+        if row:
+            _add(archived, key, [*row[:6], *json.loads(row[6])])
+    conn.executemany(
+        "INSERT OR REPLACE INTO run_timing_rollup(stage, status, model, count, duration_ms, eval_count, eval_ms, "
+        "prompt_eval_count, prompt_eval_ms, buckets) VALUES(?,?,?,?,?,?,?,?,?,?)",
+        [(*key, *values[:6], json.dumps(values[6:])) for key, values in archived.items()],
+    )
+
+
+def _stage_lines(totals: dict[tuple[str, str, str], list[float]]) -> list[str]:
+    name = "agentic_run_stage_seconds"
+    by_stage: dict[tuple[str, str], list[float]] = {}
+    for (stage, status, _model), values in totals.items():
+        _add(by_stage, (stage, status), values)
+    lines = [
+        f"# HELP {name} Duration of run pipeline stages recorded by the worker.",
+        f"# TYPE {name} histogram",
+    ]
+    for (stage, status), (count, total_ms, _ec, _em, _pc, _pm, *buckets) in sorted(by_stage.items()):
+        lines += _histogram_lines(name, STAGE_BUCKETS_S, buckets, total_ms / 1000, count, stage=stage, status=status)
+    return lines
+
+
+def _model_lines(conn: sqlite3.Connection, timing_totals: dict[tuple[str, str, str], list[float]]) -> list[str]:
+    by_model: dict[str, list[float]] = {}
+    for (stage, _status, model), values in timing_totals.items():
+        if stage == "generate" and model:
+            _add(by_model, model, values)
+    # (model, requests, eval tokens, eval ms, prompt tokens, prompt ms), indexed by `series` below.
+    totals = [(model, values[0], *values[2:6]) for model, values in sorted(by_model.items())]
+    recent = dict(
+        conn.execute(
+            "SELECT model, SUM(eval_count) / (SUM(eval_ms) / 1000.0) FROM run_timings "
+            "WHERE stage='generate' AND model IS NOT NULL AND eval_ms > 0 AND started_at >= ? GROUP BY model",
+            (time.time() - THROUGHPUT_WINDOW_S,),
+        ).fetchall()
+    )
+    series = {
+        "agentic_model_requests_total": ("counter", "Generate calls per model.", 1),
+        "agentic_model_eval_tokens_total": ("counter", "Tokens generated per model.", 2),
+        "agentic_model_eval_seconds_total": ("counter", "Generation time per model as reported by Ollama.", 3),
+        "agentic_model_prompt_tokens_total": ("counter", "Prompt tokens evaluated per model.", 4),
+        "agentic_model_prompt_eval_seconds_total": ("counter", "Prompt evaluation time per model.", 5),
+    }
+    lines: list[str] = []
+    for metric, (kind, help_text, index) in series.items():
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        for row in totals:
+            value = row[index] / 1000 if metric.endswith("seconds_total") else row[index]
+            lines.append(f"{metric}{_labels(model=row[0])} {_number(value)}")
+    lines += [
+        f"# HELP agentic_model_tokens_per_second Generation throughput over the last {THROUGHPUT_WINDOW_S}s.",
+        "# TYPE agentic_model_tokens_per_second gauge",
+    ]
+    for model, rate in sorted(recent.items()):
+        lines.append(f"agentic_model_tokens_per_second{_labels(model=model)} {_number(rate or 0)}")
+    return lines
+
+
+def render_metrics(conn: sqlite3.Connection) -> str:
+    totals = _timing_totals(conn)
+    lines = _queue_lines(conn) + _stage_lines(totals) + _model_lines(conn, totals) + DB_SESSION_SECONDS.render()
+    return "\n".join(lines) + "\n"
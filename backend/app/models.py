@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
 
 
 class RunCreate(BaseModel):
@@ -7,6 +7,22 @@ class RunCreate(BaseModel):
     prompt: str
     fast_model: Optional[str] = None
     deep_model: Optional[str] = None
+    profile: bool = False
+    priority: Literal["interactive", "normal", "bulk"] = "normal"
+    submitter: Optional[str] = None
+
+
+class BatchRunCreate(BaseModel):
+    project_paths: list[str] = Field(min_length=1)
+    prompt: str
+    include: Optional[str] = None
+    files: Optional[list[str]] = None
+    files_per_task: int = Field(default=1, ge=1, le=50)
+    max_parallel: int = Field(default=4, ge=1, le=32)
+    fast_model: Optional[str] = None
+    deep_model: Optional[str] = None
+    priority: Literal["interactive", "normal", "bulk"] = "bulk"
+    submitter: Optional[str] = None
 
 
 class RunResponse(BaseModel):
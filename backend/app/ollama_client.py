@@ -1,8 +1,13 @@
-import httpx
 from .config import settings
+from .spans import generation_stats
+
+# httpx is imported inside each call: it is the slowest import in the backend
+# (~0.1s) and nothing needs it until the first Ollama request.
 
 
 async def list_models() -> list[str]:
+    import httpx
+
     async with httpx.AsyncClient(timeout=10) as client:
         resp = await client.get(f"{settings.ollama_base_url}/api/tags")
         resp.raise_for_status()
@@ -10,11 +15,29 @@ async def list_models() -> list[str]:
         return [m["name"] for m in payload.get("models", [])]
 
 
-async def generate(model: str, prompt: str) -> str:
+async def loaded_models(timeout_s: float = 2.0) -> list[str]:
+    """Models Ollama currently holds in memory (/api/ps)."""
+    import httpx
+
+    async with httpx.AsyncClient(timeout=timeout_s) as client:
+        resp = await client.get(f"{settings.ollama_base_url}/api/ps")
+        resp.raise_for_status()
+        return [m.get("name") or m.get("model") for m in resp.json().get("models", [])]
+
+
+async def generate_with_stats(model: str, prompt: str) -> tuple[str, dict]:
+    import httpx
+
     async with httpx.AsyncClient(timeout=120) as client:
         resp = await client.post(
             f"{settings.ollama_base_url}/api/generate",
-            json={"model": model, "prompt": prompt, "stream": False},
+            json={"model": model, "prompt": prompt, "stream": False, "keep_alive": settings.ollama_keep_alive},
         )
         resp.raise_for_status()
-        return resp.json().get("response", "")
+        payload = resp.json()
+        return payload.get("response", ""), {**generation_stats(payload), "model": payload.get("model") or model}
+
+
+async def generate(model: str, prompt: str) -> str:
+    text, _ = await generate_with_stats(model, prompt)
+    return text
@@ -0,0 +1,313 @@
+"""Retention for run history: compaction, monthly archives and incremental vacuum.
+
+Finished runs older than RETENTION_COMPACT_AFTER_DAYS get long log messages and
+any legacy plain-text diffs zlib-compressed in place. Runs whose status has a
+policy in RETENTION_ARCHIVE_AFTER_DAYS (e.g. ``completed=90,failed=30``) are
+moved out of the hot DB once older than that: the run, its logs, changes,
+timings, batch tasks and profile summaries become one JSON document appended
+as its own gzip member to ``ARCHIVE_DIR/runs-YYYY-MM.jsonl.gz``. The file
+stays a valid gzip stream (``zcat`` works), and ``archived_runs`` records each
+member's offset so ``GET /runs/{id}`` reads back a single run without
+decompressing the month. Their timings are first added to the /metrics rollup
+(``metrics.roll_up_timings``) so counters stay monotonic.
+
+Archiving and vacuuming only run while no run is queued or running; freed
+pages are returned with ``PRAGMA incremental_vacuum`` a bounded number at a time.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from .db import get_conn
+from .diffing import decode_diff, encode_diff
+from .metrics import roll_up_timings
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("completed", "failed", "awaiting_review")
+LOG_COMPRESS_MIN_CHARS = 256
+ARCHIVE_BATCH = 100
+
+_AGE_SQL = "julianday('now') - julianday(COALESCE(updated_at, created_at))"
+
+
+def parse_policies(raw: str) -> dict[str, float]:
+    """``"completed=90,failed=30"`` -> {"completed": 90.0, "failed": 30.0} (days)."""
+    policies: dict[str, float] = {}
+    for item in raw.split(","):
+        if not item.strip():
+            continue
+        status, _, days = item.partition("=")
+        status = status.strip()
+        if status not in FINISHED_STATUSES:
+            raise ValueError(f"Retention policy for unsupported status: {status!r}")
+        policies[status] = float(days)
+    return policies
+
+
+def is_low_load(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT COUNT(*) FROM runs WHERE status IN ('queued','running')").fetchone()[0] == 0
+
+
+def compact_runs(conn: sqlite3.Connection, older_than_days: float) -> dict[str, int]:
+    """Compress long log messages and plain-text diffs of finished runs."""
+    placeholders = ",".join("?" * len(FINISHED_STATUSES))
+    old_runs = f"SELECT id FROM runs WHERE status IN ({placeholders}) AND {_AGE_SQL} >= ?"
+    params = (*FINISHED_STATUSES, older_than_days)
+
+    logs = conn.execute(
+        f"SELECT id, message FROM run_logs WHERE message_encoding='plain' AND length(message) >= ? "
+        f"AND run_id IN ({old_runs})",
+        (LOG_COMPRESS_MIN_CHARS, *params),
+    ).fetchall()
+    conn.executemany(
+        "UPDATE run_logs SET message=?, message_encoding=? WHERE id=?",
+        [(*encode_diff(row[1]), row[0]) for row in logs],
+    )
+
+    diffs = conn.execute(
+        f"SELECT id, diff FROM file_changes WHERE diff_encoding!='zlib' AND run_id IN ({old_runs})", params
+    ).fetchall()
+    conn.executemany(
+        "UPDATE file_changes SET diff=?, diff_encoding=? WHERE id=?",
+        [(*encode_diff(decode_diff(row[1], 'plain')), row[0]) for row in diffs],
+    )
+    conn.commit()
+    return {"logs": len(logs), "diffs": len(diffs)}
+
+
+def _rows(conn: sqlite3.Connection, sql: str, run_id: int) -> list[dict]:
+    cur = conn.execute(sql, (run_id,))
+    names = [col[0] for col in cur.description]
+    return [dict(zip(names, row)) for row in cur.fetchall()]
+
+
+def export_run(conn: sqlite3.Connection, run_id: int) -> dict:
+    """Everything the API shows for a run, as plain JSON-able data."""
+    run = _rows(conn, "SELECT * FROM runs WHERE id=?", run_id)[0]
+    logs = _rows(
+        conn, "SELECT kind,message,message_encoding,created_at FROM run_logs WHERE run_id=? ORDER BY id ASC", run_id
+    )
+    changes = _rows(
+        conn,
+        "SELECT id,file_path,diff,diff_encoding,accepted,lines_added,lines_removed "
+        "FROM file_changes WHERE run_id=? ORDER BY id ASC",
+        run_id,
+    )
+    for log in logs:
+        log["message"] = decode_diff(log["message"], log.pop("message_encoding"))
+    for change in changes:
+        change["diff"] = decode_diff(change["diff"], change.pop("diff_encoding"))
+    profiles = _rows(
+        conn,
+        "SELECT kind,format,summary,length(content) AS compressed_size,created_at FROM run_profiles WHERE run_id=?",
+        run_id,
+    )
+    return {
+        "run": run,
+        "logs": logs,
+        "changes": changes,
+        "timings": _rows(
+            conn,
+            "SELECT stage,status,started_at,duration_ms,model,prompt_eval_count,prompt_eval_ms,"
+            "eval_count,eval_ms,tokens_per_s FROM run_timings WHERE run_id=? ORDER BY id ASC",
+            run_id,
+        ),
+        "batch_tasks": _rows(
+            conn,
+            "SELECT id,project_path,files,status,answer,error,started_at,finished_at "
+            "FROM batch_tasks WHERE run_id=? ORDER BY id ASC",
+            run_id,
+        ),
+        "profiles": profiles,
+    }
+
+
+def _json_default(value):
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Cannot archive {type(value).__name__}")
+
+
+def archive_file_for(archive_dir: str | Path, created_at: str | None) -> Path:
+    month = (created_at or time.strftime("%Y-%m-%d", time.gmtime()))[:7]
+    return Path(archive_dir) / f"runs-{month}.jsonl.gz"
+
+
+def archive_runs(
+    conn: sqlite3.Connection, archive_dir: str | Path, policies: dict[str, float], limit: int = ARCHIVE_BATCH
+) -> int:
+    """Move up to `limit` runs matching `policies` into monthly archives; returns how many."""
+    candidates: list[tuple[int, str]] = []
+    for status, days in policies.items():
+        candidates += conn.execute(
+            f"SELECT id, created_at FROM runs WHERE status=? AND {_AGE_SQL} >= ? ORDER BY id ASC LIMIT ?",
+            (status, days, limit - len(candidates)),
+        ).fetchall()
+        if len(candidates) >= limit:
+            break
+    if not candidates:
+        return 0
+
+    Path(archive_dir).mkdir(parents=True, exist_ok=True)
+    index_rows = []
+    by_file: dict[Path, list[int]] = {}
+    for run_id, created_at in candidates:
+        by_file.setdefault(archive_file_for(archive_dir, created_at), []).append(run_id)
+
+    for path, run_ids in sorted(by_file.items()):
+        with path.open("ab") as fh:
+            for run_id in run_ids:
+                record = export_run(conn, run_id)
+                member = gzip.compress((json.dumps(record, default=_json_default) + "\n").encode("utf-8"), 6)
+                offset = fh.tell()
+                fh.write(member)
+                run = record["run"]
+                index_rows.append(
+                    (
+                        run_id,
+                        run["project_path"],
+                        run["prompt"][:500],
+                        run["status"],
+                        run["created_at"],
+                        path.name,
+                        offset,
+                        len(member),
+                    )
+                )
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    ids = [row[0] for row in index_rows]
+    marks = ",".join("?" * len(ids))
+    conn.executemany(
+        "INSERT OR REPLACE INTO archived_runs(run_id,project_path,prompt,status,created_at,archive_file,"
+        "archive_offset,archive_length) VALUES(?,?,?,?,?,?,?,?)",
+        index_rows,
+    )
+    roll_up_timings(conn, ids)
+    for table in ("run_logs", "file_changes", "run_timings", "run_profiles", "batch_tasks"):
+        conn.execute(f"DELETE FROM {table} WHERE run_id IN ({marks})", ids)
+    conn.execute(f"DELETE FROM runs WHERE id IN ({marks})", ids)
+    conn.commit()
+    return len(ids)
+
+
+def load_archived_run(conn: sqlite3.Connection, archive_dir: str | Path, run_id: int) -> dict | None:
+    row = conn.execute(
+        "SELECT archive_file, archive_offset, archive_length FROM archived_runs WHERE run_id=?", (run_id,)
+    ).fetchone()
+    if not row:
+        return None
+    with (Path(archive_dir) / row[0]).open("rb") as fh:
+        fh.seek(row[1])
+        member = fh.read(row[2])
+    return json.loads(gzip.decompress(member))
+
+
+def incremental_vacuum(conn: sqlite3.Connection, max_pages: int) -> int:
+    """Return up to `max_pages` free pages to the OS; converts the DB to incremental mode once."""
+    conn.commit()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return 0
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    pages = min(free, max_pages)
+    if pages:
+        # executescript steps the pragma to completion; execute() frees only one page.
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    return pages
+
+
+def run_retention(
+    conn: sqlite3.Connection,
+    archive_dir: str | Path,
+    policies: dict[str, float],
+    compact_after_days: float,
+    vacuum_pages: int,
+    max_batches: int = 50,
+) -> dict:
+    report = {"compacted": compact_runs(conn, compact_after_days), "archived": 0, "vacuumed_pages": 0, "skipped": None}
+    for _ in range(max_batches):
+        if not is_low_load(conn):
+            report["skipped"] = "busy"
+            return report
+        archived = archive_runs(conn, archive_dir, policies)
+        report["archived"] += archived
+        if archived < ARCHIVE_BATCH:
+            break
+    if is_low_load(conn):
+        report["vacuumed_pages"] = incremental_vacuum(conn, vacuum_pages)
+    else:
+        report["skipped"] = "busy"
+    return report
+
+
+def list_archives(conn: sqlite3.Connection, archive_dir: str | Path) -> list[dict]:
+    rows = conn.execute(
+        "SELECT archive_file, COUNT(*), MIN(run_id), MAX(run_id) FROM archived_runs "
+        "GROUP BY archive_file ORDER BY archive_file"
+    ).fetchall()
+    archives = []
+    for name, count, first, last in rows:
+        path = Path(archive_dir) / name
+        archives.append(
+            {
+                "month": name.removeprefix("runs-").removesuffix(".jsonl.gz"),
+                "file": name,
+                "runs": count,
+                "first_run_id": first,
+                "last_run_id": last,
+                "bytes": path.stat().st_size if path.exists() else None,
+            }
+        )
+    return archives
+
+
+class RetentionService:
+    def __init__(
+        self, archive_dir: str, policies: dict[str, float], compact_after_days: float, interval_s: float, vacuum_pages: int
+    ):
+        self.archive_dir = archive_dir
+        self.policies = policies
+        self.compact_after_days = compact_after_days
+        self.interval_s = interval_s
+        self.vacuum_pages = vacuum_pages
+        self.last_report: dict | None = None
+        self._task: asyncio.Task | None = None
+
+    def run_once(self) -> dict:
+        with get_conn() as conn:
+            self.last_report = run_retention(
+                conn, self.archive_dir, self.policies, self.compact_after_days, self.vacuum_pages
+            )
+        return self.last_report
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                report = await asyncio.to_thread(self.run_once)
+            except Exception:
+                logger.exception("retention pass failed")
+                continue
+            logger.info("retention pass: %s", report)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
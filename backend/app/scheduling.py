@@ -0,0 +1,220 @@
+"""Run scheduling: priority classes, fair share, aging and short-job-first.
+
+Every queued run gets a score measured in "seconds of waiting it is worth":
+
+    score = wait_s * AGING_FACTOR
+          + CLASS_BOOST_S[priority]
+          - FAIR_SHARE_WEIGHT * (recent usage of its submitter + of its project)
+          - estimated_cost_s            (interactive runs only: short job first)
+
+Recent usage is the estimated cost of runs started within FAIR_SHARE_WINDOW_S
+plus runs already picked ahead in the same ordering, so one submitter's bulk
+backlog interleaves with everyone else's work. A batch run spanning several
+projects is charged to each of them in proportion to its subtasks there. Because the wait term grows
+without bound, low-priority runs always get a turn eventually.
+
+This module is shared by the backend (queue position / start estimates) and
+the worker (claiming the next run); the worker image copies it from backend/app.
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+import re
+import sqlite3
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+PRIORITIES = ("interactive", "normal", "bulk")
+CLASS_BOOST_S = {"interactive": 600.0, "normal": 120.0, "bulk": 0.0}
+AGING_FACTOR = float(os.getenv("SCHED_AGING_FACTOR", "1.0"))
+FAIR_SHARE_WEIGHT = float(os.getenv("SCHED_FAIR_SHARE_WEIGHT", "0.5"))
+FAIR_SHARE_WINDOW_S = float(os.getenv("SCHED_FAIR_SHARE_WINDOW_S", "3600"))
+DEFAULT_COST_S = 60.0
+EXPECTED_OUTPUT_TOKENS = 600
+MAX_CONTEXT_BYTES = int(os.getenv("MAX_CONTEXT_FILES", "40")) * int(os.getenv("MAX_CONTEXT_CHARS_PER_FILE", "5000"))
+
+
+@dataclass
+class QueuedRun:
+    id: int
+    project_path: str
+    submitter: str
+    priority: str
+    estimated_cost_s: float
+    created_at: float
+    # Fraction of the run's work per project (batch runs); empty means all of it is project_path.
+    projects: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class ActiveRun:
+    project_path: str
+    submitter: str
+    estimated_cost_s: float
+    started_at: float
+    running: bool
+    projects: dict[str, float] = field(default_factory=dict)
+
+
+def project_shares(run: QueuedRun | ActiveRun) -> dict[str, float]:
+    return run.projects or {run.project_path: 1.0}
+
+
+def _cost(value) -> float:
+    return float(value) if value is not None else DEFAULT_COST_S
+
+
+def _batch_projects(conn: sqlite3.Connection, since: int) -> dict[int, dict[str, float]]:
+    """Per-project share of each queued/recent batch run's subtasks."""
+    counts: dict[int, dict[str, int]] = defaultdict(dict)
+    for run_id, project, count in conn.execute(
+        "SELECT b.run_id, b.project_path, COUNT(*) FROM batch_tasks b JOIN runs r ON r.id = b.run_id "
+        "WHERE r.status IN ('queued','running') OR CAST(strftime('%s', r.started_at) AS INTEGER) >= ? "
+        "GROUP BY b.run_id, b.project_path",
+        (since,),
+    ):
+        counts[run_id][project] = count
+    return {
+        run_id: {project: count / sum(per_project.values()) for project, count in per_project.items()}
+        for run_id, per_project in counts.items()
+    }
+
+
+def load_queue(conn: sqlite3.Connection, now: float) -> tuple[list[QueuedRun], list[ActiveRun]]:
+    since = int(now - FAIR_SHARE_WINDOW_S)
+    batches = _batch_projects(conn, since)
+    queued = [
+        QueuedRun(
+            row[0],
+            row[1],
+            row[2] or "anonymous",
+            row[3] if row[3] in CLASS_BOOST_S else "normal",
+            _cost(row[4]),
+            row[5] or now,
+            batches.get(row[0], {}),
+        )
+        for row in conn.execute(
+            "SELECT id, project_path, submitter, priority, estimated_cost_s, CAST(strftime('%s', created_at) AS REAL) "
+            "FROM runs WHERE status='queued' ORDER BY id ASC"
+        )
+    ]
+    active = [
+        ActiveRun(
+            row[1], row[2] or "anonymous", _cost(row[3]), row[4] or now, row[5] == "running", batches.get(row[0], {})
+        )
+        for row in conn.execute(
+            "SELECT id, project_path, submitter, estimated_cost_s, CAST(strftime('%s', started_at) AS REAL), status "
+            "FROM runs WHERE status='running' OR CAST(strftime('%s', started_at) AS INTEGER) >= ?",
+            (since,),
+        )
+    ]
+    return queued, active
+
+
+def schedule(queued: list[QueuedRun], active: list[ActiveRun], now: float, limit: int | None = None) -> list[QueuedRun]:
+    """Return queued runs in the order they should start (first `limit` only if given)."""
+    usage: dict[tuple[str, str], float] = defaultdict(float)
+
+    def charge(run: QueuedRun | ActiveRun) -> None:
+        usage[("submitter", run.submitter)] += run.estimated_cost_s
+        for project, share in project_shares(run).items():
+            usage[("project", project)] += run.estimated_cost_s * share
+
+    def penalty(submitter: str, projects: tuple[tuple[str, float], ...]) -> float:
+        return usage[("submitter", submitter)] + sum(share * usage[("project", p)] for p, share in projects)
+
+    for run in active:
+        charge(run)
+
+    def static_score(run: QueuedRun) -> float:
+        value = max(now - run.created_at, 0.0) * AGING_FACTOR + CLASS_BOOST_S[run.priority]
+        if run.priority == "interactive":
+            value -= run.estimated_cost_s
+        return value
+
+    # Runs sharing submitter, project and class see the same usage penalty, so
+    # their relative order is fixed; only group heads need comparing per pick.
+    groups: dict[tuple, list[tuple[float, int, QueuedRun]]] = defaultdict(list)
+    for run in queued:
+        projects = tuple(sorted(project_shares(run).items()))
+        groups[(run.submitter, projects, run.priority)].append((static_score(run), -run.id, run))
+    for members in groups.values():
+        members.sort(key=lambda item: item[:2])
+
+    order: list[QueuedRun] = []
+    while groups and (limit is None or len(order) < limit):
+        key = max(
+            groups,
+            key=lambda k: (
+                groups[k][-1][0] - FAIR_SHARE_WEIGHT * penalty(k[0], k[1]),
+                groups[k][-1][1],
+            ),
+        )
+        best = groups[key].pop()[2]
+        if not groups[key]:
+            del groups[key]
+        order.append(best)
+        charge(best)
+    return order
+
+
+def estimate_start_times(order: list[QueuedRun], active: list[ActiveRun], now: float, concurrency: int) -> dict[int, float]:
+    """Simulate `concurrency` worker slots draining the queue in `order`."""
+    slots = sorted(max(run.started_at + run.estimated_cost_s, now) for run in active if run.running)
+    slots = slots[:concurrency] + [now] * max(concurrency - len(slots), 0)
+    heapq.heapify(slots)
+    starts: dict[int, float] = {}
+    for run in order:
+        free_at = heapq.heappop(slots)
+        starts[run.id] = free_at
+        heapq.heappush(slots, free_at + run.estimated_cost_s)
+    return starts
+
+
+def estimate_context_bytes(project_path: str, max_entries: int = 2000) -> int:
+    """Bytes the worker is likely to load into context, from a bounded tree walk."""
+    total = 0
+    seen = 0
+    for root, dirs, files in os.walk(project_path):
+        dirs.sort()
+        for name in sorted(files):
+            seen += 1
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+            if total >= MAX_CONTEXT_BYTES or seen >= max_entries:
+                return min(total, MAX_CONTEXT_BYTES)
+    return total
+
+
+def model_size_b(model: str | None) -> float:
+    match = re.search(r"(\d+(?:\.\d+)?)\s*b\b", (model or "").lower())
+    return float(match.group(1)) if match else 7.0
+
+
+def model_throughput(conn: sqlite3.Connection, model: str | None) -> tuple[float, float] | None:
+    """Observed (prompt tokens/s, generated tokens/s) for a model from recent generate spans."""
+    row = conn.execute(
+        "SELECT SUM(prompt_eval_count), SUM(prompt_eval_ms), SUM(eval_count), SUM(eval_ms) FROM ("
+        "SELECT prompt_eval_count, prompt_eval_ms, eval_count, eval_ms FROM run_timings "
+        "WHERE stage='generate' AND model=? AND eval_ms > 0 AND prompt_eval_ms > 0 ORDER BY id DESC LIMIT 50)",
+        (model,),
+    ).fetchone()
+    if not row or not all(row):
+        return None
+    return row[0] / (row[1] / 1000), row[2] / (row[3] / 1000)
+
+
+def estimate_cost_s(
+    context_bytes: int, prompt_chars: int, model: str | None, throughput: tuple[float, float] | None = None
+) -> float:
+    """Rough run duration: prompt evaluation plus generation of a typical answer."""
+    if throughput is None:
+        gen_tps = max(300.0 / model_size_b(model), 1.0)
+        throughput = (gen_tps * 10, gen_tps)
+    prompt_tps, gen_tps = throughput
+    prompt_tokens = (min(context_bytes, MAX_CONTEXT_BYTES) + prompt_chars) / 4
+    return round(prompt_tokens / max(prompt_tps, 1.0) + EXPECTED_OUTPUT_TOKENS / max(gen_tps, 1.0), 2)
@@ -0,0 +1,67 @@
+"""Stage timings: Ollama's generation counters and the run_timings writer.
+
+This module is shared by the backend and the worker, which pass in their own
+connection factory; the worker image copies it from backend/app.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+TIMING_COLUMNS = ("model", "prompt_eval_count", "prompt_eval_ms", "eval_count", "eval_ms", "tokens_per_s")
+
+
+def generation_stats(payload: dict) -> dict:
+    """Extract Ollama's own counters (durations are reported in nanoseconds)."""
+    eval_count = payload.get("eval_count")
+    eval_ns = payload.get("eval_duration")
+    prompt_eval_ns = payload.get("prompt_eval_duration")
+    return {
+        "model": payload.get("model"),
+        "prompt_eval_count": payload.get("prompt_eval_count"),
+        "prompt_eval_ms": prompt_eval_ns / 1e6 if prompt_eval_ns is not None else None,
+        "eval_count": eval_count,
+        "eval_ms": eval_ns / 1e6 if eval_ns is not None else None,
+        "tokens_per_s": round(eval_count / (eval_ns / 1e9), 3) if eval_count and eval_ns else None,
+    }
+
+
+@contextmanager
+def record_span(connect: Callable, run_id: int | None, stage: str, **detail):
+    """Time a pipeline stage and store it in run_timings.
+
+    Yields a dict the caller can fill with model stats (TIMING_COLUMNS) or any
+    extra detail; the row is written even when the stage raises. Nothing is
+    persisted when run_id is None.
+    """
+    fields: dict = dict(detail)
+    started_at = time.time()
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        yield fields
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        if run_id is not None:
+            duration_ms = (time.perf_counter() - t0) * 1000
+            columns = {name: fields.pop(name, None) for name in TIMING_COLUMNS}
+            with connect() as conn:
+                conn.execute(
+                    "INSERT INTO run_timings(run_id,stage,status,started_at,duration_ms,"
+                    "model,prompt_eval_count,prompt_eval_ms,eval_count,eval_ms,tokens_per_s,detail) "
+                    "VALUES(?,?,?,?,?,?,?,?,?,?,?,?)",
+                    (
+                        run_id,
+                        stage,
+                        status,
+                        started_at,
+                        round(duration_ms, 3),
+                        *columns.values(),
+                        json.dumps(fields) if fields else None,
+                    ),
+                )
@@ -0,0 +1,9 @@
+from __future__ import annotations
+
+from .db import get_conn
+from .spans import record_span
+
+
+def span(run_id: int | None, stage: str, **detail):
+    """Time a pipeline stage into run_timings; nothing is stored when run_id is None."""
+    return record_span(get_conn, run_id, stage, **detail)
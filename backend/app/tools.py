@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import difflib
 import os
 import shlex
 import subprocess
@@ -9,6 +8,7 @@ from pathlib import Path
 from typing import Callable
 
 from .config import settings
+from .diffing import compute_diff
 
 
 @dataclass
@@ -44,17 +44,9 @@ class ToolRegistry:
         old = p.read_text(errors="ignore") if p.exists() else ""
         p.parent.mkdir(parents=True, exist_ok=True)
         p.write_text(new_content)
-        diff = "\n".join(
-            difflib.unified_diff(
-                old.splitlines(),
-                new_content.splitlines(),
-                fromfile=f"a/{path}",
-                tofile=f"b/{path}",
-                lineterm="",
-            )
-        )
-        self.logger("tool", f"write_file {path}")
-        return ToolResult(True, diff or "(no diff)")
+        diff = compute_diff(path, old, new_content)
+        self.logger("tool", f"write_file {path} (+{diff.added} -{diff.removed})")
+        return ToolResult(True, diff.text or "(no diff)")
 
     def search(self, pattern: str) -> ToolResult:
         self.logger("tool", f"search {pattern}")
@@ -0,0 +1,227 @@
+"""Workspace watcher that keeps the project catalog current.
+
+Uses inotify through `watchfiles` (installed with uvicorn[standard]) when
+available, otherwise polls a stat-only fingerprint of each project every
+CATALOG_POLL_INTERVAL_S. Bind mounts from Docker Desktop on macOS/Windows do
+not deliver inotify events; set CATALOG_WATCH=poll there. Either way changes
+only mark projects dirty; a single refresher task re-indexes them after
+CATALOG_DEBOUNCE_S so a burst of writes costs one scan.
+
+Indexes persisted by a previous process stay in use across restarts: start()
+only checks them against the disk (stat-only) in the background, and `warm`
+turns true once that check and the first re-index pass have finished.
+
+Once that check is done the watcher writes a heartbeat (catalog.WATCHER_*) so
+readers know the indexes are being kept current; stop() removes it. Every
+CATALOG_VERIFY_INTERVAL_S the clean indexes are checked against the disk
+again; changes inotify never reported (e.g. a Docker Desktop bind mount in
+auto mode) are picked up and the watcher switches to polling.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from pathlib import Path
+
+from .catalog import (
+    WATCHER_HEARTBEAT_S,
+    clear_watcher_heartbeat,
+    dirty_projects,
+    fingerprint,
+    index_matches_disk,
+    index_project,
+    index_version,
+    list_projects,
+    mark_dirty,
+    project_for_path,
+    record_watcher_heartbeat,
+    sync_projects,
+)
+from .db import get_conn
+
+logger = logging.getLogger(__name__)
+
+
+def _has_inotify() -> bool:
+    try:
+        import watchfiles  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class CatalogWatcher:
+    def __init__(
+        self,
+        workspace_root: str,
+        mode: str = "auto",
+        poll_interval_s: float = 5.0,
+        debounce_s: float = 1.0,
+        verify_interval_s: float = 300.0,
+    ):
+        self.workspace_root = workspace_root
+        self.mode = mode
+        self.poll_interval_s = poll_interval_s
+        self.debounce_s = debounce_s
+        self.verify_interval_s = verify_interval_s
+        self.backend: str | None = None
+        self._wake = asyncio.Event()
+        self._stop = asyncio.Event()
+        self.warm = False
+        self._verified = False
+        self._tasks: list[asyncio.Task] = []
+        self._watch_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        with get_conn() as conn:
+            sync_projects(conn, self.workspace_root)
+
+        if self.mode == "inotify" or (self.mode == "auto" and _has_inotify()):
+            self.backend = "inotify"
+            self._watch_task = asyncio.create_task(self._watch_inotify())
+        else:
+            self.backend = "poll"
+            self._watch_task = asyncio.create_task(self._watch_poll())
+        self._tasks = [
+            asyncio.create_task(self._refresh_loop()),
+            asyncio.create_task(self._verify_persisted()),
+            asyncio.create_task(self._heartbeat_loop()),
+            asyncio.create_task(self._audit_loop()),
+        ]
+        logger.info("catalog watcher started (%s) on %s", self.backend, self.workspace_root)
+
+    async def stop(self) -> None:
+        self._stop.set()
+        tasks = [*self._tasks, *([self._watch_task] if self._watch_task else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._watch_task = None
+        with get_conn() as conn:
+            clear_watcher_heartbeat(conn, self.workspace_root)
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def handle_changes(self, paths) -> set[str]:
+        """Mark the projects containing `paths` dirty; returns them."""
+        projects: set[str] = set()
+        resync = False
+        for path in paths:
+            project = project_for_path(self.workspace_root, path)
+            if project is None or not Path(project).is_dir():
+                resync = True
+            else:
+                projects.add(project)
+        with get_conn() as conn:
+            if resync:
+                sync_projects(conn, self.workspace_root)
+            mark_dirty(conn, projects)
+        self._wake.set()
+        return projects
+
+    async def _watch_inotify(self) -> None:
+        import watchfiles
+
+        async for changes in watchfiles.awatch(
+            self.workspace_root, stop_event=self._stop, debounce=int(self.debounce_s * 1000)
+        ):
+            await asyncio.to_thread(self.handle_changes, [path for _change, path in changes])
+
+    def _fingerprints(self) -> dict[str, tuple[int, int, float]]:
+        return {project: fingerprint(project) for project in list_projects(self.workspace_root)}
+
+    async def _watch_poll(self) -> None:
+        known = await asyncio.to_thread(self._fingerprints)
+        while not self._stop.is_set():
+            await asyncio.sleep(self.poll_interval_s)
+            current = await asyncio.to_thread(self._fingerprints)
+            changed = [p for p, value in current.items() if known.get(p) != value]
+            changed += [p for p in known if p not in current]
+            if changed:
+                await asyncio.to_thread(self.handle_changes, changed)
+            known = current
+
+    def _stale_projects(self) -> list[str]:
+        with get_conn() as conn:
+            return [
+                project
+                for project in list_projects(self.workspace_root)
+                if index_version(conn, project) is not None and not index_matches_disk(conn, project)
+            ]
+
+    async def _verify_persisted(self) -> None:
+        """Anything may have changed while the backend was down; catch it without blocking startup."""
+        stale = await asyncio.to_thread(self._stale_projects)
+        if stale:
+            await asyncio.to_thread(self.handle_changes, stale)
+        self._verified = True
+        await asyncio.to_thread(self._beat)
+        self._wake.set()
+
+    def _beat(self) -> None:
+        with get_conn() as conn:
+            record_watcher_heartbeat(conn, self.workspace_root, self.backend or "")
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(WATCHER_HEARTBEAT_S)
+            if not self._verified:
+                continue
+            try:
+                await asyncio.to_thread(self._beat)
+            except Exception:
+                logger.exception("catalog heartbeat failed")
+
+    async def _audit_loop(self) -> None:
+        """Re-check clean indexes against the disk; fall back to polling if inotify missed changes."""
+        while True:
+            await asyncio.sleep(self.verify_interval_s)
+            if not self._verified:
+                continue
+            try:
+                stale = await asyncio.to_thread(self._stale_projects)
+                if stale:
+                    # An event may still be in flight; only count what is stale after the debounce.
+                    await asyncio.sleep(self.debounce_s * 2)
+                    stale = await asyncio.to_thread(self._stale_projects)
+                if not stale:
+                    continue
+                await asyncio.to_thread(self.handle_changes, stale)
+            except Exception:
+                logger.exception("catalog audit failed")
+                continue
+            logger.warning("catalog watcher (%s) missed changes in %s", self.backend, ", ".join(stale))
+            if self.backend == "inotify":
+                self._switch_to_poll()
+
+    def _switch_to_poll(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+        self.backend = "poll"
+        self._watch_task = asyncio.create_task(self._watch_poll())
+        logger.warning("catalog watcher switched to polling every %.1fs", self.poll_interval_s)
+
+    def _reindex(self) -> int:
+        with get_conn() as conn:
+            pending = [p for p in dirty_projects(conn) if project_for_path(self.workspace_root, p) == p]
+            for project in pending:
+                index_project(conn, project)
+        return len(pending)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.debounce_s)
+            self._wake.clear()
+            try:
+                count = await asyncio.to_thread(self._reindex)
+            except Exception:
+                logger.exception("catalog refresh failed")
+                continue
+            if count:
+                logger.info("re-indexed %d project(s)", count)
+            if self._verified:
+                self.warm = True
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+from app import db, main
+from app.config import settings
+
+
+@pytest.fixture
+def temp_db(tmp_path: Path, monkeypatch) -> Path:
+    path = tmp_path / "app.db"
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    patched = replace(settings, db_path=str(path), workspace_root=str(workspace))
+    monkeypatch.setattr(db, "settings", patched)
+    monkeypatch.setattr(main, "settings", patched)
+    db.init_db()
+    return path
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import subprocess
+from dataclasses import replace
+from pathlib import Path
+
+from app import agent
+from app.config import settings
+from app.memory import WorkingMemory
+
+
+def script(monkeypatch, replies, calls, summary="short summary"):
+    """Feed scripted deep-model replies; fast-model calls return `summary`."""
+    queue = list(replies)
+
+    async def fake_generate(model, prompt):
+        calls.append((model, prompt))
+        if model == "fast":
+            return summary, {"prompt_eval_count": 10, "eval_count": 5}
+        return json.dumps(queue.pop(0)), {"prompt_eval_count": 100, "eval_count": 20}
+
+    monkeypatch.setattr(agent, "generate_with_stats", fake_generate)
+
+
+def run(tmp_path: Path, monkeypatch, **overrides):
+    monkeypatch.setattr(agent, "settings", replace(settings, **overrides))
+    return asyncio.run(agent.run_agent_loop("fix it", str(tmp_path), "fast", "deep", lambda _k, _m: None))
+
+
+def test_agent_memoizes_read_only_tool_calls(tmp_path: Path, monkeypatch):
+    (tmp_path / "MAIN.BP").write_text("CRT 'A'\n")
+    read_calls = []
+    original = agent.ToolRegistry.read_file
+
+    def counting_read(self, path):
+        read_calls.append(path)
+        return original(self, path)
+
+    monkeypatch.setattr(agent.ToolRegistry, "read_file", counting_read)
+    calls = []
+    read = {"tool": "read_file", "path": "MAIN.BP"}
+    script(monkeypatch, [{"actions": [read]}, {"actions": [read]}, {"done": True, "notes": "ok"}], calls)
+
+    result = run(tmp_path, monkeypatch)
+
+    assert read_calls == ["MAIN.BP"]
+    assert result["steps"] == 3
+    assert result["stopped"] == "done"
+    assert "(cached)" in result["memory"]
+
+
+def test_agent_write_invalidates_cached_reads(tmp_path: Path, monkeypatch):
+    (tmp_path / "MAIN.BP").write_text("CRT 'A'\n")
+    calls = []
+    read = {"tool": "read_file", "path": "MAIN.BP"}
+    write = {"tool": "write_file", "path": "MAIN.BP", "content": "CRT 'B'\n"}
+    script(monkeypatch, [{"actions": [read, write, read]}, {"done": True}], calls)
+
+    result = run(tmp_path, monkeypatch)
+
+    assert result["tool_results"][-1] == "CRT 'B'\n"
+
+
+def test_agent_summarizes_large_outputs_with_fast_model(tmp_path: Path, monkeypatch):
+    (tmp_path / "BIG.BP").write_text("CRT 'X'\n" * 2000)
+    calls = []
+    script(monkeypatch, [{"actions": [{"tool": "read_file", "path": "BIG.BP"}]}, {"done": True}], calls)
+
+    result = run(tmp_path, monkeypatch, agent_summarize_chars=500)
+
+    assert [model for model, _ in calls] == ["deep", "fast", "deep"]
+    assert "short summary" in calls[-1][1]
+    assert "CRT 'X'\n" * 100 not in calls[-1][1]
+    assert len(result["tool_results"][0]) == 16000
+
+
+def test_agent_stops_at_token_budget(tmp_path: Path, monkeypatch):
+    calls = []
+    step = {"actions": [{"tool": "list_dir", "path": "."}]}
+    script(monkeypatch, [step] * 10, calls)
+
+    result = run(tmp_path, monkeypatch, agent_max_steps=10, agent_max_tokens=250)
+
+    assert result["stopped"] == "token_budget"
+    assert result["steps"] == 3
+    assert result["tokens_used"] >= 250
+
+
+def test_agent_records_tool_errors_and_keeps_going(tmp_path: Path, monkeypatch):
+    def slow_search(self, pattern):
+        raise subprocess.TimeoutExpired(["rg", pattern], 5)
+
+    monkeypatch.setattr(agent.ToolRegistry, "search", slow_search)
+    calls = []
+    actions = [{"tool": "search", "pattern": "READ"}, "read_file MAIN.BP", {"tool": "read_file", "path": 7}]
+    script(monkeypatch, [{"actions": actions}, {"done": True, "notes": "ok"}], calls)
+
+    result = run(tmp_path, monkeypatch)
+
+    assert result["stopped"] == "done"
+    assert result["steps"] == 2
+    assert result["tool_results"][0].startswith("TimeoutExpired:")
+    assert result["tool_results"][1].startswith("Malformed action")
+    assert result["tool_results"][2].startswith("TypeError:")
+    assert "TimeoutExpired" in calls[-1][1]
+
+
+def test_agent_normalizes_validation_commands(tmp_path: Path, monkeypatch):
+    calls = []
+    step = {"actions": [{"tool": "list_dir", "path": "."}]}
+    replies = [
+        {**step, "validation_commands": "make lint"},
+        {**step, "validation_commands": None},
+        {"done": True, "validation_commands": [7, "make lint", None, " make test ", ""]},
+    ]
+    script(monkeypatch, replies, calls)
+
+    result = run(tmp_path, monkeypatch)
+
+    assert [v["cmd"] for v in result["validations"]] == ["make lint", "make test"]
+    assert result["validations"][0]["result"].startswith("Command not allowlisted")
+
+
+def test_working_memory_stays_bounded():
+    memory = WorkingMemory(max_chars=1000)
+    for step in range(50):
+        memory.add(step, f"read_file F{step}", "x" * 300)
+
+    assert memory.size() <= 1000
+    assert memory.entries[-1].label == "read_file F49"
+    assert "F40 (300 chars, dropped from memory)" in memory.render()
+    assert len(memory.folded) <= memory.max_folded
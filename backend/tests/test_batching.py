@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.batching import plan_batch_tasks, select_files
+from app.main import app
+from app.scheduling import load_queue
+
+
+def _project(root: Path) -> Path:
+    project = root / "proj"
+    (project / "BP").mkdir(parents=True)
+    for i in range(5):
+        (project / "BP" / f"PROG{i}").write_text(f"CRT {i}")
+    (project / "BP" / "BLOB").write_bytes(b"\x00\x01")
+    (project / "README.md").write_text("# docs")
+    return project
+
+
+def test_select_files_filters_by_glob_and_skips_binaries(tmp_path: Path):
+    project = _project(tmp_path)
+
+    assert select_files(str(project), "BP/*") == [f"BP/PROG{i}" for i in range(5)]
+    assert plan_batch_tasks(["a", "b", "c"], 2) == [["a", "b"], ["c"]]
+
+
+def test_batch_endpoint_creates_parent_run_with_subtasks(temp_db: Path):
+    project = _project(temp_db.parent / "workspace")
+    client = TestClient(app)
+
+    resp = client.post(
+        "/runs/batch",
+        json={"project_paths": [str(project)], "prompt": "convert READ", "include": "BP/*", "files_per_task": 2},
+    )
+
+    assert resp.status_code == 200
+    created = resp.json()
+    assert created["tasks"] == 3
+    detail = client.get(f"/runs/{created['id']}").json()
+    assert detail["run"]["priority"] == "bulk"
+    assert detail["batch"]["total"] == 3
+    assert detail["batch"]["by_status"] == {"queued": 3}
+    assert detail["batch"]["tasks"][0]["files"] == ["BP/PROG0", "BP/PROG1"]
+
+
+def test_batch_endpoint_rejects_empty_selection(temp_db: Path):
+    project = _project(temp_db.parent / "workspace")
+
+    resp = TestClient(app).post("/runs/batch", json={"project_paths": [str(project)], "prompt": "x", "include": "*.py"})
+
+    assert resp.status_code == 400
+
+
+def test_multi_project_batch_records_each_projects_share(temp_db: Path):
+    workspace = temp_db.parent / "workspace"
+    first = _project(workspace)
+    second = workspace / "other"
+    second.mkdir()
+    (second / "MAIN").write_text("CRT 'X'")
+
+    created = TestClient(app).post(
+        "/runs/batch",
+        json={"project_paths": [str(first), str(second)], "prompt": "convert READ", "include": "*", "files_per_task": 2},
+    ).json()
+
+    with sqlite3.connect(temp_db) as conn:
+        (queued,), _ = load_queue(conn, time.time())
+    assert queued.id == created["id"]
+    assert queued.projects == {str(first): 0.75, str(second): 0.25}
+
+
+def test_batch_cost_uses_the_workers_parallelism_cap(temp_db: Path, monkeypatch):
+    project = _project(temp_db.parent / "workspace")
+    client = TestClient(app)
+
+    def cost(max_parallel: int, cap: int) -> float:
+        monkeypatch.setattr(main, "settings", replace(main.settings, batch_max_parallel=cap))
+        created = client.post(
+            "/runs/batch",
+            json={
+                "project_paths": [str(project)],
+                "prompt": "convert READ",
+                "include": "BP/*",
+                "files_per_task": 1,
+                "max_parallel": max_parallel,
+            },
+        ).json()
+        return client.get(f"/runs/{created['id']}").json()["run"]["estimated_cost_s"]
+
+    # Five subtasks: one wave when five may run at once, three waves of two otherwise.
+    assert cost(32, 2) == cost(2, 2)
+    assert cost(32, 2) == pytest.approx(3 * cost(32, 8))
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app import catalog
+from app.catalog import (
+    WATCHER_STALE_S,
+    index_project,
+    indexed_text_files,
+    load_catalog,
+    mark_dirty,
+    project_for_path,
+    record_watcher_heartbeat,
+    sync_projects,
+)
+from app.main import app
+from app.watcher import CatalogWatcher
+
+
+def _workspace(temp_db: Path) -> Path:
+    return temp_db.parent / "workspace"
+
+
+def test_index_project_summarizes_files_and_languages(temp_db: Path):
+    project = _workspace(temp_db) / "billing"
+    (project / "BP").mkdir(parents=True)
+    (project / "BP" / "MAIN.BP").write_text("CRT 'A'\n")
+    (project / "app.py").write_text("print(1)\n")
+    (project / "logo.png").write_bytes(b"\x89PNG\x00\x00")
+
+    with sqlite3.connect(temp_db) as conn:
+        record_watcher_heartbeat(conn, _workspace(temp_db), "poll")
+        summary = index_project(conn, project)
+        files = indexed_text_files(conn, project)
+
+    assert summary["file_count"] == 3
+    assert summary["languages"] == {"pick-basic": 1, "python": 1}
+    assert summary["text_bytes"] == len("CRT 'A'\n") + len("print(1)\n")
+    assert files == ["BP/MAIN.BP", "app.py"]
+
+
+def test_reindex_only_reads_changed_files(temp_db: Path, monkeypatch):
+    project = _workspace(temp_db) / "notes"
+    project.mkdir()
+    (project / "README").write_text("plain text\n")
+    (project / "TODO").write_text("more text\n")
+    with sqlite3.connect(temp_db) as conn:
+        index_project(conn, project)
+
+        probed = []
+        original = catalog.probe_text
+        monkeypatch.setattr(catalog, "probe_text", lambda path: probed.append(path.name) or original(path))
+        (project / "TODO").write_text("changed text, longer\n")
+        index_project(conn, project)
+
+    assert probed == ["TODO"]
+
+
+def test_dirty_index_is_not_used_for_context(temp_db: Path):
+    project = _workspace(temp_db) / "svc"
+    project.mkdir()
+    (project / "a.py").write_text("x = 1\n")
+    with sqlite3.connect(temp_db) as conn:
+        record_watcher_heartbeat(conn, _workspace(temp_db), "poll")
+        index_project(conn, project)
+        mark_dirty(conn, [str(project)])
+        assert indexed_text_files(conn, project) is None
+
+
+def test_index_is_only_trusted_while_a_watcher_owns_the_project(temp_db: Path):
+    workspace = _workspace(temp_db)
+    project = workspace / "svc"
+    project.mkdir()
+    (project / "a.py").write_text("x = 1\n")
+    with sqlite3.connect(temp_db) as conn:
+        index_project(conn, project)
+        assert indexed_text_files(conn, project) is None
+
+        record_watcher_heartbeat(conn, workspace / "elsewhere", "inotify")
+        assert indexed_text_files(conn, project) is None
+
+        record_watcher_heartbeat(conn, workspace, "poll")
+        assert indexed_text_files(conn, project) == ["a.py"]
+
+        conn.execute("UPDATE catalog_watchers SET heartbeat_at = heartbeat_at - ?", (WATCHER_STALE_S + 1,))
+        assert indexed_text_files(conn, project) is None
+
+
+def test_project_for_path_maps_uploads_and_top_level(tmp_path: Path):
+    assert project_for_path(tmp_path, tmp_path / "svc" / "src" / "a.py") == str(tmp_path / "svc")
+    assert project_for_path(tmp_path, tmp_path / "uploads" / "demo" / "x.bp") == str(tmp_path / "uploads" / "demo")
+    assert project_for_path(tmp_path, tmp_path / "uploads") is None
+    assert project_for_path(tmp_path, tmp_path / ".cache" / "x") is None
+    assert project_for_path(tmp_path / "svc", tmp_path / "other") is None
+
+
+def test_sync_projects_adds_and_drops_projects(temp_db: Path):
+    workspace = _workspace(temp_db)
+    (workspace / "one").mkdir()
+    (workspace / "uploads" / "two").mkdir(parents=True)
+    with sqlite3.connect(temp_db) as conn:
+        assert sync_projects(conn, workspace) == [str(workspace / "one"), str(workspace / "uploads" / "two")]
+        (workspace / "one").rmdir()
+        sync_projects(conn, workspace)
+        rows = load_catalog(conn, workspace)
+
+    assert [row["project_path"] for row in rows] == [str(workspace / "uploads" / "two")]
+    assert rows[0]["dirty"]
+
+
+def test_watcher_marks_changed_project_dirty_and_reindexes(temp_db: Path):
+    workspace = _workspace(temp_db)
+    project = workspace / "svc"
+    project.mkdir()
+    (project / "a.py").write_text("x = 1\n")
+    watcher = CatalogWatcher(str(workspace), mode="poll", poll_interval_s=0.05, debounce_s=0.01)
+
+    async def scenario():
+        await watcher.start()
+        try:
+            for _ in range(100):
+                await asyncio.sleep(0.02)
+                with sqlite3.connect(temp_db) as conn:
+                    if indexed_text_files(conn, project) == ["a.py"]:
+                        break
+            (project / "b.py").write_text("y = 2\n")
+            for _ in range(100):
+                await asyncio.sleep(0.02)
+                with sqlite3.connect(temp_db) as conn:
+                    files = indexed_text_files(conn, project)
+                if files == ["a.py", "b.py"]:
+                    return files
+        finally:
+            await watcher.stop()
+
+    assert asyncio.run(scenario()) == ["a.py", "b.py"]
+    assert watcher.backend == "poll"
+
+
+def test_projects_endpoint_reads_catalog(temp_db: Path):
+    workspace = _workspace(temp_db)
+    project = workspace / "svc"
+    project.mkdir()
+    (project / "main.go").write_text("package main\n")
+    with sqlite3.connect(temp_db) as conn:
+        index_project(conn, project)
+
+    body = TestClient(app).get("/projects").json()
+
+    assert body["projects"] == [str(project)]
+    assert body["catalog"][0]["languages"] == {"go": 1}
+    assert body["catalog"][0]["file_count"] == 1
+
+
+def test_watcher_keeps_persisted_index_and_flags_stale_ones(temp_db: Path):
+    workspace = _workspace(temp_db)
+    same, changed = workspace / "same", workspace / "changed"
+    for project in (same, changed):
+        project.mkdir()
+        (project / "a.py").write_text("x = 1\n")
+        with sqlite3.connect(temp_db) as conn:
+            index_project(conn, project)
+    with sqlite3.connect(temp_db) as conn:
+        persisted = catalog.index_version(conn, same)
+    (changed / "b.py").write_text("y = 2\n")
+    watcher = CatalogWatcher(str(workspace), mode="poll", poll_interval_s=60, debounce_s=0.01)
+
+    async def scenario():
+        await watcher.start()
+        try:
+            for _ in range(100):
+                await asyncio.sleep(0.02)
+                if watcher.warm:
+                    break
+            with sqlite3.connect(temp_db) as conn:
+                return indexed_text_files(conn, same), indexed_text_files(conn, changed), catalog.index_version(conn, same)
+        finally:
+            await watcher.stop()
+
+    same_files, changed_files, version = asyncio.run(scenario())
+    assert watcher.warm
+    assert same_files == ["a.py"] and version == persisted
+    assert changed_files == ["a.py", "b.py"]
+    with sqlite3.connect(temp_db) as conn:
+        # A stopped watcher no longer vouches for the index.
+        assert indexed_text_files(conn, same) is None
+
+
+def test_watcher_falls_back_to_polling_when_inotify_misses_changes(temp_db: Path, monkeypatch):
+    workspace = _workspace(temp_db)
+    project = workspace / "svc"
+    project.mkdir()
+    (project / "a.py").write_text("x = 1\n")
+
+    async def silent_inotify(self):
+        # A Docker Desktop bind mount: the watch starts but no event ever arrives.
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(CatalogWatcher, "_watch_inotify", silent_inotify)
+    watcher = CatalogWatcher(str(workspace), mode="inotify", poll_interval_s=60, debounce_s=0.01, verify_interval_s=0.05)
+
+    async def scenario():
+        await watcher.start()
+        try:
+            for _ in range(100):
+                await asyncio.sleep(0.02)
+                if watcher.warm:
+                    break
+            (project / "b.py").write_text("y = 2\n")
+            for _ in range(100):
+                await asyncio.sleep(0.02)
+                with sqlite3.connect(temp_db) as conn:
+                    files = indexed_text_files(conn, project)
+                if files == ["a.py", "b.py"]:
+                    return files
+        finally:
+            await watcher.stop()
+
+    assert asyncio.run(scenario()) == ["a.py", "b.py"]
+    assert watcher.backend == "poll"
+
+
+def test_projects_endpoint_indexes_when_the_watcher_is_off(temp_db: Path):
+    workspace = _workspace(temp_db)
+    project = workspace / "svc"
+    project.mkdir()
+    (project / "main.go").write_text("package main\n")
+    client = TestClient(app)
+
+    first = client.get("/projects").json()["catalog"][0]
+    (project / "util.go").write_text("package main\n")
+    second = client.get("/projects").json()["catalog"][0]
+
+    assert not first["dirty"] and first["file_count"] == 1
+    assert not second["dirty"] and second["file_count"] == 2
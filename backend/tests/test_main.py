@@ -1,15 +1,18 @@
 from __future__ import annotations
 
 import io
+import sqlite3
+import time
 import uuid
 from pathlib import Path
 
 from fastapi.testclient import TestClient
 
+from app import main
 from app.main import app
 
 
-def test_upload_code_creates_workspace_project_with_multiple_files():
+def test_upload_code_creates_workspace_project_with_multiple_files(temp_db):
     project_name = f"pytest-upload-{uuid.uuid4().hex[:8]}"
     client = TestClient(app)
 
@@ -35,3 +38,32 @@ def test_upload_code_creates_workspace_project_with_multiple_files():
     projects = client.get("/projects")
     assert projects.status_code == 200
     assert str(project_path) in projects.json()["projects"]
+
+
+def test_ready_requires_ollama_and_a_warm_worker(temp_db, monkeypatch):
+    async def unreachable():
+        raise ConnectionError("connection refused")
+
+    async def loaded():
+        return ["qwen2.5-coder:7b"]
+
+    monkeypatch.setattr(main, "loaded_models", unreachable)
+    client = TestClient(app)
+    resp = client.get("/ready")
+    assert resp.status_code == 503
+    assert resp.json()["checks"]["ollama"]["ok"] is False
+    assert client.get("/health").status_code == 200
+
+    monkeypatch.setattr(main, "loaded_models", loaded)
+    with sqlite3.connect(temp_db) as conn:
+        conn.execute(
+            "INSERT INTO worker_status(worker_id,phase,started_at,heartbeat_at,warm_models) VALUES(?,?,?,?,?)",
+            ("w1", "warming", time.time(), time.time(), None),
+        )
+    assert client.get("/ready").status_code == 503
+
+    with sqlite3.connect(temp_db) as conn:
+        conn.execute("UPDATE worker_status SET phase='ready', warm_models='[\"qwen2.5-coder:7b\"]'")
+    body = client.get("/ready").json()
+    assert body["ready"] is True
+    assert body["checks"]["worker"]["workers"][0]["warm_models"] == ["qwen2.5-coder:7b"]
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import time
+
+from fastapi.testclient import TestClient
+
+from app.db import get_conn
+from app.main import app
+from app.metrics import render_metrics
+from app.ollama_client import generation_stats
+from app.retention import archive_runs
+from app.timings import span
+
+
+def _seed(run_id: int) -> None:
+    with get_conn() as conn:
+        conn.execute("INSERT INTO runs(id,project_path,prompt,status) VALUES(?,?,?,?)", (run_id, "/w/p", "x", "queued"))
+        conn.execute(
+            "INSERT INTO run_timings(run_id,stage,started_at,duration_ms,model,eval_count,eval_ms) VALUES(?,?,?,?,?,?,?)",
+            (run_id, "generate", time.time(), 1500.0, "qwen2.5-coder:7b", 300, 6000.0),
+        )
+
+
+def test_render_metrics_reports_queue_stages_and_model_throughput(temp_db):
+    _seed(1)
+
+    with get_conn() as conn:
+        body = render_metrics(conn)
+
+    assert "agentic_queue_depth 1" in body
+    assert 'agentic_run_stage_seconds_bucket{stage="generate",status="ok",le="1.0"} 0' in body
+    assert 'agentic_run_stage_seconds_bucket{stage="generate",status="ok",le="2.5"} 1' in body
+    assert 'agentic_model_eval_tokens_total{model="qwen2.5-coder:7b"} 300.0' in body
+    assert 'agentic_model_tokens_per_second{model="qwen2.5-coder:7b"} 50.0' in body
+    assert "agentic_db_session_seconds_count" in body
+
+
+def test_metrics_endpoint_serves_prometheus_text(temp_db):
+    _seed(2)
+
+    resp = TestClient(app).get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert "# TYPE agentic_run_stage_seconds histogram" in resp.text
+
+
+def test_span_records_stage_with_model_stats(temp_db):
+    stats = generation_stats(
+        {"model": "m", "eval_count": 100, "eval_duration": 2_000_000_000, "prompt_eval_duration": 500_000_000}
+    )
+
+    with span(7, "generate", files=3) as timing:
+        timing.update(stats)
+
+    with get_conn() as conn:
+        row = conn.execute("SELECT * FROM run_timings WHERE run_id=7").fetchone()
+    assert row["stage"] == "generate"
+    assert row["tokens_per_s"] == 50.0
+    assert row["prompt_eval_ms"] == 500.0
+    assert row["detail"] == '{"files": 3}'
+
+
+def test_archiving_runs_keeps_metric_counters_monotonic(temp_db, tmp_path):
+    _seed(3)
+    _seed(4)
+    with get_conn() as conn:
+        conn.execute("UPDATE runs SET status='completed', updated_at=datetime('now', '-100 days')")
+        before = render_metrics(conn)
+        assert archive_runs(conn, tmp_path / "archive", {"completed": 90}) == 2
+        assert conn.execute("SELECT COUNT(*) FROM run_timings").fetchone()[0] == 0
+        after_archive = render_metrics(conn)
+    _seed(5)
+    with get_conn() as conn:
+        after_new_run = render_metrics(conn)
+
+    counters = (
+        'agentic_model_requests_total{model="qwen2.5-coder:7b"}',
+        'agentic_model_eval_tokens_total{model="qwen2.5-coder:7b"}',
+        'agentic_run_stage_seconds_bucket{stage="generate",status="ok",le="2.5"}',
+        'agentic_run_stage_seconds_sum{stage="generate",status="ok"}',
+    )
+    assert [_value(before, c) for c in counters] == [2.0, 600.0, 2.0, 3.0]
+    assert [_value(after_archive, c) for c in counters] == [2.0, 600.0, 2.0, 3.0]
+    assert [_value(after_new_run, c) for c in counters] == [3.0, 900.0, 3.0, 4.5]
+
+
+def _value(body: str, series: str) -> float:
+    line = next(line for line in body.splitlines() if line.startswith(f"{series} "))
+    return float(line.rsplit(" ", 1)[1])
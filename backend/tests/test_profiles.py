@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import zlib
+
+from fastapi.testclient import TestClient
+
+from app.db import get_conn
+from app.main import app
+
+
+def test_profiles_are_listed_and_downloadable(temp_db):
+    with get_conn() as conn:
+        conn.execute(
+            "INSERT INTO run_profiles(run_id,kind,format,content,summary) VALUES(?,?,?,?,?)",
+            (3, "sample", "collapsed", zlib.compress(b"main;process 4"), "4 samples"),
+        )
+    client = TestClient(app)
+
+    listing = client.get("/runs/3/profiles").json()["profiles"]
+    assert [(p["kind"], p["summary"]) for p in listing] == [("sample", "4 samples")]
+
+    resp = client.get(f"/runs/3/profiles/{listing[0]['id']}")
+    assert resp.status_code == 200
+    assert resp.content == b"main;process 4"
+    assert resp.headers["content-disposition"] == 'attachment; filename="run-3-sample.folded"'
+
+    assert client.get(f"/runs/4/profiles/{listing[0]['id']}").status_code == 404
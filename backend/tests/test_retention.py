@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import gzip
+import sqlite3
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.diffing import encode_diff
+from app.main import app
+from app.retention import (
+    RetentionService,
+    archive_runs,
+    compact_runs,
+    incremental_vacuum,
+    parse_policies,
+    run_retention,
+)
+
+
+def _insert_run(conn, status="completed", age_days=0, created_at="2026-01-15 10:00:00", log="done"):
+    run_id = conn.execute(
+        "INSERT INTO runs(project_path,prompt,status,created_at,updated_at) "
+        "VALUES('/w/a','refactor',?,?,datetime('now', ?))",
+        (status, created_at, f"-{age_days} days"),
+    ).lastrowid
+    conn.execute("INSERT INTO run_logs(run_id,kind,message) VALUES(?,?,?)", (run_id, "agent", log))
+    conn.execute(
+        "INSERT INTO file_changes(run_id,file_path,diff,accepted) VALUES(?,?,?,0)",
+        (run_id, "BP/MAIN", "--- a/BP/MAIN\n+++ b/BP/MAIN\n+CRT 'X'\n"),
+    )
+    return run_id
+
+
+def test_parse_policies_rejects_active_statuses():
+    assert parse_policies("completed=90, failed=30") == {"completed": 90.0, "failed": 30.0}
+    with pytest.raises(ValueError):
+        parse_policies("running=1")
+
+
+def test_compact_runs_compresses_old_logs_and_plain_diffs(temp_db: Path):
+    long_log = "validation output line\n" * 100
+    with sqlite3.connect(temp_db) as conn:
+        old = _insert_run(conn, age_days=10, log=long_log)
+        recent = _insert_run(conn, age_days=1, log=long_log)
+        assert compact_runs(conn, older_than_days=7) == {"logs": 1, "diffs": 1}
+        encodings = dict(conn.execute("SELECT run_id, message_encoding FROM run_logs").fetchall())
+
+    assert encodings == {old: "zlib", recent: "plain"}
+    body = TestClient(app).get(f"/runs/{old}").json()
+    assert body["logs"][0]["message"] == long_log
+    assert "+CRT 'X'" in body["changes"][0]["diff"]
+
+
+def test_archive_moves_runs_to_monthly_gzip_and_api_reads_them_back(temp_db: Path, tmp_path: Path, monkeypatch):
+    archive_dir = tmp_path / "archive"
+    monkeypatch.setattr(main, "settings", replace(main.settings, archive_dir=str(archive_dir)))
+    with sqlite3.connect(temp_db) as conn:
+        jan = [_insert_run(conn, age_days=100) for _ in range(3)]
+        feb = _insert_run(conn, age_days=100, created_at="2026-02-02 08:00:00")
+        conn.execute(
+            "INSERT INTO run_logs(run_id,kind,message,message_encoding) VALUES(?,?,?,?)",
+            (feb, "tool", *encode_diff("packed")),
+        )
+        fresh = _insert_run(conn, age_days=5)
+        review = _insert_run(conn, status="awaiting_review", age_days=100)
+
+        assert archive_runs(conn, archive_dir, {"completed": 90}) == 4
+        hot = {row[0] for row in conn.execute("SELECT id FROM runs")}
+        assert conn.execute("SELECT COUNT(*) FROM run_logs WHERE run_id IN (?,?,?,?)", (*jan, feb)).fetchone()[0] == 0
+
+    assert hot == {fresh, review}
+    with gzip.open(archive_dir / "runs-2026-01.jsonl.gz", "rt") as fh:
+        assert len(fh.readlines()) == 3
+
+    client = TestClient(app)
+    body = client.get(f"/runs/{feb}").json()
+    assert body["archived"] is True
+    assert body["run"]["id"] == feb
+    assert [log["message"] for log in body["logs"]] == ["done", "packed"]
+    assert "+CRT 'X'" in body["changes"][0]["diff"]
+
+    months = {a["month"]: a["runs"] for a in client.get("/archives").json()["archives"]}
+    assert months == {"2026-01": 3, "2026-02": 1}
+    assert [r["run_id"] for r in client.get("/archives/2026-01").json()["runs"]] == sorted(jan, reverse=True)
+
+
+def test_retention_skips_archiving_while_runs_are_active(temp_db: Path, tmp_path: Path):
+    with sqlite3.connect(temp_db) as conn:
+        old = _insert_run(conn, age_days=100)
+        conn.execute("INSERT INTO runs(project_path,prompt,status) VALUES('/w/b','x','queued')")
+        report = run_retention(conn, tmp_path / "archive", {"completed": 90}, 7, 100)
+        assert conn.execute("SELECT COUNT(*) FROM runs WHERE id=?", (old,)).fetchone()[0] == 1
+
+    assert report["skipped"] == "busy"
+    assert report["archived"] == 0
+
+
+def test_incremental_vacuum_returns_free_pages(temp_db: Path):
+    with sqlite3.connect(temp_db) as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        run_id = _insert_run(conn)
+        conn.executemany(
+            "INSERT INTO run_logs(run_id,kind,message) VALUES(?,?,?)", [(run_id, "tool", "x" * 1000)] * 500
+        )
+        conn.commit()
+        conn.execute("DELETE FROM run_logs")
+        conn.commit()
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+        freed = incremental_vacuum(conn, max_pages=50)
+
+        assert free_before > 50
+        assert freed == 50
+        assert conn.execute("PRAGMA freelist_count").fetchone()[0] == free_before - 50
+
+
+def test_retention_endpoint_runs_a_pass(temp_db: Path, tmp_path: Path, monkeypatch):
+    service = RetentionService(str(tmp_path / "archive"), {"failed": 30}, 7, 0, 100)
+    monkeypatch.setattr(main, "retention_service", service)
+    with sqlite3.connect(temp_db) as conn:
+        _insert_run(conn, status="failed", age_days=40)
+
+    report = TestClient(app).post("/retention/run").json()
+
+    assert report["archived"] == 1
+    assert service.last_report == report
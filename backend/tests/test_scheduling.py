@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.scheduling import ActiveRun, QueuedRun, estimate_cost_s, estimate_start_times, schedule
+
+NOW = 1_000_000.0
+
+
+def _run(run_id, submitter="alice", priority="normal", cost=60.0, age=0.0, project="/w/a"):
+    return QueuedRun(run_id, project, submitter, priority, cost, NOW - age)
+
+
+def test_interactive_run_jumps_a_bulk_backlog():
+    queued = [_run(i, priority="bulk", age=300) for i in range(1, 51)]
+    queued.append(_run(99, submitter="bob", priority="interactive", cost=10, project="/w/b"))
+
+    order = schedule(queued, [], NOW)
+
+    assert order[0].id == 99
+
+
+def test_fair_share_interleaves_submitters():
+    queued = [_run(i, submitter="alice", age=10) for i in range(1, 6)]
+    queued += [_run(i, submitter="bob", project="/w/b", age=5) for i in range(6, 9)]
+
+    order = [run.submitter for run in schedule(queued, [], NOW)]
+
+    assert order[:4] == ["alice", "bob", "alice", "bob"]
+
+
+def test_short_job_first_among_interactive_runs():
+    queued = [
+        _run(1, submitter="a", priority="interactive", cost=120),
+        _run(2, submitter="b", priority="interactive", cost=5, project="/w/b"),
+    ]
+
+    assert [run.id for run in schedule(queued, [], NOW)] == [2, 1]
+
+
+def test_aging_prevents_starvation_of_bulk_runs():
+    old_bulk = _run(1, submitter="a", priority="bulk", age=3600)
+    fresh_interactive = _run(2, submitter="b", priority="interactive", cost=5, project="/w/b")
+
+    assert schedule([old_bulk, fresh_interactive], [], NOW)[0].id == 1
+
+
+def test_running_usage_counts_against_submitter():
+    active = [ActiveRun("/w/a", "alice", 600, NOW - 10, True)]
+    queued = [_run(1, submitter="alice", age=60), _run(2, submitter="bob", project="/w/b", age=0)]
+
+    assert schedule(queued, active, NOW)[0].id == 2
+
+
+def test_batch_usage_is_charged_to_each_project_it_touches():
+    batch = ActiveRun("/w/a", "ops", 1000, NOW - 10, True, projects={"/w/a": 0.1, "/w/b": 0.9})
+    queued = [_run(1, submitter="carol", project="/w/b"), _run(2, submitter="dave", project="/w/a")]
+
+    assert [run.id for run in schedule(queued, [batch], NOW)] == [2, 1]
+
+
+def test_estimate_start_times_fill_worker_slots():
+    active = [ActiveRun("/w/a", "alice", 100, NOW - 40, True)]
+    order = [_run(1, cost=30), _run(2, cost=30), _run(3, cost=30)]
+
+    starts = estimate_start_times(order, active, NOW, concurrency=2)
+
+    assert starts == {1: NOW, 2: NOW + 30, 3: NOW + 60}
+
+
+def test_estimate_cost_grows_with_model_size_and_context():
+    small = estimate_cost_s(10_000, 100, "qwen2.5-coder:7b")
+    large = estimate_cost_s(10_000, 100, "qwen2.5-coder:32b")
+    bigger_context = estimate_cost_s(150_000, 100, "qwen2.5-coder:7b")
+
+    assert large > small
+    assert bigger_context > small
+
+
+def test_queue_endpoint_reports_positions(temp_db: Path):
+    project = temp_db.parent / "workspace" / "proj"
+    project.mkdir()
+    (project / "MAIN.BP").write_text('CRT "HI"')
+    client = TestClient(app)
+
+    bulk = client.post(
+        "/runs", json={"project_path": str(project), "prompt": "convert", "priority": "bulk", "submitter": "alice"}
+    ).json()
+    quick = client.post(
+        "/runs", json={"project_path": str(project), "prompt": "explain", "priority": "interactive", "submitter": "bob"}
+    ).json()
+
+    assert bulk["queue_position"] == 1
+    assert quick["queue_position"] == 1
+    assert quick["estimated_cost_s"] > 0
+
+    queue = client.get("/queue").json()["queue"]
+    assert [(q["id"], q["queue_position"]) for q in queue] == [(quick["id"], 1), (bulk["id"], 2)]
+    assert client.get(f"/runs/{bulk['id']}").json()["queue"]["queue_position"] == 2
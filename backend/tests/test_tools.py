@@ -19,3 +19,13 @@ def test_safe_path_blocks_escape(tmp_path: Path):
         assert False, "Expected ValueError"
     except ValueError:
         assert True
+
+
+def test_write_file_reports_line_stats_for_existing_file(tmp_path: Path):
+    (tmp_path / "MAIN.BP").write_text("CRT 'A'\nCRT 'B'\nCRT 'C'\n")
+    events = []
+    reg = ToolRegistry(str(tmp_path), lambda k, m: events.append((k, m)))
+    result = reg.write_file("MAIN.BP", "CRT 'A'\nCRT 'X'\nCRT 'C'\nCRT 'D'\n")
+    assert "-CRT 'B'" in result.output
+    assert "+CRT 'X'" in result.output
+    assert events[-1] == ("tool", "write_file MAIN.BP (+2 -1)")
@@ -0,0 +1,82 @@
+"""Compare two benchmark result files and fail on regressions.
+
+    python bench/compare.py baseline.json current.json --threshold 0.15
+
+Exits 1 when any directional metric (see scenarios.py) regresses by more than
+the threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+LOWER_IS_BETTER = ("_ms", "_s", "_bytes", "_kib")
+HIGHER_IS_BETTER = ("_per_s",)
+
+
+def flatten(node: dict, prefix: str = "") -> dict[str, float]:
+    flat: dict[str, float] = {}
+    for key, value in node.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def direction(metric: str) -> int:
+    leaf = metric.rsplit(".", 1)[-1]
+    if leaf.endswith(HIGHER_IS_BETTER):
+        return 1
+    if leaf.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[dict]:
+    before = flatten(baseline.get("results", {}))
+    after = flatten(current.get("results", {}))
+    rows = []
+    for metric in sorted(before.keys() & after.keys()):
+        sign = direction(metric)
+        if not sign or not before[metric]:
+            continue
+        change = (after[metric] - before[metric]) / abs(before[metric])
+        rows.append(
+            {
+                "metric": metric,
+                "baseline": before[metric],
+                "current": after[metric],
+                "change": round(change, 4),
+                "regression": change * sign < -threshold,
+            }
+        )
+    return rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare benchmark results")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative slowdown (default 0.15)")
+    parser.add_argument("--json", action="store_true", help="print rows as JSON")
+    args = parser.parse_args(argv)
+
+    rows = compare(
+        json.loads(Path(args.baseline).read_text()), json.loads(Path(args.current).read_text()), args.threshold
+    )
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else "ok"
+            print(f"{flag:>10}  {row['metric']:<60} {row['baseline']:>12.3f} -> {row['current']:>12.3f} ({row['change']:+.1%})")
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
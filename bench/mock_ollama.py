@@ -0,0 +1,198 @@
+"""Local stand-in for the Ollama HTTP API used by benchmarks.
+
+Serves /api/tags, /api/ps and /api/generate (streaming and non-streaming) with
+a configurable model load time, first-token latency, generation rate and error
+rate so backend and worker flows can be measured without a GPU or a real model.
+An empty prompt only loads the model, like Ollama's keep-alive ping.
+
+    python bench/mock_ollama.py --port 11435 --tokens-per-s 40 --latency-s 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@dataclass
+class MockOllamaConfig:
+    tokens_per_s: float = 200.0
+    latency_s: float = 0.05
+    error_rate: float = 0.0
+    response_tokens: int = 60
+    load_s: float = 0.0
+    models: list[str] = field(default_factory=lambda: ["qwen2.5-coder:7b", "qwen2.5-coder:32b"])
+    seed: int = 0
+
+
+def build_response_text(tokens: int) -> str:
+    answer = " ".join(f"tok{i}" for i in range(max(tokens - 8, 1)))
+    return json.dumps({"edits": [], "validation_commands": [], "answer": answer})
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_MockServer"
+
+    def log_message(self, format, *args):  # noqa: A002 - silence default stderr logging
+        return
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": name} for name in self.server.config.models]})
+            return
+        if self.path == "/api/ps":
+            self._send_json(200, {"models": [{"name": name, "model": name} for name in sorted(self.server.loaded)]})
+            return
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        config = self.server.config
+        self.server.record(request)
+
+        if self.server.roll() < config.error_rate:
+            self._send_json(500, {"error": "mock ollama injected failure"})
+            return
+
+        self.server.ensure_loaded(request.get("model"))
+        if not request.get("prompt"):
+            self._send_json(200, {"model": request.get("model"), "response": "", "done": True, "done_reason": "load"})
+            return
+
+        started = time.perf_counter()
+        prompt_tokens = max(len(str(request.get("prompt", ""))) // 4, 1)
+        time.sleep(config.latency_s)
+        prompt_eval_ns = int((time.perf_counter() - started) * 1e9)
+
+        tokens = config.response_tokens
+        gen_s = tokens / config.tokens_per_s if config.tokens_per_s > 0 else 0.0
+        text = build_response_text(tokens)
+        stats = {
+            "model": request.get("model"),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": prompt_eval_ns,
+            "eval_count": tokens,
+            "eval_duration": int(gen_s * 1e9),
+        }
+
+        if request.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            pieces = [text[i : i + 16] for i in range(0, len(text), 16)] or [""]
+            for piece in pieces:
+                time.sleep(gen_s / len(pieces))
+                self.wfile.write(json.dumps({"response": piece, "done": False}).encode() + b"\n")
+            done = {"response": "", "done": True, **stats}
+            done["total_duration"] = int((time.perf_counter() - started) * 1e9)
+            self.wfile.write(json.dumps(done).encode() + b"\n")
+            return
+
+        time.sleep(gen_s)
+        stats["total_duration"] = int((time.perf_counter() - started) * 1e9)
+        self._send_json(200, {"response": text, "done": True, **stats})
+
+
+class _MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: MockOllamaConfig):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.requests: list[dict] = []
+        self.loaded: set[str] = set()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._random = random.Random(config.seed)
+
+    def record(self, request: dict) -> None:
+        with self._lock:
+            self.requests.append(request)
+
+    def ensure_loaded(self, model: str | None) -> None:
+        """Pay config.load_s the first time a model is used; loads are serialized like Ollama's."""
+        with self._load_lock:
+            if model not in self.loaded:
+                time.sleep(self.config.load_s)
+                self.loaded.add(model)
+
+    def roll(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+
+class MockOllama:
+    """Run the mock server on a background thread; usable as a context manager."""
+
+    def __init__(self, config: MockOllamaConfig | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockOllamaConfig()
+        self._server = _MockServer((host, port), self.config)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> list[dict]:
+        return self._server.requests
+
+    def start(self) -> "MockOllama":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockOllama":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-s", type=float, default=MockOllamaConfig.tokens_per_s)
+    parser.add_argument("--latency-s", type=float, default=MockOllamaConfig.latency_s)
+    parser.add_argument("--error-rate", type=float, default=MockOllamaConfig.error_rate)
+    parser.add_argument("--response-tokens", type=int, default=MockOllamaConfig.response_tokens)
+    parser.add_argument("--load-s", type=float, default=MockOllamaConfig.load_s)
+    args = parser.parse_args()
+
+    config = MockOllamaConfig(
+        tokens_per_s=args.tokens_per_s,
+        latency_s=args.latency_s,
+        error_rate=args.error_rate,
+        response_tokens=args.response_tokens,
+        load_s=args.load_s,
+    )
+    server = MockOllama(config, args.host, args.port)
+    print(f"mock ollama listening on {server.url}")
+    server._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Synthetic project generators for benchmarks.
+
+Projects mix Pick/BASIC programs (BP/ and .bas/.basic files), Python and JS
+sources, docs and a sprinkling of binary blobs, spread across nested
+directories so tree walks behave like a real checkout.
+"""
+
+from __future__ import annotations
+
+import random
+from pathlib import Path
+
+PICK_PROGRAM = """* {name} - generated benchmark program
+      PROGRAM {name}
+      OPEN 'CUSTOMERS' TO F.CUST ELSE STOP 201, 'CUSTOMERS'
+      EQU AM TO CHAR(254), VM TO CHAR(253)
+      SELECT F.CUST
+10    READNEXT ID ELSE GOTO 90
+      READ REC FROM F.CUST, ID ELSE GOTO 10
+      NAME = REC<1>
+      PHONES = REC<{field}>
+      FOR I = 1 TO DCOUNT(PHONES, VM)
+         GOSUB 100
+      NEXT I
+      GOTO 10
+90    STOP
+100   * normalise phone
+      PHONE = PHONES<1,I>
+      CONVERT '-() ' TO '' IN PHONE
+      RETURN
+"""
+
+PYTHON_MODULE = '''"""{name} - generated benchmark module."""
+
+
+def handle_{name}(records):
+    total = 0
+    for record in records:
+        if record.get("active"):
+            total += record.get("amount", {field})
+    return total
+'''
+
+JS_MODULE = """// {name} - generated benchmark module
+export function handle{name}(items) {{
+  return items.filter((item) => item.score > {field}).map((item) => item.id);
+}}
+"""
+
+DOC = "# {name}\n\nGenerated documentation page {field}.\n"
+
+_KINDS = [
+    ("pick", 0.35),
+    ("python", 0.30),
+    ("js", 0.20),
+    ("doc", 0.12),
+    ("binary", 0.03),
+]
+
+
+def _pick_kind(rng: random.Random) -> str:
+    roll = rng.random()
+    for kind, weight in _KINDS:
+        if roll < weight:
+            return kind
+        roll -= weight
+    return _KINDS[-1][0]
+
+
+def generate_project(root: Path, n_files: int, seed: int = 0, files_per_dir: int = 50) -> Path:
+    """Create n_files files under root and return root; deterministic for a given seed."""
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+
+    for index in range(n_files):
+        kind = _pick_kind(rng)
+        bucket = f"pkg{index // files_per_dir:05d}"
+        field = rng.randint(2, 40)
+
+        if kind == "pick":
+            name = f"PROG{index:06d}"
+            suffix = rng.choice(["", ".bas", ".basic", ".bp"])
+            target = root / "BP" / bucket / f"{name}{suffix}"
+            body = PICK_PROGRAM.format(name=name, field=field)
+        elif kind == "python":
+            name = f"mod{index:06d}"
+            target = root / "src" / bucket / f"{name}.py"
+            body = PYTHON_MODULE.format(name=name, field=field)
+        elif kind == "js":
+            name = f"Mod{index:06d}"
+            target = root / "web" / bucket / f"{name}.js"
+            body = JS_MODULE.format(name=name, field=field)
+        elif kind == "doc":
+            name = f"page{index:06d}"
+            target = root / "docs" / bucket / f"{name}.md"
+            body = DOC.format(name=name, field=field)
+        else:
+            target = root / "assets" / bucket / f"blob{index:06d}.bin"
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(bytes(rng.getrandbits(8) for _ in range(256)) + b"\x00")
+            continue
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(body)
+
+    return root
+
+
+def generate_large_file(lines: int, seed: int = 0) -> str:
+    """Return a Pick/BASIC-flavoured source file with the given number of lines."""
+    rng = random.Random(seed)
+    return "\n".join(f"{i:05d}  X{i} = REC<{rng.randint(1, 30)}> : '{rng.random():.6f}'" for i in range(lines))
@@ -0,0 +1,76 @@
+"""Run benchmark scenarios and write machine-readable results.
+
+    python bench/run.py --profile quick --output bench_results.json
+    python bench/compare.py baseline.json bench_results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from mock_ollama import MockOllama, MockOllamaConfig
+from scenarios import PROFILES, REPO_ROOT, SCENARIOS, BenchEnv
+
+
+def git_revision() -> str:
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10
+        )
+        return proc.stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Agentic coding app benchmark suite")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="repeat to select several")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--tokens-per-s", type=float, default=MockOllamaConfig.tokens_per_s)
+    parser.add_argument("--latency-s", type=float, default=MockOllamaConfig.latency_s)
+    parser.add_argument("--error-rate", type=float, default=MockOllamaConfig.error_rate)
+    parser.add_argument("--workdir", help="reuse a directory for generated projects and the DB")
+    args = parser.parse_args(argv)
+
+    selected = args.scenario or list(SCENARIOS)
+    config = MockOllamaConfig(tokens_per_s=args.tokens_per_s, latency_s=args.latency_s, error_rate=args.error_rate)
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "profile": args.profile,
+            "mock_ollama": {"tokens_per_s": config.tokens_per_s, "latency_s": config.latency_s, "error_rate": config.error_rate},
+        },
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="agentic-bench-") as tmp, MockOllama(config) as ollama:
+        env = BenchEnv(Path(args.workdir or tmp), ollama.url)
+        env.activate()
+        for name in selected:
+            print(f"[bench] {name} ...", file=sys.stderr)
+            t0 = time.perf_counter()
+            report["results"][name] = SCENARIOS[name](env, **PROFILES[args.profile].get(name, {}))
+            print(f"[bench] {name} done in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
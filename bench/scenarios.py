@@ -0,0 +1,287 @@
+"""Benchmark scenarios for the main backend and worker flows.
+
+Each scenario takes a BenchEnv and returns a dict of metrics. Metric names end
+in a unit suffix that compare.py uses to decide direction: ``_per_s`` is
+higher-is-better; ``_ms``, ``_s``, ``_bytes`` and ``_kib`` are lower-is-better;
+anything else is informational.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+
+from projects import generate_large_file, generate_project
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class BenchEnv:
+    root: Path
+    ollama_url: str
+
+    @property
+    def workspace(self) -> Path:
+        return self.root / "workspace"
+
+    @property
+    def db_path(self) -> Path:
+        return self.root / "data" / "app.db"
+
+    def activate(self) -> None:
+        """Point backend and worker at this env; must run before either is imported."""
+        os.environ["DB_PATH"] = str(self.db_path)
+        os.environ["WORKSPACE_ROOT"] = str(self.workspace)
+        os.environ["OLLAMA_BASE_URL"] = self.ollama_url
+        for path in (REPO_ROOT / "backend", REPO_ROOT / "worker"):
+            if str(path) not in sys.path:
+                sys.path.insert(0, str(path))
+        self.workspace.mkdir(parents=True, exist_ok=True)
+
+    def project(self, n_files: int) -> Path:
+        path = self.workspace / f"synthetic-{n_files}"
+        if not path.exists():
+            generate_project(path, n_files, seed=n_files)
+        return path
+
+
+def _summary(samples_s: list[float]) -> dict:
+    ordered = sorted(samples_s)
+    if not ordered:
+        return {"count": 0}
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))] * 1000
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pct(0.50), 3),
+        "p95_ms": round(pct(0.95), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+def _client():
+    from fastapi.testclient import TestClient
+
+    from app.db import init_db
+    from app.main import app
+
+    init_db()
+    return TestClient(app)
+
+
+def post_runs_throughput(env: BenchEnv, requests: int = 200) -> dict:
+    client = _client()
+    project = env.project(100)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(requests):
+        t0 = time.perf_counter()
+        resp = client.post("/runs", json={"project_path": str(project), "prompt": f"bench {i}"})
+        latencies.append(time.perf_counter() - t0)
+        resp.raise_for_status()
+    elapsed = time.perf_counter() - started
+
+    with sqlite3.connect(env.db_path) as c:
+        c.execute("UPDATE runs SET status='completed' WHERE status='queued'")
+    return {"requests_per_s": round(requests / elapsed, 2), **_summary(latencies)}
+
+
+def build_repo_context_scaling(env: BenchEnv, sizes: tuple[int, ...] = (100, 1000)) -> dict:
+    import worker
+
+    results = {}
+    for size in sizes:
+        project = env.project(size)
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        context, files = worker.build_repo_context(project)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f"files_{size}"] = {
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "peak_kib": round(peak / 1024, 1),
+            "context_chars": len(context),
+            "included_files": len(files),
+        }
+    return results
+
+
+def run_detail_growth(env: BenchEnv, log_counts: tuple[int, ...] = (10, 100, 1000), samples: int = 20) -> dict:
+    client = _client()
+    project = env.project(100)
+    diff = generate_large_file(40)
+    results = {}
+
+    for count in log_counts:
+        run_id = client.post("/runs", json={"project_path": str(project), "prompt": "detail"}).json()["id"]
+        with sqlite3.connect(env.db_path) as c:
+            c.execute("UPDATE runs SET status='completed' WHERE id=?", (run_id,))
+            c.executemany(
+                "INSERT INTO run_logs(run_id,kind,message) VALUES(?,?,?)",
+                [(run_id, "tool", f"bench log line {i}") for i in range(count)],
+            )
+            c.executemany(
+                "INSERT INTO file_changes(run_id,file_path,diff,accepted) VALUES(?,?,?,0)",
+                [(run_id, f"BP/FILE{i}", diff) for i in range(max(count // 10, 1))],
+            )
+
+        latencies = []
+        size = 0
+        for _ in range(samples):
+            t0 = time.perf_counter()
+            resp = client.get(f"/runs/{run_id}")
+            latencies.append(time.perf_counter() - t0)
+            size = len(resp.content)
+        results[f"logs_{count}"] = {"response_bytes": size, **_summary(latencies)}
+    return results
+
+
+async def _drive_worker(env: BenchEnv, runs: int, concurrency: int, arrival_interval_s: float) -> dict:
+    import worker
+
+    worker.init_db()
+    client = _client()
+    project = env.project(100)
+    enqueued: dict[int, float] = {}
+    started: dict[int, float] = {}
+    finished: dict[int, float] = {}
+    original_process = worker.process
+
+    async def timed_process(run):
+        started[run["id"]] = time.perf_counter()
+        try:
+            await original_process(run)
+        finally:
+            finished[run["id"]] = time.perf_counter()
+
+    def produce():
+        for i in range(runs):
+            t0 = time.perf_counter()
+            run_id = client.post("/runs", json={"project_path": str(project), "prompt": f"worker {i}"}).json()["id"]
+            enqueued[run_id] = t0
+            time.sleep(arrival_interval_s)
+
+    worker.process = timed_process
+    consumers = [asyncio.create_task(worker.loop_forever(poll_interval_s=0.01)) for _ in range(concurrency)]
+    try:
+        t0 = time.perf_counter()
+        await asyncio.to_thread(produce)
+        while len(finished) < runs:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - t0
+    finally:
+        worker.process = original_process
+        for task in consumers:
+            task.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+
+    with sqlite3.connect(env.db_path) as c:
+        failed = c.execute(
+            f"SELECT COUNT(*) FROM runs WHERE status='failed' AND id IN ({','.join('?' * len(enqueued))})",
+            list(enqueued),
+        ).fetchone()[0]
+
+    queue_latency = _summary([started[i] - enqueued[i] for i in enqueued if i in started])
+    return {
+        "runs_per_s": round(runs / elapsed, 3),
+        "failed_runs": failed,
+        "queue_to_start": queue_latency,
+        "run_duration": _summary([finished[i] - started[i] for i in started]),
+    }
+
+
+def worker_throughput(
+    env: BenchEnv, runs: int = 20, concurrency_levels: tuple[int, ...] = (1, 2, 4), arrival_interval_s: float = 0.0
+) -> dict:
+    return {
+        f"concurrency_{level}": asyncio.run(_drive_worker(env, runs, level, arrival_interval_s))
+        for level in concurrency_levels
+    }
+
+
+def diff_large_file(env: BenchEnv, lines: int = 20000) -> dict:
+    from diffing import compute_diff
+
+    before = generate_large_file(lines, seed=1)
+    after_lines = before.splitlines()
+    for i in range(0, lines, 7):
+        after_lines[i] += " ! changed"
+    after = "\n".join(after_lines)
+
+    t0 = time.perf_counter()
+    result = compute_diff("BP/BIG", before, after)
+    return {
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 3),
+        "lines_added": result.added,
+        "approximate": result.approximate,
+    }
+
+
+def first_run_latency(env: BenchEnv, load_s: float = 1.0) -> dict:
+    """First run after a restart against a model that takes `load_s` to load, with and without warm_up()."""
+    import worker
+    from mock_ollama import MockOllama, MockOllamaConfig
+
+    worker.init_db()
+    client = _client()
+    project = env.project(100)
+    original_url = worker.OLLAMA_URL
+    results = {}
+    try:
+        for label, prewarm in (("cold", False), ("prewarmed", True)):
+            with MockOllama(MockOllamaConfig(load_s=load_s, latency_s=0.0)) as ollama:
+                worker.OLLAMA_URL = ollama.url
+                worker._context_cache.clear()
+                warm_s = 0.0
+                if prewarm:
+                    t0 = time.perf_counter()
+                    asyncio.run(worker.warm_up(["qwen2.5-coder:7b"]))
+                    warm_s = time.perf_counter() - t0
+                client.post("/runs", json={"project_path": str(project), "prompt": f"first run {label}"})
+                t0 = time.perf_counter()
+                asyncio.run(worker.process(worker.claim_next_run()))
+                results[label] = {"first_run_s": round(time.perf_counter() - t0, 3), "warm_up_s": round(warm_s, 3)}
+    finally:
+        worker.OLLAMA_URL = original_url
+    return results
+
+
+SCENARIOS = {
+    "post_runs": post_runs_throughput,
+    "build_repo_context": build_repo_context_scaling,
+    "run_detail": run_detail_growth,
+    "worker": worker_throughput,
+    "diff": diff_large_file,
+    "first_run": first_run_latency,
+}
+
+PROFILES = {
+    "quick": {
+        "post_runs": {"requests": 100},
+        "build_repo_context": {"sizes": (100, 1000)},
+        "run_detail": {"log_counts": (10, 100, 1000)},
+        "worker": {"runs": 10, "concurrency_levels": (1, 4)},
+        "diff": {"lines": 20000},
+        "first_run": {"load_s": 1.0},
+    },
+    "full": {
+        "post_runs": {"requests": 1000},
+        "build_repo_context": {"sizes": (100, 1000, 10000, 100000)},
+        "run_detail": {"log_counts": (10, 100, 1000, 10000)},
+        "worker": {"runs": 50, "concurrency_levels": (1, 2, 4, 8)},
+        "diff": {"lines": 20000},
+        "first_run": {"load_s": 5.0},
+    },
+}
@@ -0,0 +1,47 @@
+import httpx
+
+from compare import compare
+from mock_ollama import MockOllama, MockOllamaConfig
+from projects import generate_project
+
+
+def test_generate_project_is_deterministic_and_includes_pick_basic(tmp_path):
+    first = generate_project(tmp_path / "a", 200, seed=7)
+    second = generate_project(tmp_path / "b", 200, seed=7)
+
+    files_a = sorted(p.relative_to(first).as_posix() for p in first.rglob("*") if p.is_file())
+    files_b = sorted(p.relative_to(second).as_posix() for p in second.rglob("*") if p.is_file())
+
+    assert len(files_a) == 200
+    assert files_a == files_b
+    assert any(name.startswith("BP/") for name in files_a)
+
+
+def test_mock_ollama_reports_generation_stats():
+    config = MockOllamaConfig(tokens_per_s=10_000, latency_s=0, response_tokens=20)
+    with MockOllama(config) as ollama:
+        tags = httpx.get(f"{ollama.url}/api/tags").json()
+        body = httpx.post(f"{ollama.url}/api/generate", json={"model": "m", "prompt": "hi", "stream": False}).json()
+
+    assert tags["models"][0]["name"] == config.models[0]
+    assert body["eval_count"] == 20
+    assert '"answer"' in body["response"]
+    assert len(ollama.requests) == 1
+
+
+def test_mock_ollama_injects_errors():
+    with MockOllama(MockOllamaConfig(error_rate=1.0)) as ollama:
+        resp = httpx.post(f"{ollama.url}/api/generate", json={"model": "m", "prompt": "hi", "stream": False})
+
+    assert resp.status_code == 500
+
+
+def test_compare_flags_regressions_by_metric_direction():
+    baseline = {"results": {"post_runs": {"requests_per_s": 100.0, "p95_ms": 10.0, "count": 5}}}
+    current = {"results": {"post_runs": {"requests_per_s": 70.0, "p95_ms": 10.5, "count": 9}}}
+
+    rows = {row["metric"]: row for row in compare(baseline, current, threshold=0.15)}
+
+    assert rows["post_runs.requests_per_s"]["regression"]
+    assert not rows["post_runs.p95_ms"]["regression"]
+    assert "post_runs.count" not in rows
@@ -54,9 +54,18 @@ async function loadModels() {
   refreshModelSelects();
 }
 
+function projectLabel(entry) {
+  if (!entry || entry.indexed_at == null) return entry ? `${entry.project_path} (indexing...)` : '';
+  const langs = Object.keys(entry.languages || {}).slice(0, 3).join(', ');
+  const kib = Math.round(entry.total_bytes / 1024);
+  return `${entry.project_path} (${entry.file_count} files, ${kib} KiB${langs ? `, ${langs}` : ''})`;
+}
+
 async function loadProjects(selectedProject = null) {
   const data = await getJson('/projects');
   const sel = document.getElementById('project');
+  selectedProject = selectedProject || sel.value;
+  const catalog = Object.fromEntries((data.catalog || []).map((entry) => [entry.project_path, entry]));
   sel.innerHTML = '';
 
   if (!data.projects.length) {
@@ -70,7 +79,7 @@ async function loadProjects(selectedProject = null) {
   data.projects.forEach((p) => {
     const option = document.createElement('option');
     option.value = p;
-    option.textContent = p;
+    option.textContent = projectLabel(catalog[p]) || p;
     sel.appendChild(option);
   });
 
@@ -85,7 +94,7 @@ async function loadRuns() {
   ul.innerHTML = '';
   data.runs.forEach((run) => {
     const li = document.createElement('li');
-    li.innerHTML = `<button data-id="${run.id}">#${run.id} ${run.status}</button> <small>${run.project_path}</small>`;
+    li.innerHTML = `<button data-id="${run.id}">#${run.id} ${run.status}</button> <small>${run.priority || 'normal'} · ${run.project_path}</small>`;
     li.querySelector('button').onclick = () => {
       activeRunId = run.id;
       loadRun(run.id);
@@ -99,7 +108,19 @@ async function loadRun(id) {
   const logs = data.logs
     .map((l) => `[${l.created_at}] ${l.kind.toUpperCase()}: ${l.message}`)
     .join('\n');
-  document.getElementById('logs').textContent = logs;
+  const queued = data.queue
+    ? `Queue position ${data.queue.queue_position}, estimated start ${data.queue.estimated_start_at}\n`
+    : '';
+  const batch = data.batch
+    ? `Batch: ${Object.entries(data.batch.by_status).map(([k, v]) => `${v} ${k}`).join(', ')} of ${data.batch.total} tasks\n`
+    : '';
+  const archived = data.archived ? 'Archived run (read-only)\n' : '';
+  document.getElementById('logs').textContent = archived + queued + batch + logs;
+
+  const profiles = await getJson(`/runs/${id}/profiles`);
+  document.getElementById('profiles').innerHTML = profiles.profiles
+    .map((p) => `<a href="${apiBase}/runs/${id}/profiles/${p.id}">Download ${p.kind} profile</a>`)
+    .join(' ');
 
   const diffs = document.getElementById('diffs');
   diffs.innerHTML = '';
@@ -107,7 +128,7 @@ async function loadRun(id) {
     const div = document.createElement('div');
     div.className = 'diff';
     div.innerHTML = `
-      <strong>${ch.file_path}</strong>
+      <strong>${ch.file_path}</strong> <small>+${ch.lines_added ?? 0} -${ch.lines_removed ?? 0}</small>
       <pre>${ch.diff}</pre>
       <button data-id="${ch.id}">${ch.accepted ? 'Accepted' : 'Accept'}</button>
     `;
@@ -128,6 +149,8 @@ async function createRun() {
     prompt: document.getElementById('prompt').value,
     fast_model: document.getElementById('fastModel').value || null,
     deep_model: document.getElementById('deepModel').value || null,
+    profile: document.getElementById('profileRun').checked,
+    priority: document.getElementById('priority').value,
   };
 
   const result = await getJson('/runs', { method: 'POST', body: JSON.stringify(payload) });
@@ -185,6 +208,8 @@ setInterval(async () => {
   }
 }, 3000);
 
+setInterval(() => loadProjects(), 15000);
+
 loadModels();
 loadProjects();
 loadRuns();
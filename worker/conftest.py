@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import pytest
+
+import worker
+from catalog import record_watcher_heartbeat
+
+
+class FakeOllama:
+    """Stands in for ollama_generate_with_stats; `reply` is a string or a function of the prompt."""
+
+    def __init__(self):
+        self.reply = '{"edits": [], "validation_commands": [], "answer": "ok"}'
+        self.stats: dict = {}
+        self.prompts: list[str] = []
+
+    async def __call__(self, model: str, prompt: str):
+        self.prompts.append(prompt)
+        text = self.reply(prompt) if callable(self.reply) else self.reply
+        return text, worker.generation_stats({"model": model, **self.stats})
+
+
+@pytest.fixture
+def worker_db(tmp_path: Path, monkeypatch) -> Path:
+    path = tmp_path / "app.db"
+    monkeypatch.setattr(worker, "DB_PATH", path)
+    monkeypatch.setattr(worker, "_context_cache", worker.OrderedDict())
+    worker.init_db()
+    return path
+
+
+@pytest.fixture
+def live_watcher(tmp_path: Path, worker_db: Path) -> Path:
+    """A fresh backend watcher heartbeat for tmp_path, so its catalog indexes are trusted."""
+    with worker.conn() as c:
+        record_watcher_heartbeat(c, tmp_path, "poll")
+    return tmp_path
+
+
+@pytest.fixture
+def fake_ollama(monkeypatch) -> FakeOllama:
+    fake = FakeOllama()
+    monkeypatch.setattr(worker, "ollama_generate_with_stats", fake)
+    return fake
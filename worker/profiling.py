@@ -0,0 +1,197 @@
+"""Opt-in per-run profiling for the worker.
+
+Two modes:
+- ``full``: deterministic cProfile plus a tracemalloc snapshot. Requested per
+  run via RunCreate.profile; adds noticeable overhead, so use it for
+  investigating a specific slow or memory-hungry run.
+- ``sample``: a background thread samples every thread's stack each
+  PROFILE_SAMPLE_INTERVAL_MS and emits collapsed stacks (flamegraph input),
+  each rooted at its thread name; idle executor threads are skipped. Cheap
+  enough to leave on for a fraction of runs via PROFILE_SAMPLE_RATE.
+
+Blocking stages (scanning, diffing, writing files) run in executor threads, so
+the worker hands them to profiled_call(): under a ``full`` profile each call
+gets its own cProfile that is merged into the run's stats (on Python 3.12+
+cProfile already sees every thread and profiled_call just runs the function).
+
+Profiles cover the process, not a single coroutine: runs that overlap in the
+same event loop show up in each other's profiles. Only one ``full`` profile can
+be active at a time; concurrent requests fall back to ``sample``.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import resource
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_INTERVAL_S = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10")) / 1000
+TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "25"))
+TOP_ENTRIES = 30
+SAMPLER_THREAD_NAME = "run-profiler-sampler"
+
+_full_profile_lock = threading.Lock()
+_active_full: RunProfiler | None = None
+
+
+@dataclass
+class ProfileArtifact:
+    kind: str
+    fmt: str
+    content: bytes
+    summary: str
+
+
+def choose_mode(requested: bool, roll=random.random) -> str | None:
+    if requested:
+        return "full"
+    if PROFILE_SAMPLE_RATE > 0 and roll() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+def profiled_call(fn, *args, **kwargs):
+    """Call `fn` (from an executor thread) under the active full profile, if any."""
+    owner = _active_full
+    if owner is None:
+        return fn(*args, **kwargs)
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:  # Python 3.12+: the run's profile already covers this thread
+        return fn(*args, **kwargs)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profile.disable()
+        owner._thread_profiles.append(profile)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle_executor(frame) -> bool:
+    """A ThreadPoolExecutor worker blocked waiting for its next job."""
+    code = frame.f_code
+    return code.co_name == "_worker" and code.co_filename.endswith(os.path.join("concurrent", "futures", "thread.py"))
+
+
+class StackSampler:
+    def __init__(self, interval_s: float = PROFILE_SAMPLE_INTERVAL_S):
+        self.interval_s = interval_s
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=SAMPLER_THREAD_NAME, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                name = names.get(thread_id, str(thread_id))
+                if name == SAMPLER_THREAD_NAME or _is_idle_executor(frame):
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(name)
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class RunProfiler:
+    def __init__(self, mode: str):
+        self.mode = mode
+        self._profile: cProfile.Profile | None = None
+        self._sampler: StackSampler | None = None
+        self._thread_profiles: list[cProfile.Profile] = []
+        self._started_tracemalloc = False
+        self._rss_before_kib = 0
+
+    def start(self) -> None:
+        global _active_full
+        if self.mode == "full" and not _full_profile_lock.acquire(blocking=False):
+            self.mode = "sample"
+        self._rss_before_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if self.mode == "full":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._started_tracemalloc = True
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+            _active_full = self
+        else:
+            self._sampler = StackSampler()
+            self._sampler.start()
+
+    def stop(self) -> list[ProfileArtifact]:
+        global _active_full
+        artifacts: list[ProfileArtifact] = []
+        rss_after_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        try:
+            if self._profile is not None:
+                self._profile.disable()
+                artifacts.append(self._cpu_artifact(self._profile))
+                artifacts.append(self._memory_artifact(rss_after_kib))
+            if self._sampler is not None:
+                self._sampler.stop()
+                artifacts.append(self._sample_artifact(rss_after_kib))
+        finally:
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            if self.mode == "full":
+                _active_full = None
+                _full_profile_lock.release()
+        return artifacts
+
+    def _cpu_artifact(self, profile: cProfile.Profile) -> ProfileArtifact:
+        out = io.StringIO()
+        stats = pstats.Stats(profile, stream=out)
+        for thread_profile in self._thread_profiles:
+            stats.add(thread_profile)
+        raw = marshal.dumps(stats.stats)  # same layout as Profile.dump_stats()
+        stats.sort_stats("cumulative").print_stats(TOP_ENTRIES)
+        return ProfileArtifact("cprofile", "pstats", raw, out.getvalue())
+
+    def _memory_artifact(self, rss_after_kib: int) -> ProfileArtifact:
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+        )
+        _, peak = tracemalloc.get_traced_memory()
+        top = snapshot.statistics("lineno")[:TOP_ENTRIES]
+        lines = [f"peak traced: {peak / 1024:.1f} KiB; max RSS {self._rss_before_kib} -> {rss_after_kib} KiB"]
+        lines += [f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {stat.traceback}" for stat in top]
+        text = "\n".join(lines)
+        return ProfileArtifact("tracemalloc", "text", text.encode(), text)
+
+    def _sample_artifact(self, rss_after_kib: int) -> ProfileArtifact:
+        stacks = self._sampler.stacks
+        collapsed = "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(stacks.values())
+        lines = [
+            f"{total} samples every {self._sampler.interval_s * 1000:.0f} ms; "
+            f"max RSS {self._rss_before_kib} -> {rss_after_kib} KiB"
+        ]
+        lines += [f"{count:6d} {count / total:6.1%}  {leaf}" for leaf, count in leaves.most_common(TOP_ENTRIES)]
+        return ProfileArtifact("sample", "collapsed", collapsed.encode(), "\n".join(lines))
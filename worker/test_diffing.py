@@ -0,0 +1,81 @@
+import difflib
+import random
+import time
+
+from diffing import compute_diff, decode_diff, encode_diff
+
+
+def test_compute_diff_matches_difflib_format_for_simple_edits():
+    before_lines = [f"line {i}" for i in range(100)]
+    after_lines = list(before_lines)
+    after_lines[10] = "changed"
+    after_lines.insert(50, "inserted")
+    del after_lines[80]
+    before, after = "\n".join(before_lines), "\n".join(after_lines)
+
+    result = compute_diff("prog.bp", before, after)
+
+    expected = "\n".join(
+        difflib.unified_diff(before_lines, after_lines, fromfile="a/prog.bp", tofile="b/prog.bp", lineterm="")
+    )
+    assert result.text == expected
+    assert (result.added, result.removed) == (2, 2)
+
+
+def test_compute_diff_returns_empty_text_for_identical_content():
+    result = compute_diff("same.py", "x = 1\n", "x = 1\n")
+
+    assert result.text == ""
+    assert (result.added, result.removed) == (0, 0)
+
+
+def test_compute_diff_flags_binary_content():
+    result = compute_diff("blob", "abc", "a\x00c")
+
+    assert result.binary
+    assert result.text == "Binary files a/blob and b/blob differ"
+
+
+def test_compute_diff_handles_regenerated_large_file_quickly():
+    before = "\n".join(f"0010 X{i} = {i}" for i in range(20000))
+    after = "\n".join(f"0010 X{i} = {i * 2}" if i % 3 == 0 else f"0010 X{i} = {i}" for i in range(20000))
+
+    started = time.monotonic()
+    result = compute_diff("BIG.BP", before, after)
+
+    assert time.monotonic() - started < 5
+    assert result.added == result.removed == 6666
+
+
+def test_compute_diff_falls_back_to_replacement_when_deadline_hits():
+    before = "\n".join("ab"[i % 2] for i in range(4000))
+    after = "\n".join("ab"[(i // 3) % 2] for i in range(4000))
+
+    result = compute_diff("x.txt", before, after, timeout_s=0)
+
+    assert result.approximate
+    assert (result.added, result.removed) == (1, 1)
+    assert result.text.startswith("--- a/x.txt\n+++ b/x.txt\n@@ -1,4000 +1,4000 @@")
+
+
+def test_compute_diff_anchors_on_unique_lines_for_scattered_changes():
+    rng = random.Random(7)
+    before_lines = [f"0010 X{i} = {i}" for i in range(20000)]
+    # Replacement lines are copies of other lines, so nothing is dropped as one-sided.
+    after_lines = [before_lines[rng.randrange(20000)] if rng.random() < 0.5 else line for line in before_lines]
+    expected = difflib.unified_diff(before_lines, after_lines, lineterm="")
+    expected_added = sum(1 for line in expected if line.startswith("+") and not line.startswith("+++"))
+
+    started = time.monotonic()
+    result = compute_diff("BIG.BP", "\n".join(before_lines), "\n".join(after_lines))
+
+    assert time.monotonic() - started < 1
+    assert not result.approximate
+    assert result.added == result.removed == expected_added
+
+
+def test_encode_diff_round_trips():
+    payload, encoding = encode_diff("--- a/x\n+++ b/x\n@@ -1 +1 @@\n-a\n+b")
+
+    assert decode_diff(payload, encoding) == "--- a/x\n+++ b/x\n@@ -1 +1 @@\n-a\n+b"
+    assert decode_diff("plain text", "plain") == "plain text"
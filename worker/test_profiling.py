@@ -0,0 +1,92 @@
+import asyncio
+import marshal
+import threading
+import time
+
+from profiling import RunProfiler, choose_mode, profiled_call
+
+
+def _busy(n: int) -> list[str]:
+    return [str(i) * 3 for i in range(n)]
+
+
+def test_choose_mode_prefers_explicit_request_and_respects_sample_rate(monkeypatch):
+    import profiling
+
+    assert choose_mode(True) == "full"
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0.01)
+    assert choose_mode(False, roll=lambda: 0.005) == "sample"
+    assert choose_mode(False, roll=lambda: 0.5) is None
+
+
+def test_full_profile_captures_cpu_stats_and_allocations():
+    profiler = RunProfiler("full")
+    profiler.start()
+    kept = _busy(2000)
+    artifacts = {a.kind: a for a in profiler.stop()}
+
+    assert len(kept) == 2000
+    stats = marshal.loads(artifacts["cprofile"].content)
+    assert any(func[2] == "_busy" for func in stats)
+    assert "_busy" in artifacts["cprofile"].summary
+    assert artifacts["tracemalloc"].summary.startswith("peak traced:")
+
+
+def test_concurrent_full_profiles_fall_back_to_sampling():
+    first = RunProfiler("full")
+    second = RunProfiler("full")
+    first.start()
+    second.start()
+    second.stop()
+    first.stop()
+
+    assert first.mode == "full"
+    assert second.mode == "sample"
+
+
+def test_sample_profile_emits_collapsed_stacks():
+    profiler = RunProfiler("sample")
+    profiler.start()
+    deadline = time.monotonic() + 0.2
+    while time.monotonic() < deadline:
+        _busy(500)
+    (artifact,) = profiler.stop()
+
+    assert artifact.kind == "sample"
+    assert artifact.fmt == "collapsed"
+    assert b"test_sample_profile_emits_collapsed_stacks" in artifact.content
+
+
+def test_full_profile_includes_executor_thread_work():
+    async def scenario():
+        profiler = RunProfiler("full")
+        profiler.start()
+        await asyncio.to_thread(profiled_call, _busy, 2000)
+        return {a.kind: a for a in profiler.stop()}
+
+    artifacts = asyncio.run(scenario())
+
+    stats = marshal.loads(artifacts["cprofile"].content)
+    assert any(func[2] == "_busy" for func in stats)
+
+
+def test_sample_profile_walks_every_thread():
+    stop = threading.Event()
+
+    def spin():
+        while not stop.is_set():
+            _busy(500)
+
+    profiler = RunProfiler("sample")
+    profiler.start()
+    worker = threading.Thread(target=spin, name="diff-thread")
+    worker.start()
+    time.sleep(0.2)
+    stop.set()
+    worker.join()
+    (artifact,) = profiler.stop()
+
+    stacks = artifact.content.decode().splitlines()
+    assert any(line.startswith("diff-thread;") and "_busy" in line for line in stacks)
+    assert any(line.startswith("MainThread;") for line in stacks)
+    assert not any("run-profiler-sampler" in line for line in stacks)
@@ -1,3 +1,13 @@
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import profiling
+import pytest
+import worker
+from catalog import WATCHER_STALE_S, index_project, mark_dirty
 from worker import build_repo_context, build_worker_prompt, parse_model_response
 
 
@@ -68,3 +78,394 @@ def test_build_repo_context_skips_binary_files_without_extension(tmp_path):
 
     assert files == []
     assert context == ""
+
+
+def test_build_repo_context_uses_clean_catalog_index(tmp_path, live_watcher, monkeypatch):
+    project = tmp_path / "proj"
+    project.mkdir()
+    (project / "MAIN.BP").write_text("CRT 'A'\n")
+    (project / "blob").write_bytes(b"\x00\x10")
+    with worker.conn() as c:
+        index_project(c, project)
+
+    read = []
+    original = Path.read_bytes
+    monkeypatch.setattr(Path, "read_bytes", lambda self: read.append(self.name) or original(self))
+    (project / "NEW.BP").write_text("CRT 'B'\n")
+
+    _, files = build_repo_context(project)
+    assert files == ["MAIN.BP"]
+    assert read == ["MAIN.BP"]
+
+    with worker.conn() as c:
+        mark_dirty(c, [str(project)])
+    _, files = build_repo_context(project)
+    assert files == ["MAIN.BP", "NEW.BP"]
+
+
+def test_process_records_stage_timings_with_model_stats(tmp_path, worker_db, fake_ollama):
+    project = tmp_path / "proj"
+    project.mkdir()
+    (project / "MAIN.BP").write_text('CRT "HI"')
+    fake_ollama.stats = {"eval_count": 40, "eval_duration": 1_000_000_000, "prompt_eval_count": 12}
+    with worker.conn() as c:
+        c.execute("INSERT INTO runs(project_path,prompt,plan) VALUES(?,?,?)", (str(project), "explain", "{}"))
+        run = c.execute("SELECT * FROM runs").fetchone()
+
+    asyncio.run(worker.process(run))
+
+    with worker.conn() as c:
+        rows = {r["stage"]: r for r in c.execute("SELECT * FROM run_timings WHERE run_id=?", (run["id"],))}
+    assert set(rows) == {"scan", "prompt", "generate", "parse", "apply_edits", "validate", "total"}
+    assert rows["generate"]["tokens_per_s"] == 40.0
+    assert rows["generate"]["model"] == "qwen2.5-coder:7b"
+    assert rows["scan"]["detail"] == '{"files": 1}'
+
+
+def test_process_stores_profiles_when_requested(tmp_path, worker_db, fake_ollama):
+    project = tmp_path / "proj"
+    project.mkdir()
+    with worker.conn() as c:
+        c.execute("INSERT INTO runs(project_path,prompt,plan) VALUES(?,?,?)", (str(project), "x", '{"profile": true}'))
+        run = c.execute("SELECT * FROM runs").fetchone()
+
+    asyncio.run(worker.process(run))
+
+    with worker.conn() as c:
+        kinds = [r["kind"] for r in c.execute("SELECT kind FROM run_profiles WHERE run_id=?", (run["id"],))]
+    assert kinds == ["cprofile", "tracemalloc"]
+
+
+def test_process_logs_the_profiling_mode_in_effect(tmp_path, worker_db, fake_ollama):
+    project = tmp_path / "proj"
+    project.mkdir()
+    with worker.conn() as c:
+        c.execute("INSERT INTO runs(project_path,prompt,plan) VALUES(?,?,?)", (str(project), "x", '{"profile": true}'))
+        run = c.execute("SELECT * FROM runs").fetchone()
+
+    # Another run already holds the full profile.
+    assert profiling._full_profile_lock.acquire(blocking=False)
+    try:
+        asyncio.run(worker.process(run))
+    finally:
+        profiling._full_profile_lock.release()
+
+    with worker.conn() as c:
+        messages = [r["message"] for r in c.execute("SELECT message FROM run_logs WHERE run_id=?", (run["id"],))]
+        kinds = [r["kind"] for r in c.execute("SELECT kind FROM run_profiles WHERE run_id=?", (run["id"],))]
+    assert "profiling enabled (sample)" in messages
+    assert kinds == ["sample"]
+
+
+def test_claim_next_run_prefers_interactive_over_older_bulk(worker_db):
+    with worker.conn() as c:
+        for i in range(3):
+            c.execute(
+                "INSERT INTO runs(project_path,prompt,priority,submitter,estimated_cost_s) VALUES(?,?,?,?,?)",
+                ("/w/a", f"bulk {i}", "bulk", "alice", 300),
+            )
+        c.execute(
+            "INSERT INTO runs(project_path,prompt,priority,submitter,estimated_cost_s) VALUES(?,?,?,?,?)",
+            ("/w/b", "explain", "interactive", "bob", 10),
+        )
+
+    first = worker.claim_next_run()
+    second = worker.claim_next_run()
+
+    assert first["prompt"] == "explain"
+    assert first["status"] == "running"
+    assert first["started_at"] is not None
+    assert second["prompt"] == "bulk 0"
+
+
+def test_process_batch_fans_out_with_shared_prefix(tmp_path, worker_db, fake_ollama, monkeypatch):
+    project = tmp_path / "proj"
+    (project / "BP").mkdir(parents=True)
+    for name in ("A", "B", "C"):
+        (project / "BP" / name).write_text(f"READ REC FROM F, ID ELSE STOP\nCRT '{name}'")
+
+    scans = []
+    original_build = worker.build_repo_context
+
+    def counting_build(path):
+        scans.append(path)
+        return original_build(path)
+
+    def reply(prompt):
+        target = prompt.split("### TARGET FILE: ")[1].split("\n")[0]
+        if target == "BP/C":
+            raise RuntimeError("model unavailable")
+        edits = [{"file": target, "content": "READ REC FROM F, ID THEN NULL\n"}, {"file": "BP/OTHER", "content": "x"}]
+        return json.dumps({"edits": edits, "answer": f"converted {target}"})
+
+    monkeypatch.setattr(worker, "build_repo_context", counting_build)
+    fake_ollama.reply = reply
+    with worker.conn() as c:
+        c.execute(
+            "INSERT INTO runs(project_path,prompt,plan) VALUES(?,?,?)",
+            (str(project), "convert READ idiom", json.dumps({"batch": {"max_parallel": 2}})),
+        )
+        run = c.execute("SELECT * FROM runs").fetchone()
+        c.executemany(
+            "INSERT INTO batch_tasks(run_id,project_path,files) VALUES(?,?,?)",
+            [(run["id"], str(project), json.dumps([f"BP/{name}"])) for name in ("A", "B", "C")],
+        )
+
+    asyncio.run(worker.process(run))
+
+    assert len(scans) == 1
+    prefix = fake_ollama.prompts[0].split("Instruction:")[0]
+    assert all(p.startswith(prefix) for p in fake_ollama.prompts)
+    with worker.conn() as c:
+        status = c.execute("SELECT status FROM runs WHERE id=?", (run["id"],)).fetchone()[0]
+        tasks = [tuple(r) for r in c.execute("SELECT status, answer FROM batch_tasks ORDER BY id")]
+        changed = [r[0] for r in c.execute("SELECT file_path FROM file_changes ORDER BY file_path")]
+    assert status == "awaiting_review"
+    assert tasks[:2] == [("completed", "converted BP/A"), ("completed", "converted BP/B")]
+    assert tasks[2][0] == "failed"
+    assert changed == ["BP/A", "BP/B"]
+    assert not (project / "BP" / "OTHER").exists()
+
+
+def test_repo_context_is_reused_until_the_index_changes(tmp_path, live_watcher, monkeypatch):
+    project = tmp_path / "proj"
+    project.mkdir()
+    (project / "MAIN.BP").write_text("CRT 'A'\n")
+    with worker.conn() as c:
+        index_project(c, project)
+
+    builds = []
+    original = worker.build_repo_context
+    monkeypatch.setattr(worker, "build_repo_context", lambda path: builds.append(path) or original(path))
+
+    assert worker.repo_context(project)[1] == ["MAIN.BP"]
+    assert worker.repo_context(project)[1] == ["MAIN.BP"]
+    assert len(builds) == 1
+
+    (project / "NEW.BP").write_text("CRT 'B'\n")
+    with worker.conn() as c:
+        index_project(c, project)
+    assert worker.repo_context(project)[1] == ["MAIN.BP", "NEW.BP"]
+    assert len(builds) == 2
+
+
+def test_warm_up_prewarms_models_and_reports_status(worker_db, monkeypatch):
+    pinged = []
+
+    async def fake_prewarm(model):
+        if model == "missing:1b":
+            raise RuntimeError("model not found")
+        pinged.append(model)
+        return 0.01
+
+    monkeypatch.setattr(worker, "ollama_prewarm", fake_prewarm)
+
+    summary = asyncio.run(worker.warm_up(["fast:7b", "deep:32b"]))
+    with worker.conn() as c:
+        row = c.execute("SELECT * FROM worker_status WHERE worker_id=?", (worker.WORKER_ID,)).fetchone()
+    assert sorted(pinged) == ["deep:32b", "fast:7b"]
+    assert summary["errors"] == {}
+    assert row["phase"] == "ready"
+    assert json.loads(row["warm_models"]) == ["deep:32b", "fast:7b"]
+
+    asyncio.run(worker.warm_up(["fast:7b", "missing:1b"]))
+    with worker.conn() as c:
+        row = c.execute("SELECT * FROM worker_status WHERE worker_id=?", (worker.WORKER_ID,)).fetchone()
+    assert row["phase"] == "degraded"
+    assert "model not found" in row["detail"]
+
+
+def test_process_batch_rewrites_large_targets_chunk_by_chunk(tmp_path, worker_db, fake_ollama, monkeypatch):
+    project = tmp_path / "proj"
+    project.mkdir()
+    original = "".join(f"0{i:03d} READ REC{i} FROM F, ID ELSE STOP\n" for i in range(12))
+    (project / "BIG").write_text(original)
+    monkeypatch.setattr(worker, "BATCH_MAX_CHARS_PER_FILE", 150)
+
+    def reply(prompt):
+        part = prompt.split("### TARGET FILE: BIG\n")[1].split("\n\nReturn a single JSON")[0]
+        if "REC5 " not in part:
+            return json.dumps({"edits": [], "answer": "nothing here"})
+        return json.dumps({"edits": [{"file": "BIG", "content": part.replace("ELSE STOP", "THEN NULL")}], "answer": "ok"})
+
+    fake_ollama.reply = reply
+    with worker.conn() as c:
+        c.execute(
+            "INSERT INTO runs(project_path,prompt,plan) VALUES(?,?,?)",
+            (str(project), "convert READ idiom", json.dumps({"batch": {"max_parallel": 1}})),
+        )
+        run = c.execute("SELECT * FROM runs").fetchone()
+        c.execute("INSERT INTO batch_tasks(run_id,project_path,files) VALUES(?,?,?)", (run["id"], str(project), '["BIG"]'))
+
+    asyncio.run(worker.process(run))
+
+    chunked = [p for p in fake_ollama.prompts if "part " in p and "### TARGET FILE: BIG" in p]
+    assert len(chunked) == len(worker.split_chunks(original, 150)) > 1
+    assert all("[truncated]" not in p for p in fake_ollama.prompts)
+    text = (project / "BIG").read_text()
+    assert text.count("\n") == 12
+    assert "READ REC11 FROM F, ID ELSE STOP" in text
+    with worker.conn() as c:
+        change = c.execute("SELECT lines_added, lines_removed FROM file_changes").fetchone()
+    assert tuple(change) == (text.count("THEN NULL"), text.count("THEN NULL"))
+    assert 0 < text.count("THEN NULL") < 12
+
+
+def test_multi_project_batch_labels_changes_with_full_project_paths(tmp_path, worker_db, fake_ollama):
+    projects = [tmp_path / "svc", tmp_path / "uploads" / "svc"]
+    for project in projects:
+        project.mkdir(parents=True)
+        (project / "MAIN").write_text("CRT 'A'\n")
+    fake_ollama.reply = json.dumps({"edits": [{"file": "MAIN", "content": "CRT 'B'\n"}], "answer": "ok"})
+    with worker.conn() as c:
+        c.execute(
+            "INSERT INTO runs(project_path,prompt,plan) VALUES(?,?,?)",
+            (str(projects[0]), "rename", json.dumps({"batch": {"max_parallel": 2}})),
+        )
+        run = c.execute("SELECT * FROM runs").fetchone()
+        c.executemany(
+            "INSERT INTO batch_tasks(run_id,project_path,files) VALUES(?,?,?)",
+            [(run["id"], str(project), '["MAIN"]') for project in projects],
+        )
+
+    asyncio.run(worker.process(run))
+
+    with worker.conn() as c:
+        labels = sorted(r[0] for r in c.execute("SELECT file_path FROM file_changes"))
+    assert labels == sorted(str(project / "MAIN") for project in projects)
+
+
+def test_apply_edit_marks_the_catalog_index_stale(tmp_path, live_watcher):
+    project = tmp_path / "proj"
+    project.mkdir()
+    (project / "MAIN.BP").write_text("CRT 'A'\n")
+    with worker.conn() as c:
+        index_project(c, project)
+        c.execute("INSERT INTO runs(project_path,prompt) VALUES(?,?)", (str(project), "add a program"))
+    assert worker.indexed_files(project) == [project / "MAIN.BP"]
+
+    worker.apply_edit(1, project, "NEW.BP", "CRT 'B'\n", "NEW.BP")
+
+    assert worker.indexed_files(project) is None
+    assert build_repo_context(project)[1] == ["MAIN.BP", "NEW.BP"]
+
+
+def test_context_cache_sees_the_workers_own_edits(tmp_path, live_watcher, fake_ollama):
+    project = tmp_path / "proj"
+    project.mkdir()
+    (project / "MAIN.BP").write_text("CRT 'OLD'\n")
+    with worker.conn() as c:
+        index_project(c, project)
+        c.execute("INSERT INTO runs(project_path,prompt,plan) VALUES(?,?,?)", (str(project), "say NEW", "{}"))
+        run = c.execute("SELECT * FROM runs").fetchone()
+    assert "CRT 'OLD'" in worker.repo_context(project)[0]
+    fake_ollama.reply = json.dumps({"edits": [{"file": "MAIN.BP", "content": "CRT 'NEW'\n"}], "answer": "done"})
+
+    asyncio.run(worker.process(run))
+
+    with worker.conn() as c:
+        assert worker.live_index_version(c, str(project)) is not None
+    assert "CRT 'NEW'" in worker.repo_context(project)[0]
+    assert "CRT 'NEW'" in worker.repo_context(project)[0]
+
+
+def test_external_edits_are_seen_without_a_live_watcher(tmp_path, worker_db):
+    project = tmp_path / "proj"
+    project.mkdir()
+    (project / "MAIN.BP").write_text("CRT 'OLD'\n")
+    with worker.conn() as c:
+        index_project(c, project)
+    assert "CRT 'OLD'" in worker.repo_context(project)[0]
+
+    # Nothing re-indexes the project (CATALOG_WATCH=off, or no inotify events).
+    (project / "MAIN.BP").write_text("CRT 'NEW'\n")
+    (project / "NEXT.BP").write_text("CRT 'B'\n")
+
+    assert worker.indexed_files(project) is None
+    context, files = worker.repo_context(project)
+    assert "CRT 'NEW'" in context
+    assert files == ["MAIN.BP", "NEXT.BP"]
+
+
+def test_stale_watcher_heartbeat_is_not_trusted(tmp_path, live_watcher):
+    project = tmp_path / "proj"
+    project.mkdir()
+    (project / "MAIN.BP").write_text("CRT 'A'\n")
+    with worker.conn() as c:
+        index_project(c, project)
+    assert worker.indexed_files(project) == [project / "MAIN.BP"]
+
+    with worker.conn() as c:
+        c.execute("UPDATE catalog_watchers SET heartbeat_at = heartbeat_at - ?", (WATCHER_STALE_S + 1,))
+    assert worker.indexed_files(project) is None
+
+
+def test_keep_warm_retries_until_models_load(worker_db, monkeypatch):
+    attempts = []
+
+    async def flaky_prewarm(model):
+        attempts.append(model)
+        if len(attempts) < 3:
+            raise ConnectionError("connection refused")
+        return 0.01
+
+    monkeypatch.setattr(worker, "ollama_prewarm", flaky_prewarm)
+
+    summary = asyncio.run(worker.keep_warm(["fast:7b"], retry_s=0.01))
+
+    with worker.conn() as c:
+        row = c.execute("SELECT * FROM worker_status WHERE worker_id=?", (worker.WORKER_ID,)).fetchone()
+    assert len(attempts) == 3
+    assert summary == {**summary, "errors": {}, "attempt": 3}
+    assert row["phase"] == "ready"
+    assert json.loads(row["warm_models"]) == ["fast:7b"]
+
+
+def test_worker_loops_survive_a_locked_database(worker_db, monkeypatch):
+    calls = []
+
+    class Stop(Exception):
+        pass
+
+    def locked_once():
+        calls.append("db")
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        raise Stop
+
+    monkeypatch.setattr(worker, "claim_next_run", locked_once)
+    with pytest.raises(Stop):
+        asyncio.run(worker.loop_forever(poll_interval_s=0))
+
+    calls.clear()
+    monkeypatch.setattr(worker, "conn", locked_once)
+    worker.set_status("warming")
+    assert calls == ["db"]
+
+    calls.clear()
+    with pytest.raises(Stop):
+        asyncio.run(worker.heartbeat_forever(interval_s=0))
+    assert calls == ["db", "db"]
+
+
+def test_context_cache_is_safe_across_threads(tmp_path, live_watcher, monkeypatch):
+    projects = []
+    for i in range(6):
+        project = tmp_path / f"proj{i}"
+        project.mkdir()
+        (project / "MAIN.BP").write_text(f"CRT {i}\n")
+        with worker.conn() as c:
+            index_project(c, project)
+        projects.append(project)
+    monkeypatch.setattr(worker, "CONTEXT_CACHE_SIZE", 2)
+
+    def hammer(offset: int) -> None:
+        for n in range(60):
+            project = projects[(offset + n) % len(projects)]
+            assert worker.repo_context(project)[1] == ["MAIN.BP"]
+            if n % 7 == 0:
+                worker.refresh_index(project)
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(hammer, range(6)))
+    assert len(worker._context_cache) <= 2
@@ -1,62 +1,58 @@
 import asyncio
 import json
+import logging
 import os
 import re
+import socket
 import sqlite3
+import sys
+import threading
 import time
+import zlib
+from collections import OrderedDict
 from pathlib import Path
 
-import httpx
-
-DB_PATH = Path("/data/app.db")
+# The image copies catalog/diffing/scheduling/spans from backend/app next to
+# this file; in a checkout (tests, bench) they are imported from there instead.
+_BACKEND_APP = Path(__file__).resolve().parent.parent / "backend" / "app"
+if _BACKEND_APP.is_dir() and str(_BACKEND_APP) not in sys.path:
+    sys.path.append(str(_BACKEND_APP))
+
+from catalog import (  # noqa: E402
+    SUPPORTED_CODE_EXTENSIONS,
+    index_project,
+    indexed_text_files,
+    is_probably_text,
+    live_index_version,
+    mark_dirty,
+)
+from diffing import compute_diff, encode_diff  # noqa: E402
+from profiling import RunProfiler, choose_mode, profiled_call  # noqa: E402
+from scheduling import load_queue, schedule  # noqa: E402
+from spans import generation_stats, record_span  # noqa: E402
+
+DB_PATH = Path(os.getenv("DB_PATH", "/data/app.db"))
 OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
 MAX_CONTEXT_FILES = int(os.getenv("MAX_CONTEXT_FILES", "40"))
 MAX_CONTEXT_CHARS_PER_FILE = int(os.getenv("MAX_CONTEXT_CHARS_PER_FILE", "5000"))
-
-SUPPORTED_CODE_EXTENSIONS = {
-    ".b",
-    ".bas",
-    ".basic",
-    ".bp",
-    ".c",
-    ".cc",
-    ".cpp",
-    ".cs",
-    ".go",
-    ".h",
-    ".hpp",
-    ".java",
-    ".js",
-    ".json",
-    ".kt",
-    ".lua",
-    ".md",
-    ".php",
-    ".py",
-    ".rb",
-    ".rs",
-    ".scala",
-    ".sh",
-    ".sql",
-    ".swift",
-    ".ts",
-    ".tsx",
-    ".txt",
-    ".xml",
-    ".yaml",
-    ".yml",
-}
-
-
-def is_probably_text(content: bytes) -> bool:
-    if not content:
-        return False
-    if b"\x00" in content:
-        return False
-
-    sample = content[:1024]
-    non_printable = sum(1 for b in sample if b < 9 or (13 < b < 32) or b == 127)
-    return (non_printable / len(sample)) < 0.30
+POLL_INTERVAL_S = float(os.getenv("WORKER_POLL_INTERVAL_S", "2"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "1"))
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+BATCH_MAX_CHARS_PER_FILE = int(os.getenv("BATCH_MAX_CHARS_PER_FILE", "20000"))
+PREWARM_MODELS = [m.strip() for m in os.getenv("PREWARM_MODELS", "qwen2.5-coder:7b").split(",") if m.strip()]
+PREWARM_PROJECTS = int(os.getenv("PREWARM_PROJECTS", "20"))
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+WORKER_HEARTBEAT_S = float(os.getenv("WORKER_HEARTBEAT_S", "10"))
+WARM_UP_RETRY_S = float(os.getenv("WARM_UP_RETRY_S", "15"))
+WARM_UP_RETRY_MAX_S = 600.0
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "32"))
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+logger = logging.getLogger("worker")
+
+_context_cache: OrderedDict[str, tuple[float, tuple[str, list[str]]]] = OrderedDict()
+# Runs, batch subtasks and warm-up touch the cache from executor threads.
+_context_lock = threading.Lock()
 
 
 def should_include_file(file_path: Path, content: bytes) -> bool:
@@ -68,6 +64,7 @@ def should_include_file(file_path: Path, content: bytes) -> bool:
 def init_db() -> None:
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     with sqlite3.connect(DB_PATH) as c:
+        c.execute("PRAGMA auto_vacuum=INCREMENTAL")
         c.executescript(
             """
             CREATE TABLE IF NOT EXISTS runs (
@@ -77,7 +74,11 @@ def init_db() -> None:
                 plan TEXT,
                 status TEXT NOT NULL DEFAULT 'queued',
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                priority TEXT NOT NULL DEFAULT 'normal',
+                submitter TEXT NOT NULL DEFAULT 'anonymous',
+                estimated_cost_s REAL,
+                started_at TEXT
             );
             CREATE TABLE IF NOT EXISTS run_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -91,10 +92,112 @@ def init_db() -> None:
                 run_id INTEGER NOT NULL,
                 file_path TEXT NOT NULL,
                 diff TEXT NOT NULL,
-                accepted INTEGER DEFAULT 0
+                accepted INTEGER DEFAULT 0,
+                diff_encoding TEXT NOT NULL DEFAULT 'plain',
+                lines_added INTEGER NOT NULL DEFAULT 0,
+                lines_removed INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS run_timings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER NOT NULL,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'ok',
+                started_at REAL NOT NULL,
+                duration_ms REAL NOT NULL,
+                model TEXT,
+                prompt_eval_count INTEGER,
+                prompt_eval_ms REAL,
+                eval_count INTEGER,
+                eval_ms REAL,
+                tokens_per_s REAL,
+                detail TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_run_timings_run_id ON run_timings(run_id);
+            CREATE TABLE IF NOT EXISTS run_profiles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                format TEXT NOT NULL,
+                content BLOB NOT NULL,
+                summary TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_run_profiles_run_id ON run_profiles(run_id);
+            CREATE TABLE IF NOT EXISTS batch_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER NOT NULL,
+                project_path TEXT NOT NULL,
+                files TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                answer TEXT,
+                error TEXT,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_batch_tasks_run_id ON batch_tasks(run_id);
+            CREATE TABLE IF NOT EXISTS worker_status (
+                worker_id TEXT PRIMARY KEY,
+                phase TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL,
+                warm_models TEXT,
+                warm_projects INTEGER,
+                detail TEXT
+            );
+            CREATE TABLE IF NOT EXISTS project_catalog (
+                project_path TEXT PRIMARY KEY,
+                file_count INTEGER NOT NULL DEFAULT 0,
+                total_bytes INTEGER NOT NULL DEFAULT 0,
+                text_bytes INTEGER NOT NULL DEFAULT 0,
+                languages TEXT,
+                last_modified REAL,
+                dirty INTEGER NOT NULL DEFAULT 1,
+                indexed_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS catalog_watchers (
+                workspace_root TEXT PRIMARY KEY,
+                backend TEXT NOT NULL,
+                heartbeat_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS project_files (
+                project_path TEXT NOT NULL,
+                rel_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                language TEXT,
+                is_text INTEGER NOT NULL,
+                PRIMARY KEY (project_path, rel_path)
             );
             """
         )
+        ensure_columns(
+            c,
+            "runs",
+            {
+                "priority": "TEXT NOT NULL DEFAULT 'normal'",
+                "submitter": "TEXT NOT NULL DEFAULT 'anonymous'",
+                "estimated_cost_s": "REAL",
+                "started_at": "TEXT",
+            },
+        )
+        c.execute("CREATE INDEX IF NOT EXISTS idx_runs_status ON runs(status)")
+        ensure_columns(
+            c,
+            "file_changes",
+            {
+                "diff_encoding": "TEXT NOT NULL DEFAULT 'plain'",
+                "lines_added": "INTEGER NOT NULL DEFAULT 0",
+                "lines_removed": "INTEGER NOT NULL DEFAULT 0",
+            },
+        )
+        ensure_columns(c, "run_logs", {"message_encoding": "TEXT NOT NULL DEFAULT 'plain'"})
+
+
+def ensure_columns(c: sqlite3.Connection, table: str, columns: dict[str, str]) -> None:
+    existing = {row[1] for row in c.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
 
 
 def conn():
@@ -109,8 +212,27 @@ def log(run_id: int, kind: str, msg: str):
         c.execute("UPDATE runs SET updated_at=CURRENT_TIMESTAMP WHERE id=?", (run_id,))
 
 
+def span(run_id: int, stage: str, **detail):
+    return record_span(conn, run_id, stage, **detail)
+
+
+def indexed_files(path: Path) -> list[Path] | None:
+    """Text files from the backend's project catalog, if its index is clean and watched."""
+    if not DB_PATH.exists():
+        return None
+    try:
+        with conn() as c:
+            rel_paths = indexed_text_files(c, path)
+    except sqlite3.Error:
+        return None
+    return None if rel_paths is None else [path / rel for rel in rel_paths]
+
+
 def build_repo_context(path: Path) -> tuple[str, list[str]]:
-    files = [p for p in sorted(path.glob("**/*")) if p.is_file()]
+    files = indexed_files(path)
+    pre_filtered = files is not None
+    if files is None:
+        files = [p for p in sorted(path.glob("**/*")) if p.is_file()]
     included: list[str] = []
     chunks: list[str] = []
 
@@ -124,7 +246,7 @@ def build_repo_context(path: Path) -> tuple[str, list[str]]:
         except Exception:
             continue
 
-        if not should_include_file(file_path, raw_content):
+        if not pre_filtered and not should_include_file(file_path, raw_content):
             continue
 
         content = raw_content.decode("utf-8", errors="ignore").strip()
@@ -140,6 +262,34 @@ def build_repo_context(path: Path) -> tuple[str, list[str]]:
     return "\n\n".join(chunks), included
 
 
+def repo_context(path: Path) -> tuple[str, list[str]]:
+    """build_repo_context() memoized per catalog index version.
+
+    Only used while the backend's watcher owns the project; otherwise nothing
+    would invalidate the entry after an external edit, so every call rebuilds.
+    """
+    key = os.path.normpath(str(path))
+    try:
+        with conn() as c:
+            version = live_index_version(c, key)
+    except sqlite3.Error:
+        version = None
+    with _context_lock:
+        cached = _context_cache.get(key)
+        if version is not None and cached and cached[0] == version:
+            _context_cache.move_to_end(key)
+            return cached[1]
+
+    result = build_repo_context(path)
+    if version is not None:
+        with _context_lock:
+            _context_cache[key] = (version, result)
+            _context_cache.move_to_end(key)
+            while len(_context_cache) > CONTEXT_CACHE_SIZE:
+                _context_cache.popitem(last=False)
+    return result
+
+
 def build_worker_prompt(task_prompt: str, repo_context: str, included_files: list[str]) -> str:
     capabilities = (
         "You are a coding specialist optimized for code generation, code analysis/comprehension, "
@@ -165,14 +315,101 @@ def build_worker_prompt(task_prompt: str, repo_context: str, included_files: lis
     )
 
 
-async def ollama_generate(model: str, prompt: str) -> str:
+def build_batch_prefix(repo_context: str, included_files: list[str]) -> str:
+    """Shared leading part of every subtask prompt in a batch.
+
+    Identical across subtasks so Ollama can reuse the evaluated prefix; all
+    task-specific text goes after it (see build_batch_task_prompt).
+    """
+    return (
+        "You are a coding specialist optimized for code generation, code analysis/comprehension, "
+        "debugging/root-cause analysis, refactoring, and test generation/validation across "
+        "multiple languages including Pick/Basic.\n"
+        "You are applying one instruction across many files of this project, a few files at a time. "
+        "Only edit the target files you are given; keep unrelated code and formatting unchanged.\n"
+        f"Project files in context ({len(included_files)}): {', '.join(included_files) if included_files else 'none'}\n\n"
+        f"Repository context:\n{repo_context or '[No readable code files found]'}\n\n"
+    )
+
+
+def build_batch_task_prompt(prefix: str, task_prompt: str, targets: dict[str, str]) -> str:
+    files = "\n\n".join(f"### TARGET FILE: {name}\n{content}" for name, content in targets.items())
+    return (
+        f"{prefix}"
+        f"Instruction: {task_prompt}\n\n"
+        f"{files}\n\n"
+        "Return a single JSON object with keys:\n"
+        "- edits: list of {file, content} full-file replacements for target files that need changes (or [])\n"
+        "- answer: one or two sentences on what changed or why nothing needed to change"
+    )
+
+
+def build_batch_chunk_prompt(
+    prefix: str, task_prompt: str, name: str, part: int, parts: int, lines: str, content: str
+) -> str:
+    """Prompt for one line-aligned part of a target file too large to send whole."""
+    return (
+        f"{prefix}"
+        f"Instruction: {task_prompt}\n\n"
+        f"The target file {name} is too large to send at once; this is part {part} of {parts} (lines {lines}). "
+        "The other parts are handled separately and stitched back around your reply.\n\n"
+        f"### TARGET FILE: {name}\n{content}\n\n"
+        "Return a single JSON object with keys:\n"
+        f"- edits: [] if this part needs no change, else [{{file: \"{name}\", content}}] where content replaces "
+        "exactly this part (keep its first and last lines unless they must change)\n"
+        "- answer: one sentence on what changed in this part or why nothing needed to change"
+    )
+
+
+def split_chunks(text: str, max_chars: int) -> list[tuple[int, str]]:
+    """Line-aligned (first line number, text) pieces of at most ~max_chars each."""
+    chunks: list[tuple[int, str]] = []
+    current: list[str] = []
+    size = 0
+    first = line_no = 1
+    for line in text.splitlines(keepends=True):
+        if current and size + len(line) > max_chars:
+            chunks.append((first, "".join(current)))
+            current, size, first = [], 0, line_no
+        current.append(line)
+        size += len(line)
+        line_no += 1
+    if current:
+        chunks.append((first, "".join(current)))
+    return chunks
+
+
+async def ollama_generate_with_stats(model: str, prompt: str) -> tuple[str, dict]:
+    import httpx  # deferred: the slowest import in the worker, first needed here
+
+    model = model or "qwen2.5-coder:7b"
     async with httpx.AsyncClient(timeout=180) as client:
         r = await client.post(
             f"{OLLAMA_URL}/api/generate",
-            json={"model": model or "qwen2.5-coder:7b", "prompt": prompt, "stream": False},
+            json={"model": model, "prompt": prompt, "stream": False, "keep_alive": OLLAMA_KEEP_ALIVE},
+        )
+        r.raise_for_status()
+        payload = r.json()
+        return payload.get("response", ""), {**generation_stats(payload), "model": payload.get("model") or model}
+
+
+async def ollama_prewarm(model: str) -> float:
+    """Load `model` into Ollama with an empty prompt and keep it resident; returns seconds taken."""
+    import httpx
+
+    t0 = time.perf_counter()
+    async with httpx.AsyncClient(timeout=600) as client:
+        r = await client.post(
+            f"{OLLAMA_URL}/api/generate",
+            json={"model": model, "prompt": "", "stream": False, "keep_alive": OLLAMA_KEEP_ALIVE},
         )
         r.raise_for_status()
-        return r.json().get("response", "")
+    return time.perf_counter() - t0
+
+
+async def ollama_generate(model: str, prompt: str) -> str:
+    text, _ = await ollama_generate_with_stats(model, prompt)
+    return text
 
 
 def parse_model_response(raw: str) -> dict:
@@ -195,56 +432,102 @@ def parse_model_response(raw: str) -> dict:
 
 
 def write_change(run_id: int, file_path: str, before: str, after: str):
-    import difflib
-
-    diff = "\n".join(
-        difflib.unified_diff(
-            before.splitlines(), after.splitlines(), fromfile=f"a/{file_path}", tofile=f"b/{file_path}", lineterm=""
-        )
-    )
+    result = compute_diff(file_path, before, after)
+    diff, encoding = encode_diff(result.text or "(no diff)")
     with conn() as c:
         c.execute(
-            "INSERT INTO file_changes(run_id,file_path,diff,accepted) VALUES(?,?,?,0)",
-            (run_id, file_path, diff or "(no diff)"),
+            "INSERT INTO file_changes(run_id,file_path,diff,accepted,diff_encoding,lines_added,lines_removed) "
+            "VALUES(?,?,?,0,?,?,?)",
+            (run_id, file_path, diff, encoding, result.added, result.removed),
+        )
+    return result
+
+
+async def to_thread(fn, *args):
+    """asyncio.to_thread() whose work shows up in an active run profile."""
+    return await asyncio.to_thread(profiled_call, fn, *args)
+
+
+def store_profiles(run_id: int, artifacts) -> None:
+    with conn() as c:
+        c.executemany(
+            "INSERT INTO run_profiles(run_id,kind,format,content,summary) VALUES(?,?,?,?,?)",
+            [(run_id, a.kind, a.fmt, zlib.compress(a.content, 6), a.summary) for a in artifacts],
         )
 
 
 async def process(run):
+    run_id = run["id"]
+    payload = json.loads(run["plan"] or "{}")
+    mode = choose_mode(bool(payload.get("profile")))
+    profiler = RunProfiler(mode) if mode else None
+    if profiler:
+        profiler.start()  # may fall back from "full" to "sample"
+        log(run_id, "system", f"profiling enabled ({profiler.mode})")
+    try:
+        with span(run_id, "total"):
+            await _process(run)
+    finally:
+        if profiler:
+            store_profiles(run_id, profiler.stop())
+
+
+async def _process(run):
     run_id = run["id"]
     path = Path(run["project_path"])
     payload = json.loads(run["plan"] or "{}")
     fast_model = payload.get("fast_model") or "qwen2.5-coder:7b"
     deep_model = payload.get("deep_model") or fast_model
 
+    if payload.get("batch"):
+        has_edits = await process_batch(run, payload["batch"], deep_model)
+        finish_run(run_id, has_edits)
+        return
+
     log(run_id, "plan", "1) Inspect files+content 2) reason about task 3) propose edits 4) suggest validation")
-    context, included_files = build_repo_context(path)
+    with span(run_id, "scan") as timing:
+        context, included_files = await to_thread(repo_context, path)
+        timing["files"] = len(included_files)
     log(run_id, "tool", f"loaded {len(included_files)} files into model context")
 
-    prompt = build_worker_prompt(run["prompt"], context, included_files)
-    raw = await ollama_generate(deep_model, prompt)
+    with span(run_id, "prompt") as timing:
+        prompt = build_worker_prompt(run["prompt"], context, included_files)
+        timing["prompt_chars"] = len(prompt)
+
+    with span(run_id, "generate") as timing:
+        raw, stats = await ollama_generate_with_stats(deep_model, prompt)
+        timing.update(stats)
     log(run_id, "agent", "analysis generated")
 
-    parsed = parse_model_response(raw)
+    with span(run_id, "parse"):
+        parsed = parse_model_response(raw)
     answer = str(parsed.get("answer") or parsed.get("notes") or "").strip()
 
-    for edit in parsed.get("edits", []):
-        target = (path / edit["file"]).resolve()
-        if not str(target).startswith(str(path.resolve())):
-            log(run_id, "security", f"blocked path {edit.get('file')}")
-            continue
-        before = target.read_text(errors="ignore") if target.exists() else ""
-        target.parent.mkdir(parents=True, exist_ok=True)
-        target.write_text(edit.get("content", ""))
-        write_change(run_id, edit["file"], before, edit.get("content", ""))
-        log(run_id, "tool", f"write_file {edit['file']}")
+    with span(run_id, "apply_edits") as timing:
+        timing["edits"] = len(parsed.get("edits", []))
+        for edit in parsed.get("edits", []):
+            result = await to_thread(
+                apply_edit, run_id, path, edit["file"], edit.get("content", ""), edit["file"]
+            )
+            if result is not None:
+                log(run_id, "tool", f"write_file {edit['file']} (+{result.added} -{result.removed})")
+
+    if parsed.get("edits"):
+        await to_thread(refresh_index, path)
 
-    for cmd in parsed.get("validation_commands", []):
-        log(run_id, "tool", f"validation suggested: {cmd}")
+    with span(run_id, "validate") as timing:
+        timing["commands"] = len(parsed.get("validation_commands", []))
+        for cmd in parsed.get("validation_commands", []):
+            log(run_id, "tool", f"validation suggested: {cmd}")
 
     if answer:
         log(run_id, "agent", f"answer: {answer}")
 
-    status = "awaiting_review" if parsed.get("edits") else "completed"
+    finish_run(run_id, bool(parsed.get("edits")))
+
+
+def finish_run(run_id: int, has_edits: bool) -> None:
+    status = "awaiting_review" if has_edits else "completed"
     with conn() as c:
         c.execute("UPDATE runs SET status=?, updated_at=CURRENT_TIMESTAMP WHERE id=?", (status, run_id))
 
@@ -254,22 +537,295 @@ async def process(run):
         log(run_id, "system", "Run complete; no file changes proposed")
 
 
-async def loop_forever():
+def apply_edit(run_id: int, root: Path, file_name: str, content: str, label: str):
+    target = (root / file_name).resolve()
+    if not str(target).startswith(str(root.resolve())):
+        log(run_id, "security", f"blocked path {file_name}")
+        return None
+    before = target.read_text(errors="ignore") if target.exists() else ""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(content)
+    mark_project_changed(root)
+    return write_change(run_id, label, before, content)
+
+
+def mark_project_changed(root: Path) -> None:
+    """Flag the project's catalog index stale so context building walks the disk until it is re-indexed."""
+    key = os.path.normpath(str(root))
+    with _context_lock:
+        _context_cache.pop(key, None)
+    with conn() as c:
+        if c.execute("SELECT 1 FROM project_catalog WHERE project_path=?", (key,)).fetchone():
+            mark_dirty(c, [key])
+
+
+def refresh_index(root: Path) -> None:
+    """Re-index a catalogued project after this worker edited it.
+
+    Gives the project a new index version right away instead of waiting for
+    the backend's watcher to notice the write.
+    """
+    key = os.path.normpath(str(root))
+    with _context_lock:
+        _context_cache.pop(key, None)
+    with conn() as c:
+        if c.execute("SELECT 1 FROM project_catalog WHERE project_path=?", (key,)).fetchone():
+            index_project(c, key)
+
+
+async def process_batch(run, options: dict, model: str) -> bool:
+    """Run a batch's subtasks concurrently against one context snapshot per project."""
+    run_id = run["id"]
+    with conn() as c:
+        tasks = c.execute(
+            "SELECT * FROM batch_tasks WHERE run_id=? AND status IN ('queued','running') ORDER BY id ASC", (run_id,)
+        ).fetchall()
+    projects = sorted({task["project_path"] for task in tasks})
+    multi_project = len(projects) > 1
+    limit = max(1, min(int(options.get("max_parallel") or BATCH_MAX_PARALLEL), BATCH_MAX_PARALLEL))
+    log(run_id, "plan", f"batch: {len(tasks)} subtasks over {len(projects)} project(s), up to {limit} in parallel")
+
+    prefixes: dict[str, str] = {}
+    for project in projects:
+        with span(run_id, "scan", project=project) as timing:
+            context, included_files = await to_thread(repo_context, Path(project))
+            prefixes[project] = build_batch_prefix(context, included_files)
+            timing["files"] = len(included_files)
+    log(run_id, "tool", f"built {len(prefixes)} shared context snapshot(s)")
+
+    semaphore = asyncio.Semaphore(limit)
+    edits_made = 0
+
+    async def generate(prompt: str, task_id: int, **detail) -> dict:
+        with span(run_id, "generate", task=task_id, **detail) as timing:
+            raw, stats = await ollama_generate_with_stats(model, prompt)
+            timing.update(stats)
+        return parse_model_response(raw)
+
+    async def rewrite_in_chunks(task, name: str, text: str) -> tuple[str, list[str]]:
+        """Send a large target part by part and splice each reply back into its own line range."""
+        chunks = split_chunks(text, BATCH_MAX_CHARS_PER_FILE)
+        pieces: list[str] = []
+        answers: list[str] = []
+        for part, (first, chunk) in enumerate(chunks, start=1):
+            last = first + chunk.count("\n") - (1 if chunk.endswith("\n") else 0)
+            prompt = build_batch_chunk_prompt(
+                prefixes[task["project_path"]], run["prompt"], name, part, len(chunks), f"{first}-{last}", chunk
+            )
+            parsed = await generate(prompt, task["id"], file=name, part=part)
+            replacement = next((e.get("content") for e in parsed.get("edits", []) if e.get("file") == name), None)
+            if replacement is None:
+                pieces.append(chunk)
+            else:
+                if chunk.endswith("\n") and not replacement.endswith("\n"):
+                    replacement += "\n"
+                pieces.append(replacement)
+            if parsed.get("answer"):
+                answers.append(f"{name} part {part}: {str(parsed['answer']).strip()}")
+        return "".join(pieces), answers
+
+    async def run_task(task) -> None:
+        nonlocal edits_made
+        root = Path(task["project_path"])
+        files = json.loads(task["files"])
+        async with semaphore:
+            with conn() as c:
+                c.execute("UPDATE batch_tasks SET status='running', started_at=? WHERE id=?", (time.time(), task["id"]))
+            try:
+                texts = {name: await to_thread((root / name).read_text, "utf-8", "ignore") for name in files}
+                targets = {name: text for name, text in texts.items() if len(text) <= BATCH_MAX_CHARS_PER_FILE}
+                edits: dict[str, str] = {}
+                answers: list[str] = []
+                if targets:
+                    prompt = build_batch_task_prompt(prefixes[task["project_path"]], run["prompt"], targets)
+                    parsed = await generate(prompt, task["id"])
+                    for edit in parsed.get("edits", []):
+                        name = edit.get("file")
+                        if name not in targets:
+                            log(run_id, "security", f"task {task['id']}: edit outside targets blocked ({name})")
+                            continue
+                        edits[name] = edit.get("content", "")
+                    if parsed.get("answer"):
+                        answers.append(str(parsed["answer"]).strip())
+                for name, text in texts.items():
+                    if name not in targets:
+                        new_text, chunk_answers = await rewrite_in_chunks(task, name, text)
+                        answers += chunk_answers
+                        if new_text != text:
+                            edits[name] = new_text
+                for name, content in edits.items():
+                    label = str(root / name) if multi_project else name
+                    result = await to_thread(apply_edit, run_id, root, name, content, label)
+                    if result is not None:
+                        edits_made += 1
+                        log(run_id, "tool", f"write_file {label} (+{result.added} -{result.removed})")
+                with conn() as c:
+                    c.execute(
+                        "UPDATE batch_tasks SET status='completed', answer=?, finished_at=? WHERE id=?",
+                        ("\n".join(answers), time.time(), task["id"]),
+                    )
+            except Exception as exc:
+                with conn() as c:
+                    c.execute(
+                        "UPDATE batch_tasks SET status='failed', error=?, finished_at=? WHERE id=?",
+                        (str(exc), time.time(), task["id"]),
+                    )
+                log(run_id, "error", f"task {task['id']} failed: {exc}")
+
+    with span(run_id, "batch", tasks=len(tasks), parallel=limit):
+        await asyncio.gather(*(run_task(task) for task in tasks))
+    if edits_made:
+        for project in projects:
+            await to_thread(refresh_index, Path(project))
+
+    with conn() as c:
+        counts = dict(c.execute("SELECT status, COUNT(*) FROM batch_tasks WHERE run_id=? GROUP BY status", (run_id,)))
+    log(run_id, "agent", f"batch finished: {counts.get('completed', 0)} completed, {counts.get('failed', 0)} failed, {edits_made} file change(s)")
+    if tasks and not counts.get("completed"):
+        raise RuntimeError("all batch subtasks failed")
+    return edits_made > 0
+
+
+def claim_next_run():
+    with conn() as c:
+        # Take the write lock before reading so concurrent workers never claim the same run.
+        c.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        queued, active = load_queue(c, now)
+        picked = schedule(queued, active, now, limit=1)
+        if not picked:
+            return None
+        c.execute(
+            "UPDATE runs SET status='running', started_at=CURRENT_TIMESTAMP, updated_at=CURRENT_TIMESTAMP WHERE id=?",
+            (picked[0].id,),
+        )
+        return c.execute("SELECT * FROM runs WHERE id=?", (picked[0].id,)).fetchone()
+
+
+async def loop_forever(poll_interval_s: float = POLL_INTERVAL_S):
     while True:
-        with conn() as c:
-            run = c.execute("SELECT * FROM runs WHERE status='queued' ORDER BY id ASC LIMIT 1").fetchone()
-            if run:
-                c.execute("UPDATE runs SET status='running', updated_at=CURRENT_TIMESTAMP WHERE id=?", (run["id"],))
+        try:
+            run = claim_next_run()
+        except sqlite3.Error as exc:
+            # Usually "database is locked" while the backend writes; retry on the next poll.
+            logger.warning("could not claim a run: %s", exc)
+            run = None
         if run:
             try:
                 await process(run)
             except Exception as exc:
-                with conn() as c:
-                    c.execute("UPDATE runs SET status='failed', updated_at=CURRENT_TIMESTAMP WHERE id=?", (run["id"],))
-                log(run["id"], "error", str(exc))
-        time.sleep(2)
+                try:
+                    with conn() as c:
+                        c.execute(
+                            "UPDATE runs SET status='failed', updated_at=CURRENT_TIMESTAMP WHERE id=?", (run["id"],)
+                        )
+                    log(run["id"], "error", str(exc))
+                except sqlite3.Error as db_exc:
+                    logger.error("run %s failed (%s) and could not be marked failed: %s", run["id"], exc, db_exc)
+        await asyncio.sleep(poll_interval_s)
+
+
+def set_status(phase: str, warm_models: list[str] | None = None, warm_projects: int | None = None, detail=None):
+    """Publish this worker's startup phase for the backend's /ready endpoint.
+
+    A locked or unavailable DB is logged, not raised: the next call or
+    heartbeat publishes again.
+    """
+    now = time.time()
+    try:
+        with conn() as c:
+            c.execute("DELETE FROM worker_status WHERE heartbeat_at < ?", (now - 86400,))
+            c.execute(
+                "INSERT INTO worker_status(worker_id,phase,started_at,heartbeat_at,warm_models,warm_projects,detail) "
+                "VALUES(?,?,?,?,?,?,?) ON CONFLICT(worker_id) DO UPDATE SET phase=excluded.phase, "
+                "heartbeat_at=excluded.heartbeat_at, warm_models=COALESCE(excluded.warm_models, warm_models), "
+                "warm_projects=COALESCE(excluded.warm_projects, warm_projects), detail=COALESCE(excluded.detail, detail)",
+                (
+                    WORKER_ID,
+                    phase,
+                    now,
+                    now,
+                    None if warm_models is None else json.dumps(warm_models),
+                    warm_projects,
+                    None if detail is None else json.dumps(detail),
+                ),
+            )
+    except sqlite3.Error as exc:
+        logger.warning("could not publish worker status %s: %s", phase, exc)
+
+
+def prewarm_contexts(limit: int = PREWARM_PROJECTS) -> int:
+    """Build contexts for the most recently used projects with a clean, watched catalog index."""
+    with conn() as c:
+        projects = [
+            row[0]
+            for row in c.execute(
+                "SELECT project_path FROM runs GROUP BY project_path ORDER BY MAX(id) DESC LIMIT ?", (limit,)
+            )
+        ]
+        projects = [p for p in projects if live_index_version(c, p) is not None]
+    for project in projects:
+        repo_context(Path(project))
+    return len(projects)
+
+
+async def warm_up(models: list[str] = PREWARM_MODELS, attempt: int = 1) -> dict:
+    """Load models and recent project contexts while the loops already accept runs."""
+    set_status("warming")
+    t0 = time.perf_counter()
+    results = await asyncio.gather(
+        asyncio.to_thread(prewarm_contexts),
+        *(ollama_prewarm(model) for model in models),
+        return_exceptions=True,
+    )
+    projects, model_results = results[0], dict(zip(models, results[1:]))
+    warm = sorted(m for m, r in model_results.items() if not isinstance(r, BaseException))
+    errors = {m: str(r) for m, r in model_results.items() if isinstance(r, BaseException)}
+    if isinstance(projects, BaseException):
+        errors["contexts"] = str(projects)
+        projects = 0
+    summary = {"seconds": round(time.perf_counter() - t0, 2), "errors": errors, "attempt": attempt}
+    set_status("ready" if not errors else "degraded", warm_models=warm, warm_projects=projects, detail=summary)
+    return summary
+
+
+async def keep_warm(models: list[str] = PREWARM_MODELS, retry_s: float = WARM_UP_RETRY_S) -> dict:
+    """warm_up(), retried with exponential backoff until every model loads.
+
+    Ollama may still be starting, or a model may not be pulled yet; the
+    worker stays ``degraded`` (and /ready 503) only until a retry succeeds.
+    """
+    attempt = 1
+    summary = await warm_up(models, attempt)
+    delay = retry_s
+    while summary["errors"]:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WARM_UP_RETRY_MAX_S)
+        attempt += 1
+        summary = await warm_up(models, attempt)
+    return summary
+
+
+async def heartbeat_forever(interval_s: float = WORKER_HEARTBEAT_S):
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            with conn() as c:
+                c.execute("UPDATE worker_status SET heartbeat_at=? WHERE worker_id=?", (time.time(), WORKER_ID))
+        except sqlite3.Error as exc:
+            logger.warning("worker heartbeat failed: %s", exc)
+
+
+async def main(concurrency: int = WORKER_CONCURRENCY):
+    await asyncio.gather(
+        keep_warm(),
+        heartbeat_forever(),
+        *(loop_forever() for _ in range(max(concurrency, 1))),
+    )
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     init_db()
-    asyncio.run(loop_forever())
+    set_status("starting")
+    asyncio.run(main())